@@ -0,0 +1,201 @@
+# main/analyze.py
+# Headless analysis of saved games, streaming one record per position as JSONL or CSV
+#
+#   python main/analyze.py data/*.aniil games.pgn positions.txt [--depth 4 | --movetime 500] [--workers 8]
+#                          [--format jsonl | csv] [-o results.jsonl]
+import sys
+import os
+import argparse
+import csv
+import json
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from modules.logic import Board
+from modules.engine import ChessEngine
+from modules.evaluation import MATE_SCORE
+from modules.book import START_FEN, readGames
+from modules.tablebase import openTablebases
+
+FIELDS = ('source', 'game', 'ply', 'fen', 'move', 'eval', 'best', 'depth', 'loss', 'blunder')
+DEFAULT_DEPTH = 4
+# Centipawns a move may lose against the best one before it is flagged
+BLUNDER_LOSS = 200
+# Evaluations are capped before working out losses, so choosing a slower mate is not a huge loss
+EVAL_CAP = 1000
+# Markers the game window writes into ANIIL move logs besides moves
+ANIIL_RESULTS = ('1-0', '0-1', '==', '1/2-1/2')
+
+
+# Input ///
+def readAniil(path: str) -> tuple:
+    '''Returns (start FEN, SAN moves) of an ANIIL file. Its FEN line holds the latest position, so the logged
+    moves are replayed from the start position and only kept if they lead there.'''
+    with open(path, encoding='utf-8') as file:
+        lines = file.readlines()
+    final_fen = lines[4][5:].strip()
+    sans = []
+    for line in lines[6:]:
+        line = line.strip()
+        if (line == '///') or (not line):
+            break
+        # 'n. white/black', a promotion adds '/Q' to its move
+        for token in line.split(' ', 1)[-1].split('/'):
+            token = token.replace('+', '').replace('#', '')
+            if token in ANIIL_RESULTS:
+                continue
+            if (token in ('Q', 'R', 'B', 'N')) and sans:
+                sans[-1] += token
+            elif token:
+                sans.append(token)
+
+    board = Board(START_FEN)
+    for san in sans:
+        move = board.sanToMove(san)
+        if move is None:
+            return final_fen, []
+        board.makeMove(move)
+    placement = final_fen.split(' ')[0]
+    if board.getFen().getString().split(' ')[0] != placement:
+        # The last white move is only logged together with black's reply
+        color = 'white' if board.active_color == 'w' else 'black'
+        for move in board.legalMoves(color):
+            board.makeMove(move)
+            reached = board.getFen().getString().split(' ')[0] == placement
+            board.unmakeMove()
+            if reached:
+                sans.append(board.sanNotation(move, board.legalMoves(color)))
+                break
+        else:
+            return final_fen, []
+    return START_FEN, sans
+
+def readFens(path: str) -> list:
+    'Returns the FEN strings of a file holding one per line, skipping blank lines and # comments.'
+    with open(path, encoding='utf-8') as file:
+        return [line.strip() for line in file if line.strip() and not line.startswith('#')]
+
+def readInputs(paths: list):
+    'Yields (source, game number, start FEN, SAN moves) for every game or position in the input files.'
+    for path in paths:
+        extension = os.path.splitext(path)[1].lower()
+        if extension == '.aniil':
+            fen, sans = readAniil(path)
+            yield path, 1, fen, sans
+        elif extension == '.pgn':
+            with open(path, encoding='utf-8', errors='replace') as file:
+                for number, (headers, sans) in enumerate(readGames(file), 1):
+                    yield path, number, headers.get('FEN', START_FEN), sans
+        else:
+            for number, fen in enumerate(readFens(path), 1):
+                yield path, number, fen, []
+
+
+# Analysis ///
+# One engine per worker process, its tables are cleared between games so results don't depend on scheduling
+_engine = None
+
+def _initWorker(hash_mb: int) -> None:
+    'Creates the engine of a worker process.'
+    global _engine
+    _engine = ChessEngine('classic', 0, 'white', None, False, hash_mb, tablebases=openTablebases())
+
+def analyseGame(task: tuple, depth: int = DEFAULT_DEPTH, movetime: int = None, blunder_loss: int = BLUNDER_LOSS) -> list:
+    '''Searches every position of a game, to depth plies or for movetime milliseconds, and returns one record
+    per position. eval is in centipawns from white\'s side, or None if not even depth 1 finished in time, loss
+    is what the played move gave away.'''
+    source, game, fen, sans = task
+    engine = _engine
+    engine.transposition_table.clear()
+    engine.orderer.clear()
+    board = Board(fen)
+    records = []
+    evals = []
+    for ply in range(len(sans) + 1):
+        color = 'white' if board.active_color == 'w' else 'black'
+        engine.color = color
+        engine.current_position = board
+        if movetime is None:
+            engine.depth = depth
+            best = engine.iterativeDeepening()
+        else:
+            best = engine.iterativeDeepening(movetime / 1000)
+        if best is None:
+            # Checkmate or stalemate
+            eval = (-MATE_SCORE if color == 'white' else MATE_SCORE) if board.checkState(color) else 0
+            searched = 0
+        elif engine.completed_depth == 0:
+            # Out of time before depth 1 finished, root_eval still holds the previous position's score
+            eval = None
+            searched = 0
+        else:
+            eval = engine.root_eval
+            searched = engine.completed_depth
+        move = board.sanToMove(sans[ply]) if ply < len(sans) else None
+        records.append({'source': source, 'game': game, 'ply': ply, 'fen': board.getFen().getString(),
+                        'move': sans[ply] if move is not None else None, 'eval': eval, 'best': best,
+                        'depth': searched, 'loss': None, 'blunder': False})
+        evals.append(max(-EVAL_CAP, min(EVAL_CAP, eval)) if eval is not None else None)
+        if move is None:
+            if ply < len(sans):
+                print(f'{source} game {game}: illegal move {sans[ply]!r} at ply {ply}, rest skipped', file=sys.stderr)
+            break
+        board.makeMove(move)
+
+    for ply in range(len(records) - 1):
+        if (records[ply]['move'] is None) or (evals[ply] is None) or (evals[ply + 1] is None):
+            continue
+        loss = evals[ply] - evals[ply + 1]
+        if records[ply]['fen'].split(' ')[1] == 'b':
+            loss = -loss
+        records[ply]['loss'] = max(0, loss)
+        records[ply]['blunder'] = loss >= blunder_loss
+    return records
+
+
+# Output ///
+def main(arguments=None) -> None:
+    'Parses the command line, then analyses every input and writes the records as games finish, in input order.'
+    parser = argparse.ArgumentParser(description='Analyse ANIIL, PGN or FEN list files without the GUI.')
+    parser.add_argument('inputs', nargs='+', help='.aniil and .pgn files, any other file is read as one FEN per line')
+    limit = parser.add_mutually_exclusive_group()
+    limit.add_argument('--depth', type=int, default=DEFAULT_DEPTH, help='plies searched per position')
+    limit.add_argument('--movetime', type=int, help='milliseconds searched per position instead of a fixed depth')
+    parser.add_argument('--blunder', type=int, default=BLUNDER_LOSS, help='centipawns lost that flag a blunder')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker processes')
+    parser.add_argument('--hash', type=int, default=16, help='transposition table megabytes per worker')
+    parser.add_argument('--format', choices=('jsonl', 'csv'), default='jsonl')
+    parser.add_argument('-o', '--output', help='file to write, standard output by default')
+    options = parser.parse_args(arguments)
+
+    output = open(options.output, 'w', encoding='utf-8', newline='') if options.output else sys.stdout
+    writer = None
+    if options.format == 'csv':
+        writer = csv.DictWriter(output, FIELDS)
+        writer.writeheader()
+    analyse = partial(analyseGame, depth=options.depth, movetime=options.movetime, blunder_loss=options.blunder)
+    pool = None
+    if options.workers > 1:
+        pool = ProcessPoolExecutor(max_workers=options.workers, initializer=_initWorker, initargs=(options.hash,))
+        results = pool.map(analyse, readInputs(options.inputs))
+    else:
+        _initWorker(options.hash)
+        results = map(analyse, readInputs(options.inputs))
+    try:
+        for records in results:
+            for record in records:
+                if writer is not None:
+                    writer.writerow(record)
+                else:
+                    output.write(json.dumps(record) + '\n')
+            output.flush()
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        if output is not sys.stdout:
+            output.close()
+
+# Program entry point
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,374 @@
+# main/arena.py
+# Engine-versus-engine matches from a set of openings, the regression gate for engine changes
+#
+#   python main/arena.py classic:depth=4 classic:depth=3 [--games 100] [--tc 10+0.1] [--openings openings.txt]
+#                        [--workers 4] [--sprt 0,10]
+#
+# Players are written type[:option=value,...]
+#   classic    the ChessEngine in process, options depth, movetime, hash, workers
+#   stockfish  Stockfish over UCI, options skill, depth, movetime, hash
+#   uci        any UCI engine, options cmd (uciengine.py by default), depth, movetime, hash
+# Without --tc every move searches to the player's depth or for its movetime in milliseconds.
+import sys
+import os
+import argparse
+import math
+import multiprocessing
+import shlex
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from modules.logic import Board
+from modules.bitboard import KNIGHT, BISHOP, KING
+from modules.engine import ChessEngine
+from modules.movegen import moveToString
+from modules.uci import UCIEngine, UCIError, DEFAULT_COMMAND
+from modules.book import START_FEN
+from modules.tablebase import openTablebases
+
+# Balanced positions a few moves in, each played once with either color
+DEFAULT_OPENINGS = (
+    START_FEN,
+    'rnbqkbnr/pp1ppppp/8/2p5/4P3/5N2/PPPP1PPP/RNBQKB1R b KQkq - 1 2',
+    'r1bqkbnr/pppp1ppp/2n5/1B2p3/4P3/5N2/PPPP1PPP/RNBQK2R b KQkq - 3 3',
+    'rnbqkb1r/pppp1ppp/4pn2/8/2PP4/8/PP2PPPP/RNBQKBNR w KQkq - 0 3',
+    'rnbqkbnr/ppp2ppp/4p3/3p4/3PP3/8/PPP2PPP/RNBQKBNR w KQkq d6 0 3',
+    'rnbqkb1r/ppp1pppp/5n2/3p4/3P4/5N2/PPP1PPPP/RNBQKB1R w KQkq - 2 3',
+    'rnbqkbnr/pp2pppp/2p5/3p4/3PP3/8/PPP2PPP/RNBQKBNR w KQkq d6 0 3',
+    'r1bqkbnr/pppp1ppp/2n5/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R b KQkq - 3 3',
+)
+DEFAULT_GAMES = 16
+# Games still running after this many plies are scored as draws
+MAX_PLIES = 300
+# Plies searched or milliseconds spent per move without a time control, when the player gives neither
+DEFAULT_DEPTH = 4
+DEFAULT_MOVETIME = 100
+# Error rates of the sequential probability ratio test
+SPRT_ALPHA = 0.05
+SPRT_BETA = 0.05
+
+
+# Players ///
+class ClassicPlayer:
+    def __init__(self, options: dict):
+        self.depth = int(options.get('depth', DEFAULT_DEPTH))
+        self.movetime = int(options['movetime']) if 'movetime' in options else None
+        self.engine = ChessEngine('classic', 0, 'white', None, False, int(options.get('hash', 16)),
+                                  workers=int(options.get('workers', 1)), tablebases=openTablebases())
+        self.engine.depth = self.depth
+        self.nodes = 0
+
+    # Other methods ///
+    def newGame(self) -> None:
+        'Forgets everything learned in the previous game.'
+        self.engine.transposition_table.clear()
+        self.engine.orderer.clear()
+    def move(self, board: Board, start_fen: str, moves: list, clock: tuple) -> str:
+        'Returns the move to play in the form \'square1square2\', clock being (wtime, btime, winc, binc) seconds or None.'
+        engine = self.engine
+        engine.current_position = board
+        engine.color = 'white' if board.active_color == 'w' else 'black'
+        if clock is not None:
+            side = 0 if engine.color == 'white' else 1
+            best_move = engine.bestMove(clock[side], clock[side + 2])
+        elif self.movetime is not None:
+            best_move = engine.iterativeDeepening(self.movetime / 1000)
+        else:
+            best_move = engine.iterativeDeepening()
+        self.nodes = engine.nodes
+        return best_move
+    def close(self) -> None:
+        'Stops the engine\'s worker processes.'
+        self.engine.shutdown()
+
+
+class UCIPlayer:
+    def __init__(self, command, options: dict):
+        self.depth = int(options['depth']) if 'depth' in options else None
+        self.movetime = int(options.get('movetime', DEFAULT_MOVETIME)) if self.depth is None else None
+        settings = {'Threads': 1, 'Hash': int(options.get('hash', 16))}
+        if 'skill' in options:
+            settings['Skill Level'] = int(options['skill'])
+        self.engine = UCIEngine(command, settings)
+        self.nodes = 0
+
+    # Other methods ///
+    def newGame(self) -> None:
+        'Tells the engine a new game starts.'
+        self.engine.newGame()
+    def move(self, board: Board, start_fen: str, moves: list, clock: tuple) -> str:
+        'Returns the move to play in the form \'square1square2\', clock being (wtime, btime, winc, binc) seconds or None.'
+        self.engine.setPosition(start_fen, moves)
+        if clock is not None:
+            best_move = self.engine.go(clock=tuple(value * 1000 for value in clock))
+        else:
+            best_move = self.engine.go(self.movetime, self.depth)
+        self.nodes = self.engine.nodes
+        return best_move
+    def close(self) -> None:
+        'Ends the engine process.'
+        self.engine.quit()
+
+
+def parsePlayer(spec: str) -> tuple:
+    'Returns (type, options) of a player written type[:option=value,...], raising ValueError if it is not valid.'
+    type, _, rest = spec.partition(':')
+    options = {}
+    for item in filter(None, rest.split(',')):
+        name, separator, value = item.partition('=')
+        if not separator:
+            raise ValueError(f'option {item!r} of {spec!r} has no value')
+        options[name.strip()] = value.strip()
+    if type not in ('classic', 'stockfish', 'uci'):
+        raise ValueError(f'unknown player type {type!r}, expected classic, stockfish or uci')
+    return type, options
+
+def createPlayer(spec: str):
+    'Returns a new player for spec.'
+    type, options = parsePlayer(spec)
+    if type == 'classic':
+        return ClassicPlayer(options)
+    elif type == 'stockfish':
+        return UCIPlayer(options.get('cmd', DEFAULT_COMMAND), options)
+    command = shlex.split(options['cmd']) if 'cmd' in options else [sys.executable, os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'uciengine.py')]
+    return UCIPlayer(command, options)
+
+
+# Games ///
+# Players of a worker process, kept between games so engines start once
+_players = {}
+
+def _player(slot: int, spec: str):
+    'Returns the worker\'s player for slot, the two sides of a self-play match getting separate engines.'
+    if (slot, spec) not in _players:
+        _players[(slot, spec)] = createPlayer(spec)
+    return _players[(slot, spec)]
+
+def closePlayers() -> None:
+    'Closes every player of this process.'
+    for player in _players.values():
+        player.close()
+    _players.clear()
+
+def insufficientMaterial(board: Board) -> bool:
+    'Returns whether neither side can mate, with bare kings or a single knight or bishop left.'
+    count = board.occupied.bit_count()
+    if count == 2:
+        return True
+    if count == 3:
+        for code in range(12):
+            if (code % 6 != KING) and board.bitboards[code]:
+                return code % 6 in (KNIGHT, BISHOP)
+    return False
+
+def playGame(task: tuple) -> dict:
+    '''Plays one game and returns its record. task is (game number, opening FEN, player specs by slot, slot
+    playing white, time control as (base, increment) seconds or None).'''
+    number, fen, specs, white_slot, time_control = task
+    slots = (white_slot, 1 - white_slot)
+    players = [_player(slot, specs[slot]) for slot in slots]
+    for player in players:
+        player.newGame()
+    board = Board(fen)
+    moves = []
+    nodes = [0, 0]
+    seconds = [0.0, 0.0]
+    clocks = [time_control[0], time_control[0]] if time_control is not None else None
+    result = None
+    while result is None:
+        side = 0 if board.active_color == 'w' else 1
+        color = ('white', 'black')[side]
+        legal = board.legalMoves(color)
+        if not legal:
+            result, reason = (('0-1', '1-0')[side], 'checkmate') if board.checkState(color) else ('1/2-1/2', 'stalemate')
+            break
+        if board.repetitionCount() >= 3:
+            result, reason = '1/2-1/2', 'threefold repetition'
+        elif board.halfmove_clock >= 100:
+            result, reason = '1/2-1/2', 'fifty-move rule'
+        elif insufficientMaterial(board):
+            result, reason = '1/2-1/2', 'insufficient material'
+        elif len(moves) >= MAX_PLIES:
+            result, reason = '1/2-1/2', 'adjudicated'
+        if result is not None:
+            break
+
+        clock = None
+        if clocks is not None:
+            clock = (clocks[0], clocks[1], time_control[1], time_control[1])
+        start = time.perf_counter()
+        try:
+            notation = players[side].move(board, fen, moves, clock)
+        except UCIError:
+            notation = None
+        elapsed = time.perf_counter() - start
+        nodes[side] += players[side].nodes
+        seconds[side] += elapsed
+        if clocks is not None:
+            clocks[side] -= elapsed
+            if clocks[side] < 0:
+                result, reason = ('0-1', '1-0')[side], 'time forfeit'
+                break
+            clocks[side] += time_control[1]
+        move = next((move for move in legal if moveToString(move) == notation), None)
+        if move is None:
+            result, reason = ('0-1', '1-0')[side], f'illegal move {notation}'
+            break
+        board.makeMove(move)
+        moves.append(notation)
+    # Everything by slot from here on, slot 0 being the first player of the match
+    return {'number': number, 'fen': fen, 'white': white_slot, 'result': result, 'reason': reason, 'moves': moves,
+            'nodes': [nodes[slots.index(slot)] for slot in (0, 1)],
+            'seconds': [seconds[slots.index(slot)] for slot in (0, 1)]}
+
+
+# Statistics ///
+def slotScore(record: dict, slot: int) -> float:
+    'Returns the points the player in slot scored in a game record.'
+    if record['result'] == '1/2-1/2':
+        return 0.5
+    white_won = record['result'] == '1-0'
+    return 1.0 if white_won == (record['white'] == slot) else 0.0
+
+def eloFromScore(score: float) -> float:
+    'Returns the Elo difference that gives an expected score, infinite at 0 or 1.'
+    if score <= 0:
+        return -math.inf
+    if score >= 1:
+        return math.inf
+    return 400 * math.log10(score / (1 - score))
+
+def scoreFromElo(elo: float) -> float:
+    'Returns the expected score of a player elo points stronger.'
+    return 1 / (1 + 10 ** (-elo / 400))
+
+def eloEstimate(wins: int, draws: int, losses: int) -> tuple:
+    'Returns (Elo difference, 95% error margin) of a match result.'
+    games = wins + draws + losses
+    if not games:
+        return 0.0, math.inf
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    deviation = math.sqrt(variance / games)
+    elo = eloFromScore(score)
+    margin = (eloFromScore(score + 1.96 * deviation) - eloFromScore(score - 1.96 * deviation)) / 2
+    return elo, margin
+
+def sprtBounds(alpha: float = SPRT_ALPHA, beta: float = SPRT_BETA) -> tuple:
+    'Returns the (lower, upper) log-likelihood ratio bounds accepting H0 and H1.'
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+def sprtRatio(wins: int, draws: int, losses: int, elo0: float, elo1: float) -> float:
+    '''Returns the log-likelihood ratio of H1 (the difference is elo1) against H0 (it is elo0), using the
+    normal approximation of the game scores.'''
+    games = wins + draws + losses
+    if not games:
+        return 0.0
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    if variance == 0:
+        return 0.0
+    score0 = scoreFromElo(elo0)
+    score1 = scoreFromElo(elo1)
+    return games * (score1 - score0) * (2 * score - score0 - score1) / (2 * variance)
+
+
+# Match ///
+def parseTimeControl(text: str) -> tuple:
+    'Returns (base, increment) seconds of a time control written base[+increment].'
+    base, _, increment = text.partition('+')
+    return float(base), float(increment or 0)
+
+def readOpenings(path: str) -> list:
+    'Returns the opening FENs of a file holding one per line, skipping blank lines and # comments.'
+    with open(path, encoding='utf-8') as file:
+        return [line.strip() for line in file if line.strip() and not line.startswith('#')]
+
+def main(arguments=None) -> int:
+    'Parses the command line, plays the match and prints the report. Returns 1 if SPRT accepted H0, else 0.'
+    parser = argparse.ArgumentParser(description='Play a match between two engine configurations.')
+    parser.add_argument('first', help='player under test, e.g. classic:depth=4')
+    parser.add_argument('second', help='baseline player, e.g. classic:depth=3 or stockfish:skill=3')
+    parser.add_argument('--games', type=int, default=DEFAULT_GAMES, help='games to play, in pairs with colors swapped')
+    parser.add_argument('--tc', type=parseTimeControl, help='time control in seconds, base[+increment]')
+    parser.add_argument('--openings', help='file of opening FENs, one per line')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='games played at once')
+    parser.add_argument('--sprt', help='elo0,elo1 of a sequential test that ends the match once decided')
+    parser.add_argument('--alpha', type=float, default=SPRT_ALPHA)
+    parser.add_argument('--beta', type=float, default=SPRT_BETA)
+    options = parser.parse_args(arguments)
+    specs = (options.first, options.second)
+    for spec in specs:
+        try:
+            parsePlayer(spec)
+        except ValueError as error:
+            parser.error(str(error))
+    hypotheses = None
+    if options.sprt is not None:
+        try:
+            hypotheses = tuple(float(value) for value in options.sprt.split(','))
+        except ValueError:
+            hypotheses = ()
+        if len(hypotheses) != 2:
+            parser.error('--sprt takes elo0,elo1')
+    openings = readOpenings(options.openings) if options.openings else list(DEFAULT_OPENINGS)
+    tasks = [(number + 1, openings[(number // 2) % len(openings)], specs, number % 2, options.tc)
+             for number in range(options.games)]
+
+    names = [specs[0], specs[1] if specs[1] != specs[0] else specs[1] + ' (2)']
+    records = []
+    outcome = [0, 0, 0]
+    decision = None
+    pool = None
+    if options.workers > 1:
+        # Spawned like the engine's own pool, so no worker inherits a running UCI reader thread
+        pool = ProcessPoolExecutor(max_workers=options.workers, mp_context=multiprocessing.get_context('spawn'))
+        results = as_completed([pool.submit(playGame, task) for task in tasks])
+    else:
+        results = (playGame(task) for task in tasks)
+    bounds = sprtBounds(options.alpha, options.beta)
+    try:
+        for result in results:
+            record = result.result() if pool is not None else result
+            records.append(record)
+            outcome[{1.0: 0, 0.5: 1, 0.0: 2}[slotScore(record, 0)]] += 1
+            white, black = (names[0], names[1]) if record['white'] == 0 else (names[1], names[0])
+            print(f'Game {record["number"]}: {white} - {black} {record["result"]} ({record["reason"]}), '
+                  f'+{outcome[0]} ={outcome[1]} -{outcome[2]}', flush=True)
+            if hypotheses is not None:
+                ratio = sprtRatio(*outcome, *hypotheses)
+                if ratio <= bounds[0]:
+                    decision = 'H0'
+                elif ratio >= bounds[1]:
+                    decision = 'H1'
+                if decision is not None:
+                    break
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        else:
+            closePlayers()
+
+    # Report /
+    elo, margin = eloEstimate(*outcome)
+    print(f'\n{names[0]} vs {names[1]}: +{outcome[0]} ={outcome[1]} -{outcome[2]} over {len(records)} games')
+    print(f'Elo difference: {elo:.1f} +/- {margin:.1f}')
+    if hypotheses is not None:
+        ratio = sprtRatio(*outcome, *hypotheses)
+        verdict = {'H0': f'H0 accepted, not {hypotheses[1]:g} Elo stronger', 'H1': 'H1 accepted',
+                   None: 'undecided'}[decision]
+        print(f'SPRT elo0 {hypotheses[0]:g} elo1 {hypotheses[1]:g}: LLR {ratio:.2f} '
+              f'[{bounds[0]:.2f}, {bounds[1]:.2f}], {verdict}')
+    for slot in (0, 1):
+        nodes = sum(record['nodes'][slot] for record in records)
+        seconds = sum(record['seconds'][slot] for record in records)
+        forfeits = sum(1 for record in records if (record['reason'] == 'time forfeit')
+                       and (slotScore(record, slot) == 0.0))
+        print(f'{names[slot]}: {nodes / seconds if seconds else 0:.0f} nps, {forfeits} time forfeits')
+    return 1 if decision == 'H0' else 0
+
+# Program entry point
+if __name__ == '__main__':
+    sys.exit(main())
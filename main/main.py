@@ -1,11 +1,12 @@
 # main/main.py
 
 import sys
+import threading
 import PySide6.QtCore
 from PySide6.QtGui import QCloseEvent
 from PySide6.QtWidgets import QApplication, QMainWindow, QStackedWidget
 from subwindows import homepage, newgameconfig, chessboard, savegamemanager
-from modules import engine, logic, aniil
+from modules import engine, logic, aniil, uci, engineservice, book, tablebase
 
 
 class MainWindow(QMainWindow):
@@ -15,6 +16,16 @@ class MainWindow(QMainWindow):
 
         self.application = application
         self.engine = None
+        # Worker processes of the classic engine's search, 1 searches on the service thread alone
+        self.engine_workers = engine.DEFAULT_WORKERS
+        # Shared by every engine, None when no book is installed
+        self.opening_book = book.openBook()
+        self.tablebases = tablebase.openTablebases()
+        # Searches run on the service's thread, never the UI thread
+        self.engine_service = engineservice.EngineService()
+        # Stockfish processes outlive games, start one now so the first game does not wait for it
+        self.uci_pool = uci.UCIPool()
+        threading.Thread(target=self.uci_pool.warm, daemon=True).start()
         self.stackedwidget = QStackedWidget()
         self.windowstack: list = []
         self.data = None
@@ -54,10 +65,12 @@ class MainWindow(QMainWindow):
 
     # Public method to close application
     def quitApplication(self) -> None:
+        self.shutdownEngines()
         self.application.quit()
 
     # Override close event when window is manually closed
     def closeEvent(self, event: QCloseEvent):
+        self.shutdownEngines()
         self.application.quit()
         return super().closeEvent(event)
     
@@ -71,17 +84,60 @@ class MainWindow(QMainWindow):
     def setData(self, data) -> None:
         self.data = data
 
-    def initEngine(self, type: str, color: str, starting_fen: str, level: int, bullet: bool) -> None:
-        'Initialises the chess engine.'
-        self.engine = engine.ChessEngine(type, level, color, logic.Board(starting_fen), bullet)
+    def initEngine(self, type: str, color: str, starting_fen: str, level: int, bullet: bool, workers: int = 1) -> None:
+        'Initialises the chess engine, searching with workers processes if more than one.'
+        self.engine_service.cancel(wait=True)
+        if self.engine is not None:
+            self.engine.shutdown()
+        self.engine = engine.ChessEngine(type, level, color, logic.Board(starting_fen), bullet, workers=workers,
+                                         uci_pool=self.uci_pool, book=self.opening_book, tablebases=self.tablebases)
+        self.engine_service.setEngine(self.engine)
     
-    def requestEngineMove(self) -> str:
-        'Returns the best engine move.'
-        return self.engine.bestMove()
-
-    def updateEngineFen(self, newfen) -> None:
+    def shutdownEngines(self) -> None:
+        'Stops the current engine and every pooled UCI process, and closes the opening book and tablebases.'
+        self.engine_service.shutdown()
+        if self.engine is not None:
+            self.engine.shutdown()
+            self.engine = None
+        self.uci_pool.shutdown()
+        if self.opening_book is not None:
+            self.opening_book.close()
+            self.opening_book = None
+        if self.tablebases is not None:
+            self.tablebases.close()
+            self.tablebases = None
+
+    def requestEngineMove(self, newfen, repetitions=None, time_left=None, on_progress=None):
+        '''Starts the engine searching newfen in the background, within its clock time left in seconds if given.
+        Returns a future resolving to the move, or None if cancelled.'''
+        return self.engine_service.request(newfen, repetitions, time_left, on_progress=on_progress)
+
+    def ponderEngineMove(self, newfen, repetitions=None, time_left=None) -> None:
+        'Starts the engine searching newfen, the position after the reply it expects, on the player\'s time.'
+        self.engine_service.request(newfen, repetitions, time_left, ponder=True)
+
+    def enginePonderHit(self, time_left=None):
+        'Returns the future of the ponder search after the expected reply was played, or None if there was none.'
+        return self.engine_service.ponderHit(time_left)
+
+    def engineExpectedReply(self):
+        'Returns the reply the engine expects to its last move, or None.'
+        return self.engine_service.expectedReply()
+
+    def cancelEngineMove(self) -> None:
+        'Stops the background search, e.g. when the game ends while the engine is thinking.'
+        self.engine_service.cancel()
+
+    def tablebaseDraw(self, fen: str) -> bool:
+        'Returns whether the tablebases know fen to be a draw with best play.'
+        if self.tablebases is None:
+            return False
+        result = self.tablebases.probe(logic.Board(fen))
+        return (result is not None) and (result[0] == tablebase.DRAW)
+
+    def updateEngineFen(self, newfen, repetitions=None) -> None:
         'Updates the position for the engine'
-        self.engine.updatePosition(newfen)
+        self.engine.updatePosition(newfen, repetitions)
 
     def newANIIL(self, configurations):
         'Creates a new ANIIL file.'
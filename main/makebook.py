@@ -0,0 +1,27 @@
+# main/makebook.py
+# Compiles PGN files into an opening book for modules.book
+#
+#   python main/makebook.py games.pgn [more.pgn ...] [-o main/books/book.bin] [--plies 30]
+import sys
+import os
+import argparse
+import time
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from modules.book import DEFAULT_BOOK, DEFAULT_MAX_PLY, compileBook
+
+
+def main(arguments=None) -> None:
+    'Parses the command line and writes the book.'
+    parser = argparse.ArgumentParser(description='Compile PGN files into an opening book.')
+    parser.add_argument('pgn', nargs='+', help='PGN files to read')
+    parser.add_argument('-o', '--output', default=DEFAULT_BOOK, help='book file to write')
+    parser.add_argument('--plies', type=int, default=DEFAULT_MAX_PLY, help='plies of each game to add')
+    options = parser.parse_args(arguments)
+    start = time.perf_counter()
+    entries = compileBook(options.pgn, options.output, options.plies)
+    print(f'{entries} entries written to {options.output} in {time.perf_counter() - start:.1f}s')
+
+# Program entry point
+if __name__ == '__main__':
+    main()
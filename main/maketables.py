@@ -0,0 +1,30 @@
+# main/maketables.py
+# Generates the endgame tables probed by modules.tablebase
+#
+#   python main/maketables.py [-o main/tablebases] [KQK KRK KPK]
+import sys
+import os
+import argparse
+import time
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from modules.tablebase import DEFAULT_DIRECTORY, TABLES, generateTables
+
+
+def main(arguments=None) -> None:
+    'Parses the command line and writes the tables.'
+    parser = argparse.ArgumentParser(description='Generate endgame tables by retrograde analysis.')
+    parser.add_argument('tables', nargs='*', help=f'tables to generate, all of {" ".join(TABLES)} by default')
+    parser.add_argument('-o', '--output', default=DEFAULT_DIRECTORY, help='directory to write the tables to')
+    options = parser.parse_args(arguments)
+    for name in options.tables:
+        if name not in TABLES:
+            parser.error(f'unknown table {name}')
+    start = time.perf_counter()
+    generateTables(options.output, [name for name in TABLES if (not options.tables) or (name in options.tables)],
+                   lambda name: print(f'{name} ({time.perf_counter() - start:.1f}s)'))
+    print(f'Tables written to {options.output} in {time.perf_counter() - start:.1f}s')
+
+# Program entry point
+if __name__ == '__main__':
+    main()
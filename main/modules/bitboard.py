@@ -0,0 +1,64 @@
+# main/bitboard.py
+# Constants and helpers for the 64-bit integer board representation
+# Squares are indexed 0-63 from a1 to h8, so a1 = 0, h1 = 7 and h8 = 63
+
+# Colors and piece types ///
+WHITE = 0
+BLACK = 1
+PAWN = 0
+KNIGHT = 1
+BISHOP = 2
+ROOK = 3
+QUEEN = 4
+KING = 5
+
+COLOR_NAMES = ('white', 'black')
+COLOR_INDEX = {'white': WHITE, 'black': BLACK}
+PIECE_NAMES = ('pawn', 'knight', 'bishop', 'rook', 'queen', 'king')
+PIECE_INDEX = {name: i for i, name in enumerate(PIECE_NAMES)}
+# Indexed by piece code, white pieces first
+PIECE_SYMBOLS = 'PNBRQKpnbrqk'
+
+# Squares ///
+FILES = 'abcdefgh'
+RANKS = '12345678'
+SQUARE_NAMES = tuple(f + r for r in RANKS for f in FILES)
+SQUARE_INDEX = {name: i for i, name in enumerate(SQUARE_NAMES)}
+SQUARE_BITS = tuple(1 << i for i in range(64))
+
+# Masks ///
+EMPTY = 0
+FULL = 0xFFFFFFFFFFFFFFFF
+FILE_A = 0x0101010101010101
+FILE_H = FILE_A << 7
+RANK_1 = 0xFF
+RANK_8 = RANK_1 << 56
+
+
+def pieceCode(color: int, piece_type: int) -> int:
+    'Returns the integer code (0-11) of a piece of color and type.'
+    return color * 6 + piece_type
+
+def squareIndex(pos):
+    'Returns square index of a position given as a string or (file, rank) tuple, or None if off the board.'
+    if isinstance(pos, str):
+        return SQUARE_INDEX.get(pos)
+    elif isinstance(pos, tuple):
+        if (1 <= pos[0] <= 8) and (1 <= pos[1] <= 8):
+            return (pos[1] - 1) * 8 + (pos[0] - 1)
+    return None
+
+def squaresOf(bitboard: int):
+    'Yields the index of every set square in a bitboard, from a1 upwards.'
+    while bitboard:
+        lsb = bitboard & -bitboard
+        yield lsb.bit_length() - 1
+        bitboard ^= lsb
+
+def popCount(bitboard: int) -> int:
+    'Returns the number of set squares in a bitboard.'
+    return bitboard.bit_count()
+
+def lsbIndex(bitboard: int) -> int:
+    'Returns the index of the lowest set square in a non-empty bitboard.'
+    return (bitboard & -bitboard).bit_length() - 1
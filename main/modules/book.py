@@ -0,0 +1,169 @@
+# main/book.py
+# Opening book stored as a sorted array of fixed size entries, read through mmap so it never has to fit in memory
+# The entry layout and move encoding follow Polyglot, the keys are the engine's own Zobrist keys
+import mmap
+import os
+import re
+import struct
+from modules.logic import Board
+from modules.movegen import FLAG_CASTLE
+
+# Key, move, weight and an unused learn field, big-endian like Polyglot
+ENTRY = struct.Struct('>QHHI')
+KEY = struct.Struct('>Q')
+ENTRY_SIZE = ENTRY.size
+MAX_WEIGHT = 0xFFFF
+# Plies from the start of each game that go into a compiled book
+DEFAULT_MAX_PLY = 30
+# Book opened by the game when present, BOOK_PATH overrides it
+DEFAULT_BOOK = (os.environ.get('BOOK_PATH')
+                or os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'books', 'book.bin'))
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+
+# King destination -> rook square, castling is written as the king taking its own rook
+_CASTLING_TARGETS = {6: 7, 2: 0, 62: 63, 58: 56}
+
+
+def encodeBookMove(move: int) -> int:
+    'Returns an encoded board move in the book\'s 16 bit form: to square, from square, promotion piece.'
+    from_square = move & 63
+    to_square = (move >> 6) & 63
+    if (move >> 16) & FLAG_CASTLE:
+        to_square = _CASTLING_TARGETS[to_square]
+    return to_square | (from_square << 6) | (((move >> 12) & 7) << 12)
+
+def sanMoves(movetext: str) -> list:
+    'Returns the SAN moves of PGN movetext, leaving out comments, variations, NAGs, move numbers and the result.'
+    text = re.sub(r'\{[^}]*\}|;[^\n]*', ' ', movetext)
+    # Variations may nest
+    depth = 0
+    mainline = []
+    for char in text:
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth = max(0, depth - 1)
+        elif depth == 0:
+            mainline.append(char)
+    moves = []
+    for token in ''.join(mainline).split():
+        token = re.sub(r'^\d+\.+', '', token)
+        if token and (not token.startswith('$')) and (token not in RESULTS):
+            moves.append(token)
+    return moves
+
+def readGames(lines):
+    'Yields (headers, SAN moves) for every game in the lines of a PGN file.'
+    headers = {}
+    movetext = []
+    for line in lines:
+        line = line.strip()
+        if line.startswith('[') and line.endswith(']'):
+            if movetext:
+                yield headers, sanMoves('\n'.join(movetext))
+                headers = {}
+                movetext = []
+            name, _, value = line[1:-1].partition(' ')
+            headers[name] = value.strip().strip('"')
+        elif line and not line.startswith('%'):
+            movetext.append(line)
+    if movetext:
+        yield headers, sanMoves('\n'.join(movetext))
+
+def compileBook(pgn_paths: list, output_path: str, max_ply: int = DEFAULT_MAX_PLY) -> int:
+    '''Builds a book from PGN files and returns the number of entries written. A move weighs 2 for every game
+    the side playing it won and 1 for every draw or unknown result, moves only seen in losses are left out.'''
+    weights = {}
+    for path in pgn_paths:
+        with open(path, encoding='utf-8', errors='replace') as file:
+            for headers, moves in readGames(file):
+                result = headers.get('Result', '*')
+                board = Board(headers.get('FEN', START_FEN))
+                for san in moves[:max_ply]:
+                    move = board.sanToMove(san)
+                    if move is None:
+                        # Illegal or unreadable, the rest of the game can't be trusted
+                        break
+                    if result == '1-0':
+                        weight = 2 if board.active_color == 'w' else 0
+                    elif result == '0-1':
+                        weight = 2 if board.active_color == 'b' else 0
+                    else:
+                        weight = 1
+                    if weight:
+                        entry = (board.zobrist_key, encodeBookMove(move))
+                        weights[entry] = weights.get(entry, 0) + weight
+                    board.makeMove(move)
+
+    # Scale down to fit 16 bits, keeping every move playable
+    largest = max(weights.values(), default=0)
+    scale = largest / MAX_WEIGHT if largest > MAX_WEIGHT else 1
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(output_path, 'wb') as file:
+        for (key, move), weight in sorted(weights.items()):
+            file.write(ENTRY.pack(key, move, max(1, int(weight / scale)), 0))
+    return len(weights)
+
+def openBook(path: str = DEFAULT_BOOK):
+    'Returns the OpeningBook at path, or None if there is no book there.'
+    if not os.path.isfile(path):
+        return None
+    return OpeningBook(path)
+
+
+class OpeningBook:
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        self.size = size // ENTRY_SIZE
+        # An empty file can't be mapped
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b''
+
+    # Public Get methods ///
+    def entries(self, key: int) -> list:
+        'Returns the (book move, weight) pairs stored for a position key, found by binary search. (Getter)'
+        data = self.data
+        low = 0
+        high = self.size
+        while low < high:
+            middle = (low + high) >> 1
+            if KEY.unpack_from(data, middle * ENTRY_SIZE)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        found = []
+        while low < self.size:
+            entry_key, move, weight, _ = ENTRY.unpack_from(data, low * ENTRY_SIZE)
+            if entry_key != key:
+                break
+            found.append((move, weight))
+            low += 1
+        return found
+    def bookMoves(self, board: Board) -> list:
+        'Returns (encoded move, weight) for every legal move the book has for the board\'s side to move. (Getter)'
+        weights = dict(self.entries(board.zobrist_key))
+        if not weights:
+            return []
+        moves = board.legalMoves('white' if board.active_color == 'w' else 'black')
+        return [(move, weights[encodeBookMove(move)]) for move in moves if weights.get(encodeBookMove(move))]
+    def chooseMove(self, board: Board, random):
+        'Returns a book move for the board picked at random by weight, or None if out of book. (Getter)'
+        moves = self.bookMoves(board)
+        if not moves:
+            return None
+        pick = random.randrange(sum(weight for _, weight in moves))
+        for move, weight in moves:
+            pick -= weight
+            if pick < 0:
+                return move
+
+    # Other methods ///
+    def close(self) -> None:
+        'Unmaps and closes the book file.'
+        if self.size:
+            self.data.close()
+        self.file.close()
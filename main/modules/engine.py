@@ -1,41 +1,134 @@
 # main/engine.py
 from modules.logic import Board
-from stockfish import Stockfish
-from random import randint
+from modules.bitboard import QUEEN
+from modules.movegen import moveToString, staticExchange
+from modules.transposition import TranspositionTable, EXACT, LOWER, UPPER
+from modules.ordering import MoveOrderer
+from modules.evaluation import taperedScore, MATE_SCORE
+from modules.repetition import RepetitionTracker
+from modules.uci import UCIEngine, REPLY_TIMEOUT
+from modules.tablebase import WIN, DRAW, openTablebases
+from random import Random
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import threading
+import time
+import os
+
+# Time management, all in seconds
+MOVES_TO_GO = 30        # moves the remaining clock time is spread over
+MAX_CLOCK_FRACTION = 0.5  # most of the clock a single move may use
+SAFETY_MARGIN = 0.25    # left for the UI to apply the move before the clock ticks
+MIN_MOVE_TIME = 0.05
+# Deepest iteration of a timed search
+MAX_DEPTH = 64
+# Pondering stops after PONDER_FACTOR times the move's own budget, and never runs past PONDER_MAX_TIME
+PONDER_FACTOR = 2
+PONDER_MAX_TIME = 10.0
+# Nodes searched between deadline checks
+CHECK_INTERVAL = 127
+# Scores beyond this are mates, counted in plies from the root while searching and from the node when stored
+MATE_BOUND = MATE_SCORE - 1000
+# Seed of the engine's random choices, so games can be replayed
+DEFAULT_SEED = 0
+# Processes of the game window's parallel root search, half the cores unless ENGINE_WORKERS says otherwise
+DEFAULT_WORKERS = int(os.environ.get('ENGINE_WORKERS') or max(1, (os.cpu_count() or 1) // 2))
+
+
+class SearchTimeout(Exception):
+    'Raised inside the search when the deadline has passed or the search was stopped.'
+
+
+# Root-parallel workers ///
+# Each worker process keeps one engine, so its transposition table carries over between tasks
+_worker_engine = None
+
+def _initWorker(hash_mb: int, stop_event, tablebase_directory) -> None:
+    '''Creates the engine of a worker process, stopping its searches whenever stop_event is set.
+    Tables are mapped again in each worker, mmap shares their pages between processes.'''
+    global _worker_engine
+    tablebases = openTablebases(tablebase_directory) if tablebase_directory is not None else None
+    _worker_engine = ChessEngine('classic', 0, 'white', None, False, hash_mb, tablebases=tablebases)
+    _worker_engine.stop_event = stop_event
+
+def _searchRootMove(fen: str, keys: list, move: int, depth: int, maxing: bool, alpha, beta, deadline):
+    '''Worker task searching one root move depth plies deep within (alpha, beta). deadline is wall clock
+    time so it means the same in every process. Returns (move, eval or None if out of time, nodes, pid, the
+    reply the worker expects as a move string or None).'''
+    engine = _worker_engine
+    position = Board(fen)
+    repetitions = RepetitionTracker()
+    for key in keys:
+        repetitions.push(key)
+    position.setRepetitions(repetitions)
+    engine.nodes = 0
+    engine.deadline = None if deadline is None else time.perf_counter() + (deadline - time.time())
+    position.makeMove(move)
+    try:
+        eval = engine.minimax(position, depth - 1, alpha, beta, not maxing)
+    except SearchTimeout:
+        eval = None
+    # The parent's table never sees the worker's search, so the reply is passed back for pondering
+    reply = engine.transposition_table.bestMove(position.zobrist_key)
+    color = 'white' if position.active_color == 'w' else 'black'
+    if (reply is not None) and (reply not in position.legalMoves(color)):
+        reply = None
+    return move, eval, engine.nodes, os.getpid(), moveToString(reply) if reply is not None else None
+
 
 class ChessEngine:
-    def __init__(self, type: str, level: int, color: str, current_position: Board, fast: bool):
+    def __init__(self, type: str, level: int, color: str, current_position: Board, fast: bool, hash_mb: int = 16,
+                 seed: int = DEFAULT_SEED, workers: int = 1, uci_pool=None, book=None, tablebases=None):
         self.color = color
+        # OpeningBook consulted before searching, and Tablebases probed for positions of three pieces or fewer
+        self.book = book
+        self.tablebases = tablebases
+        self.random = Random(seed)
+        self.hash_mb = hash_mb
+        # Kept between moves, keys do not depend on the board instance
+        self.transposition_table = TranspositionTable(hash_mb)
+        # Root moves are split over this many processes when above one
+        self.workers = workers
+        self.pool = None
+        self.worker_nodes = {}
+        # Set from another thread to abort the search, the worker processes share worker_stop
+        self.stop_event = threading.Event()
+        self.stop_lock = threading.Lock()
+        self.worker_stop = None
+        # Called with (depth, score, pv) as the search deepens
+        self.progress = None
+        # Set while searching the position after the opponent's expected reply, until ponderHit
+        self.pondering = False
+        self.ponder_move = None
+        self.ponder_timer = None
+        # Replies the parallel search's workers expect by root move, their tables aren't the engine's
+        self.root_replies = {}
+        # UCI process of the stockfish type, borrowed from uci_pool if given and otherwise private
+        self.uci_pool = uci_pool
+        self.uci = None
         if type == 'classic':
             self.type = 'classic'
-            self.depth = 1
+            # Plies searched when there is no clock to budget from
+            self.depth = 4
+            self.deadline = None
+            self.nodes = 0
+            self.orderer = MoveOrderer()
+            self.root_best = None
+            self.root_eval = 0
+            self.search_start = 0
+            self.search_budget = None
+            self.completed_depth = 0
         else:
             self.type = 'stockfish'
-            self.stockfish = Stockfish(path='/opt/homebrew/Cellar/stockfish/16/bin/stockfish')
-            self.stockfish.set_skill_level(level)
+            self.uci = uci_pool.acquire() if uci_pool is not None else UCIEngine()
+            self.uci.setOption('Skill Level', level)
+            self.uci.setOption('Ponder', True)
             if fast:
                 self.bullet = True
             else:
                 self.bullet = False
-        self.material_values = {
-            'pawn': 1,
-            'knight': 3,
-            'bishop': 3,
-            'rook': 5,
-            'queen': 9,
-            'king': 10
-        }
         self.current_position = current_position
-        self.positional_eval = {
-            'a1': 0, 'b1': 0, 'c1': 0, 'd1': 0, 'e1': 0, 'f1': 0, 'g1': 0, 'h1': 0,
-            'a2': 0, 'b2': 0.15, 'c2': 0.15, 'd2': 0.15, 'e2': 0.15, 'f2': 0.15, 'g2': 0.15, 'h2': 0,
-            'a3': 0.1, 'b3': 0.15, 'c3': 0.25, 'd3': 0.25, 'e3': 0.25, 'f3': 0.25, 'g3': 0.15, 'h3': 0.1,
-            'a4': 0.15, 'b4': 0.15, 'c4': 0.25, 'd4': 0.5, 'e4': 0.5, 'f4': 0.25, 'g4': 0.15, 'h4': 0.15,
-            'a5': 0.15, 'b5': 0.15, 'c5': 0.25, 'd5': 0.5, 'e5': 0.5, 'f5': 0.25, 'g5': 0.15, 'h5': 0.15,
-            'a6': 0.1, 'b6': 0.15, 'c6': 0.25, 'd6': 0.25, 'e6': 0.25, 'f6': 0.25, 'g6': 0.15, 'h6': 0.1,
-            'a7': 0, 'b7': 0.15, 'c7': 0.15, 'd7': 0.15, 'e7': 0.15, 'f7': 0.15, 'g7': 0.15, 'h7': 0,
-            'a8': 0, 'b8': 0, 'c8': 0, 'd8': 0, 'e8': 0, 'f8': 0, 'g8': 0, 'h8': 0,
-        }
 
     def max(self, num1, num2) -> int:
         'Self defined max function because python is useless'
@@ -50,119 +143,473 @@ class ChessEngine:
         else:
             return num2
 
-    def staticEvaluation(self, position: Board) -> int:
-        'Returns a static evaluation of the current position, which is an array of tuples.'
-        eval = 0
-        # Piece evaluation
-        for piece in position.allPieces():
-            if piece.getColor() == 'white':
-                eval += self.material_values[piece.name]
-                if piece.getName() in ['pawn', 'knight', 'bishop']:
-                    eval += self.positional_eval[piece.getPos()]
-            elif piece.getColor() == 'black':
-                eval -= self.material_values[piece.name]
-                if piece.getName() in ['pawn', 'knight', 'bishop']:
-                    eval -= self.positional_eval[piece.getPos()]
-            # Protecting pieces (ONLY for depth of 1)
-            # for protected in piece.returnProtectedPieces():
-            #     if piece.getColor() == 'white':
-            #         eval += round((self.material_values[protected.getName()] / 2), 1)
-            #     elif piece.getColor() == 'black':
-            #         eval -= round((self.material_values[protected.getName()] / 2), 1)
-
-        # State evaluation
-        if position.checkState('black'):
-            eval += 25
-        elif position.checkState('white'):
-            eval -= 25
-        
-        if position.checkmateState('black'):
-            eval += 500
-        elif position.checkmateState('white'):
-            eval -= 500
-        
-        if position.stalemateState():
-            eval = 0
+    def tableScore(self, score: int, ply: int) -> int:
+        'Converts a score to store in the transposition table, mates counted from the node instead of the root.'
+        if score > MATE_BOUND:
+            return score + ply
+        if score < -MATE_BOUND:
+            return score - ply
+        return score
+    def searchScore(self, score: int, ply: int) -> int:
+        'Converts a score probed from the transposition table back to mates counted from the root.'
+        if score > MATE_BOUND:
+            return score - ply
+        if score < -MATE_BOUND:
+            return score + ply
+        return score
 
-        return eval
+    def staticEvaluation(self, position: Board) -> int:
+        'Returns a static evaluation of position in centipawns from white\'s side, kept up to date by the board.'
+        return taperedScore(position.mg_score, position.eg_score, position.phase)
         
     def possiblePositions(self, current_position: Board, color: str) -> list:
         'Returns an array of possible positions one move ahead of the current position.'
         positions = []
-        possible_moves = current_position.allPossibleMoves(color)
-        for move in possible_moves:
+        # Packed moves straight from the generator, no Piece or square strings in between
+        for move in current_position.legalMoves(color):
             cloneboard = Board(current_position)
-            pieceat = cloneboard.pieceAt(move[0].getPos())
-            position = cloneboard.movePieceRequest(pieceat, move[1])
-            if position:
-                positions.append(cloneboard)
+            cloneboard.makeMove(move)
+            positions.append(cloneboard)
         return positions
     
-    def minimax(self, position: Board, depth, alpha, beta, max: bool) -> int:
-        'Calculates best possible position.'
+    def minimax(self, position: Board, depth, alpha, beta, max: bool, ply: int = 1) -> int:
+        'Calculates best possible position, making and unmaking moves on position in place.'
+        self.countNode()
+        # Scores a repeated position as a draw, repeating it again would be threefold anyway
+        if position.repetitions.isRepetition():
+            return 0
+        if (self.tablebases is not None) and (position.occupied.bit_count() <= 3):
+            result = self.tablebases.probe(position)
+            if result is not None:
+                return self.tablebaseScore(result, max, ply)
+
+        # Transposition table, scores are always from white's side
+        key = position.zobrist_key
+        entry = self.transposition_table.probe(key)
+        hash_move = None
+        if entry is not None:
+            hash_move = entry[4]
+            if entry[1] >= depth:
+                score = self.searchScore(entry[2], ply)
+                if entry[3] == EXACT:
+                    return score
+                elif entry[3] == LOWER:
+                    alpha = self.max(alpha, score)
+                else:
+                    beta = self.min(beta, score)
+                if beta <= alpha:
+                    return score
+
         if depth == 0:
-            return self.staticEvaluation(position)
-        
+            return self.quiescence(position, alpha, beta, max, ply)
+
+        color = 'white' if max else 'black'
+        moves = position.legalMoves(color)
+        if not moves:
+            # Checkmate or stalemate
+            eval = (ply - MATE_SCORE if max else MATE_SCORE - ply) if position.checkState(color) else 0
+            self.transposition_table.store(key, depth, self.tableScore(eval, ply), EXACT, None)
+            return eval
+
+        alpha_start = alpha
+        beta_start = beta
+        best_move = None
         if max: # if white to move
-            max_eval = -99999
-            possible_positions = self.possiblePositions(position, 'white')
-            for child in possible_positions:
-                eval = self.minimax(child, depth-1, alpha, beta, False)
-                max_eval = self.max(max_eval, eval)
+            best_eval = -99999
+            for move in self.orderer.orderedMoves(position, moves, hash_move, ply):
+                position.makeMove(move)
+                eval = self.minimax(position, depth-1, alpha, beta, False, ply+1)
+                position.unmakeMove()
+                if eval > best_eval:
+                    best_eval = eval
+                    best_move = move
                 alpha = self.max(alpha, eval)
                 if beta <= alpha:
+                    self.orderer.recordCutoff(position, move, depth, ply)
                     break
-            return max_eval
         
         else: # if black to move
-            min_eval = 99999
-            possible_positions = self.possiblePositions(position, 'black')
-            for child in possible_positions:
-                eval = self.minimax(child, depth-1, alpha, beta, True)
-                min_eval = self.min(min_eval, eval)
+            best_eval = 99999
+            for move in self.orderer.orderedMoves(position, moves, hash_move, ply):
+                position.makeMove(move)
+                eval = self.minimax(position, depth-1, alpha, beta, True, ply+1)
+                position.unmakeMove()
+                if eval < best_eval:
+                    best_eval = eval
+                    best_move = move
                 beta = self.min(beta, eval)
                 if beta <= alpha:
+                    self.orderer.recordCutoff(position, move, depth, ply)
                     break
-            return min_eval
+
+        if best_eval <= alpha_start:
+            bound = UPPER
+        elif best_eval >= beta_start:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.transposition_table.store(key, depth, self.tableScore(best_eval, ply), bound, best_move)
+        return best_eval
     
-    def bestMove(self) -> str:
-        'Returns best move for engine using minimax in the form \'square1square2\''
+    def quiescence(self, position: Board, alpha, beta, max: bool, ply: int) -> int:
+        'Resolves captures and promotions left at the horizon so a hanging piece is never scored as safe.'
+        self.countNode()
+        # Either side may decline to capture, so the static evaluation is a bound
+        stand_pat = self.staticEvaluation(position)
+        if max:
+            if stand_pat >= beta:
+                return stand_pat
+            alpha = self.max(alpha, stand_pat)
+        else:
+            if stand_pat <= alpha:
+                return stand_pat
+            beta = self.min(beta, stand_pat)
+
+        best_eval = stand_pat
+        color = 'white' if max else 'black'
+        captures = position.legalMoves(color, captures_only=True)
+        for move in self.orderer.orderedMoves(position, captures, None, ply):
+            # Skip underpromotions and exchanges that lose material
+            promotion = (move >> 12) & 15
+            if (promotion and promotion != QUEEN) or (staticExchange(position, move) < 0):
+                continue
+            position.makeMove(move)
+            eval = self.quiescence(position, alpha, beta, not max, ply+1)
+            position.unmakeMove()
+            if max:
+                best_eval = self.max(best_eval, eval)
+                alpha = self.max(alpha, eval)
+            else:
+                best_eval = self.min(best_eval, eval)
+                beta = self.min(beta, eval)
+            if beta <= alpha:
+                break
+        return best_eval
+
+    def tablebaseScore(self, result: tuple, max: bool, ply: int) -> int:
+        'Converts a tablebase (outcome, plies) for the side to move into a score from white\'s side, scaled like mates in the search.'
+        outcome, plies = result
+        if outcome == DRAW:
+            return 0
+        score = MATE_SCORE - (ply + plies)
+        return score if (outcome == WIN) == max else -score
+
+    def tablebaseMove(self, position: Board):
+        'Returns the move that mates soonest, or holds the draw or delays mate longest, if the tables cover position. (Getter)'
+        if self.tablebases.probe(position) is None:
+            return None
+        best_move = None
+        best_score = None
+        for move in position.legalMoves('white' if position.active_color == 'w' else 'black'):
+            position.makeMove(move)
+            result = self.tablebases.probe(position)
+            position.unmakeMove()
+            if result is None:
+                continue
+            # The result is the opponent's
+            outcome, plies = result
+            score = 0 if outcome == DRAW else (plies - MATE_SCORE if outcome == WIN else MATE_SCORE - plies)
+            if (best_score is None) or (score > best_score):
+                best_move = move
+                best_score = score
+        return best_move
+
+    def countNode(self) -> None:
+        'Counts a searched node, raising SearchTimeout once the deadline has passed or the search is stopped.'
+        self.nodes += 1
+        if not self.nodes & CHECK_INTERVAL:
+            if self.stop_event.is_set() or ((self.deadline is not None) and (time.perf_counter() > self.deadline)):
+                raise SearchTimeout
+
+    def bestMove(self, time_left=None, increment=0, max_time=None, ponder=False) -> str:
+        '''Returns best move for engine in the form \'square1square2\', using time_left seconds of clock if given
+        and at most max_time seconds if given. With ponder the position is the one after the opponent\'s
+        expected reply, searched on the opponent\'s time until ponderHit or the ponder budget runs out'''
+        if self.book is not None:
+            move = self.book.chooseMove(self.current_position, self.random)
+            if move is not None:
+                # Nothing was searched, so there is no reply to expect
+                self.ponder_move = None
+                if self.uci is not None:
+                    self.uci.ponder_move = None
+                return moveToString(move)
+        if self.tablebases is not None:
+            move = self.tablebaseMove(self.current_position)
+            if move is not None:
+                self.ponder_move = None
+                if self.uci is not None:
+                    self.uci.ponder_move = None
+                return moveToString(move)
+        budget = self.timeBudget(time_left, increment)
+        if max_time is not None:
+            budget = max_time if budget is None else self.min(budget, max_time)
+        ponder_budget = self.ponderBudget(budget) if ponder else None
         if self.type == 'classic':
-            current_eval = self.staticEvaluation(self.current_position)
-            best_move = None
-            if self.color == 'white':
-                best_eval = -999999
-                maxing = False
-            elif self.color == 'black':
-                best_eval = 999999
-                maxing = True
-
-            for move in self.current_position.allPossibleMoves(self.color):
-                cloneboard = Board(self.current_position)
-                cloneboard.movePieceRequest(move[0], move[1])
-                eval = self.minimax(cloneboard, self.depth, -999999, 999999, maxing)
-                cloneboard.undoLastMove()
-                if self.color == 'white':
-                    if eval > best_eval:
-                        best_eval = eval
-                        best_move = move
-                    if best_eval > current_eval:
-                        return best_move
-                elif self.color == 'black':
-                    if eval < best_eval:
-                        best_eval = eval
-                        best_move = move
-                    if best_eval < current_eval:
-                        return best_move[0].getPos() + best_move[1]
-            return best_move[0].getPos() + best_move[1]
+            return self.iterativeDeepening(budget, ponder_budget)
         elif self.type == 'stockfish':
-            self.stockfish.set_fen_position(self.current_position.fen.string)
+            self.uci.setPosition(self.current_position.getFen().getString())
             if self.bullet:
-                best_move = self.stockfish.get_best_move_time(1000)
+                movetime = 1000
             else:
-                best_move = self.stockfish.get_best_move_time(randint(1000, 5000))
-            return best_move
+                movetime = self.random.randint(1000, 5000)
+            if budget is not None:
+                movetime = self.min(movetime, int(budget * 1000))
+            if self.progress is not None:
+                progress = self.progress
+                # UCI scores are from the side to move
+                sign = 1 if self.color == 'white' else -1
+                def on_info(depth, score, pv):
+                    progress(depth, score * sign, pv)
+            else:
+                on_info = None
+            timeout = REPLY_TIMEOUT + movetime / 1000
+            # Under the lock so a stop either lands before go or finds the search running
+            with self.stop_lock:
+                if self.stop_event.is_set():
+                    return None
+                self.uci.startSearch(movetime, ponder=ponder)
+                if ponder:
+                    # A ponder search has no limit of its own, stopping it still yields a move
+                    timeout += ponder_budget
+                    self.ponder_timer = threading.Timer(ponder_budget, self.uci.stop)
+                    self.ponder_timer.daemon = True
+                    self.ponder_timer.start()
+            try:
+                return self.uci.readBestMove(timeout, on_info)
+            finally:
+                if self.ponder_timer is not None:
+                    self.ponder_timer.cancel()
+                    self.ponder_timer = None
+
+    def ponderBudget(self, budget) -> float:
+        'Returns the most seconds to ponder for, given the budget of a normal move or None without a clock.'
+        if budget is None:
+            return PONDER_MAX_TIME
+        return self.min(budget * PONDER_FACTOR, PONDER_MAX_TIME)
+
+    def ponderMove(self):
+        'Returns the opponent reply expected after the last move found, in the form \'square1square2\', or None. (Getter)'
+        if self.uci is not None:
+            return self.uci.ponder_move
+        return self.ponder_move
+
+    def ponderHit(self, time_left=None, increment=0, max_time=None) -> None:
+        '''The expected reply was played, so the running ponder search becomes the real search with the budget
+        of time_left seconds of clock like bestMove. Time spent pondering counts towards it, so a long ponder
+        answers at once.'''
+        budget = self.timeBudget(time_left, increment)
+        if max_time is not None:
+            budget = max_time if budget is None else self.min(budget, max_time)
+        with self.stop_lock:
+            if self.type == 'classic':
+                now = time.perf_counter()
+                self.search_budget = budget
+                if budget is not None:
+                    self.deadline = self.search_start + budget
+                elif self.completed_depth >= self.depth:
+                    # Already searched as deep as an untimed move goes, finish now
+                    self.deadline = now
+                else:
+                    self.deadline = None
+                self.pondering = False
+            elif self.uci is not None:
+                if self.ponder_timer is not None:
+                    self.ponder_timer.cancel()
+                self.uci.ponderHit()
+
+    def stopSearch(self) -> None:
+        'Aborts the running search from another thread, it unwinds within a few hundred nodes.'
+        with self.stop_lock:
+            self.stop_event.set()
+            if self.worker_stop is not None:
+                self.worker_stop.set()
+            if self.uci is not None:
+                self.uci.stop()
+
+    def clearStop(self) -> None:
+        'Lets searches run again after stopSearch.'
+        with self.stop_lock:
+            self.stop_event.clear()
+            if self.worker_stop is not None:
+                self.worker_stop.clear()
+
+    def timeBudget(self, time_left, increment=0):
+        'Returns seconds to spend on this move from the clock time left, or None without a clock.'
+        if time_left is None:
+            return None
+        # The clock counts whole seconds, so up to a second of time_left may already be gone
+        remaining = time_left - 1
+        budget = remaining / MOVES_TO_GO + increment
+        return self.max(MIN_MOVE_TIME, self.min(budget, remaining * MAX_CLOCK_FRACTION - SAFETY_MARGIN))
+
+    def iterativeDeepening(self, budget=None, ponder_budget=None) -> str:
+        '''Searches one ply deeper at a time until the depth limit or time budget is reached. With ponder_budget
+        it keeps deepening until ponderHit hands it budget, or ponder_budget seconds pass.'''
+        position = self.current_position
+        moves = position.legalMoves(self.color)
+        if not moves:
+            return None
+        self.orderer.newSearch()
+        moves = list(self.orderer.orderedMoves(position, moves, self.transposition_table.bestMove(position.zobrist_key), 0))
+        self.nodes = 0
+        self.worker_nodes = {}
+        self.root_replies = {}
+        self.completed_depth = 0
+        self.pondering = ponder_budget is not None
+        self.search_start = time.perf_counter()
+        self.search_budget = budget
+        limit = ponder_budget if self.pondering else budget
+        self.deadline = None if limit is None else self.search_start + limit
+        best_move = moves[0]
+        for depth in range(1, MAX_DEPTH + 1):
+            try:
+                # Pondering keeps to one core, the opponent's time is not ours to spend
+                if (self.workers > 1) and not self.pondering:
+                    # Workers compare against wall clock time, perf_counter is per process
+                    wall_deadline = None if self.deadline is None else time.time() + (self.deadline - time.perf_counter())
+                    best_move = self.parallelSearchRoot(position, moves, depth, wall_deadline)
+                else:
+                    best_move = self.searchRoot(position, moves, depth)
+            except SearchTimeout:
+                # Out of time during the first iteration, the best move so far beats none at all
+                if depth == 1:
+                    best_move = self.root_best
+                break
+            self.completed_depth = depth
+            if self.progress is not None:
+                self.progress(depth, self.root_eval, self.principalVariation(position, best_move, depth))
+            if len(moves) == 1:
+                break
+            # Search the best move first next iteration
+            moves.remove(best_move)
+            moves.insert(0, best_move)
+            if self.searchDone(depth):
+                break
+        self.deadline = None
+        self.pondering = False
+        line = self.principalVariation(position, best_move, 2)
+        self.ponder_move = line[1] if len(line) > 1 else self.root_replies.get(best_move)
+        return moveToString(best_move)
+
+    def searchDone(self, depth: int) -> bool:
+        'Returns whether iterative deepening should stop after completing depth plies. (Getter)'
+        if self.pondering:
+            return False
+        if self.search_budget is None:
+            return depth >= self.depth
+        # Each iteration takes several times longer than the last, don't start one that can't finish
+        return time.perf_counter() - self.search_start > self.search_budget * 0.4
+
+    def principalVariation(self, position: Board, best_move: int, depth: int) -> list:
+        'Returns the expected line as move strings, following best moves stored in the transposition table. (Getter)'
+        line = [best_move]
+        position.makeMove(best_move)
+        while len(line) < depth:
+            move = self.transposition_table.bestMove(position.zobrist_key)
+            color = 'white' if position.active_color == 'w' else 'black'
+            if (move is None) or position.repetitions.isRepetition() or (move not in position.legalMoves(color)):
+                break
+            line.append(move)
+            position.makeMove(move)
+        for _ in line:
+            position.unmakeMove()
+        return [moveToString(move) for move in line]
+
+    def searchRoot(self, position: Board, moves: list, depth: int) -> int:
+        'Returns the best of moves searched depth plies deep, leaving position as it was even on timeout.'
+        maxing = self.color == 'white'
+        alpha = -999999
+        beta = 999999
+        # Kept on the engine so a timed out iteration can still report it
+        self.root_best = moves[0]
+        root = len(position.move_stack)
+        try:
+            for move in moves:
+                position.makeMove(move)
+                eval = self.minimax(position, depth - 1, alpha, beta, not maxing)
+                position.unmakeMove()
+                if maxing and (eval > alpha):
+                    alpha = eval
+                    self.root_best = move
+                elif (not maxing) and (eval < beta):
+                    beta = eval
+                    self.root_best = move
+        except SearchTimeout:
+            while len(position.move_stack) > root:
+                position.unmakeMove()
+            raise
+        self.root_eval = alpha if maxing else beta
+        return self.root_best
     
-    def updatePosition(self, newfen) -> None:
-        'Updates internal position'
+    def parallelSearchRoot(self, position: Board, moves: list, depth: int, deadline=None) -> int:
+        '''Searches the first root move, then the rest in parallel worker tasks bounded by its score,
+        and returns the best like searchRoot. Falls back to searchRoot if the pool breaks.
+        deadline is wall clock time.'''
+        if self.pool is None:
+            # Spawn rather than fork, forking a process running Qt threads is unsafe
+            context = multiprocessing.get_context('spawn')
+            self.worker_stop = context.Event()
+            directory = self.tablebases.directory if self.tablebases is not None else None
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context, initializer=_initWorker,
+                                            initargs=(self.hash_mb, self.worker_stop, directory))
+        maxing = self.color == 'white'
+        fen = position.getFen().getString()
+        keys = position.repetitions.keys
+        self.root_best = moves[0]
+        try:
+            # The first move is usually best, its score lets every other move fail fast
+            first = self.pool.submit(_searchRootMove, fen, keys, moves[0], depth, maxing, -999999, 999999, deadline)
+            results = [first.result()]
+            best_eval = results[0][1]
+            if best_eval is not None:
+                alpha, beta = (best_eval, 999999) if maxing else (-999999, best_eval)
+                futures = [self.pool.submit(_searchRootMove, fen, keys, move, depth, maxing, alpha, beta, deadline)
+                           for move in moves[1:]]
+                results.extend(future.result() for future in futures)
+        except BrokenProcessPool:
+            self.shutdown()
+            self.workers = 1
+            return self.searchRoot(position, moves, depth)
+
+        # Moves failing low against the first score only return a bound, so only strict improvements count
+        timed_out = False
+        for move, eval, nodes, pid, reply in results:
+            self.nodes += nodes
+            self.worker_nodes[pid] = self.worker_nodes.get(pid, 0) + nodes
+            if reply is not None:
+                self.root_replies[move] = reply
+            if eval is None:
+                timed_out = True
+            elif (maxing and eval > best_eval) or ((not maxing) and eval < best_eval):
+                best_eval = eval
+                self.root_best = move
+        if timed_out:
+            raise SearchTimeout
+        self.root_eval = best_eval
+        return self.root_best
+
+    def workerNodes(self) -> dict:
+        'Returns nodes searched per worker process id during the last search. (Getter)'
+        return self.worker_nodes.copy()
+
+    def shutdown(self) -> None:
+        'Stops the worker processes of the parallel search and hands back or quits the UCI process.'
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+            self.worker_stop = None
+        if self.ponder_timer is not None:
+            self.ponder_timer.cancel()
+            self.ponder_timer = None
+        if self.uci is not None:
+            if self.uci_pool is not None:
+                self.uci_pool.release(self.uci)
+            else:
+                self.uci.quit()
+            self.uci = None
+
+    def updatePosition(self, newfen, repetitions=None) -> None:
+        'Updates internal position, continuing from the game\'s repetition tracker if given'
         self.current_position = Board(newfen)
+        if repetitions is not None:
+            self.current_position.setRepetitions(repetitions)
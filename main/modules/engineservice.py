@@ -0,0 +1,93 @@
+# main/engineservice.py
+# Runs engine searches on a background thread, handing results back as futures that can be cancelled
+from concurrent.futures import Future, ThreadPoolExecutor
+import threading
+
+
+class EngineService:
+    def __init__(self, engine=None):
+        self.engine = engine
+        # One search thread, the engine's board and tables are not shared between searches
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='engine')
+        self.current = None
+        self.stop_event = None
+        # Whether the current search is a ponder search still waiting for its hit
+        self.pondering = False
+
+    # Public Get methods ///
+    def isSearching(self) -> bool:
+        'Returns whether a search has been requested and not finished yet. (Getter)'
+        return (self.current is not None) and (not self.current.done())
+    def expectedReply(self):
+        'Returns the reply the engine expects to its last move, worth pondering on, or None. (Getter)'
+        if (self.engine is None) or self.isSearching():
+            return None
+        return self.engine.ponderMove()
+
+    # Public Set methods ///
+    def setEngine(self, engine) -> None:
+        'Switches to another engine, cancelling and waiting out the search of the old one. (Setter)'
+        self.cancel(wait=True)
+        self.engine = engine
+
+    # Other methods ///
+    def request(self, fen: str, repetitions=None, time_left=None, max_time=None, on_progress=None,
+                ponder: bool = False) -> Future:
+        '''Starts a search of fen, cancelling any search still running. The future resolves to the best move
+        as \'square1square2\', or None if there is none or the search was cancelled. time_left is the engine\'s
+        clock in seconds and max_time caps the search in seconds. on_progress(depth, score, pv) is called from
+        the search thread after each iteration, score in centipawns from white\'s side. A ponder search is of
+        the position after the expected reply, see ponderHit.'''
+        self.cancel()
+        engine = self.engine
+        # Copied on the calling thread, the game keeps pushing positions to its own tracker
+        if repetitions is not None:
+            repetitions = repetitions.copy()
+        stop_event = threading.Event()
+
+        def search():
+            # Cleared before checking the flag, so a cancel landing in between still reaches the engine
+            engine.clearStop()
+            if stop_event.is_set():
+                return None
+            engine.updatePosition(fen, repetitions)
+            engine.progress = on_progress
+            try:
+                move = engine.bestMove(time_left, max_time=max_time, ponder=ponder)
+            finally:
+                engine.progress = None
+            return None if stop_event.is_set() else move
+
+        self.stop_event = stop_event
+        self.pondering = ponder
+        self.current = self.executor.submit(search)
+        return self.current
+    def ponderHit(self, time_left=None, max_time=None):
+        '''The expected reply was played, so the ponder search carries on as the real search with time_left
+        and max_time like request. Returns its future, or None if nothing was being pondered.'''
+        if not self.pondering:
+            return None
+        self.pondering = False
+        if not self.current.done():
+            self.engine.ponderHit(time_left, max_time=max_time)
+        return self.current
+    def cancel(self, wait: bool = False) -> None:
+        'Stops the running search, its future then resolves to None. Waits for the search thread to unwind if wait.'
+        future = self.current
+        if future is None:
+            return
+        self.pondering = False
+        # A search still queued sees the flag and returns None without starting
+        self.stop_event.set()
+        self.engine.stopSearch()
+        if wait:
+            try:
+                future.result()
+            except Exception:
+                # Already reported to whoever holds the future
+                pass
+        self.current = None
+    def shutdown(self) -> None:
+        'Cancels the running search and ends the search thread.'
+        self.cancel(wait=True)
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,126 @@
+# main/evaluation.py
+# Material and piece-square tables for the tapered static evaluation
+# Scores are in centipawns from white's side, Board keeps their sums up to date in addPiece/removePiece
+from modules.bitboard import PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING
+
+# Indexed by piece type
+MG_MATERIAL = (100, 320, 330, 500, 900, 0)
+EG_MATERIAL = (120, 300, 320, 530, 950, 0)
+# Game phase each piece type adds, the start position totals PHASE_TOTAL
+PHASE_WEIGHTS = (0, 1, 1, 2, 4, 0)
+PHASE_TOTAL = 24
+# Score of being checkmated, in centipawns less the plies it takes so shorter mates score higher
+MATE_SCORE = 50000
+
+# Piece-square tables from white's side, laid out as seen from white with rank 8 first ///
+_PAWN = (
+      0,   0,   0,   0,   0,   0,   0,   0,
+     50,  50,  50,  50,  50,  50,  50,  50,
+     10,  10,  20,  30,  30,  20,  10,  10,
+      5,   5,  10,  25,  25,  10,   5,   5,
+      0,   0,   0,  20,  20,   0,   0,   0,
+      5,  -5, -10,   0,   0, -10,  -5,   5,
+      5,  10,  10, -20, -20,  10,  10,   5,
+      0,   0,   0,   0,   0,   0,   0,   0,
+)
+_PAWN_ENDGAME = (
+      0,   0,   0,   0,   0,   0,   0,   0,
+     80,  80,  80,  80,  80,  80,  80,  80,
+     50,  50,  50,  50,  50,  50,  50,  50,
+     30,  30,  30,  30,  30,  30,  30,  30,
+     15,  15,  15,  15,  15,  15,  15,  15,
+      5,   5,   5,   5,   5,   5,   5,   5,
+      0,   0,   0,   0,   0,   0,   0,   0,
+      0,   0,   0,   0,   0,   0,   0,   0,
+)
+_KNIGHT = (
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20,   0,   0,   0,   0, -20, -40,
+    -30,   0,  10,  15,  15,  10,   0, -30,
+    -30,   5,  15,  20,  20,  15,   5, -30,
+    -30,   0,  15,  20,  20,  15,   0, -30,
+    -30,   5,  10,  15,  15,  10,   5, -30,
+    -40, -20,   0,   5,   5,   0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50,
+)
+_BISHOP = (
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,  10,  10,   5,   0, -10,
+    -10,   5,   5,  10,  10,   5,   5, -10,
+    -10,   0,  10,  10,  10,  10,   0, -10,
+    -10,  10,  10,  10,  10,  10,  10, -10,
+    -10,   5,   0,   0,   0,   0,   5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20,
+)
+_ROOK = (
+      0,   0,   0,   0,   0,   0,   0,   0,
+      5,  10,  10,  10,  10,  10,  10,   5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+      0,   0,   0,   5,   5,   0,   0,   0,
+)
+_QUEEN = (
+    -20, -10, -10,  -5,  -5, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,   5,   5,   5,   0, -10,
+     -5,   0,   5,   5,   5,   5,   0,  -5,
+      0,   0,   5,   5,   5,   5,   0,  -5,
+    -10,   5,   5,   5,   5,   5,   0, -10,
+    -10,   0,   5,   0,   0,   0,   0, -10,
+    -20, -10, -10,  -5,  -5, -10, -10, -20,
+)
+_KING = (
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+     20,  20,   0,   0,   0,   0,  20,  20,
+     20,  30,  10,   0,   0,  10,  30,  20,
+)
+_KING_ENDGAME = (
+    -50, -40, -30, -20, -20, -30, -40, -50,
+    -30, -20, -10,   0,   0, -10, -20, -30,
+    -30, -10,  20,  30,  30,  20, -10, -30,
+    -30, -10,  30,  40,  40,  30, -10, -30,
+    -30, -10,  30,  40,  40,  30, -10, -30,
+    -30, -10,  20,  30,  30,  20, -10, -30,
+    -30, -30,   0,   0,   0,   0, -30, -30,
+    -50, -30, -30, -30, -30, -30, -30, -50,
+)
+
+_MG_TABLES = {PAWN: _PAWN, KNIGHT: _KNIGHT, BISHOP: _BISHOP, ROOK: _ROOK, QUEEN: _QUEEN, KING: _KING}
+_EG_TABLES = {PAWN: _PAWN_ENDGAME, KNIGHT: _KNIGHT, BISHOP: _BISHOP, ROOK: _ROOK, QUEEN: _QUEEN, KING: _KING_ENDGAME}
+
+
+def _flatScores(material: tuple, tables: dict) -> tuple:
+    'Returns signed material plus piece-square scores indexed [piece code * 64 + square].'
+    scores = []
+    for code in range(12):
+        piece_type = code % 6
+        table = tables[piece_type]
+        for square in range(64):
+            if code < 6:
+                # White reads the table upside down, a1 is its last row
+                scores.append(material[piece_type] + table[square ^ 56])
+            else:
+                scores.append(-(material[piece_type] + table[square]))
+    return tuple(scores)
+
+
+MG_SCORES = _flatScores(MG_MATERIAL, _MG_TABLES)
+EG_SCORES = _flatScores(EG_MATERIAL, _EG_TABLES)
+# Indexed by piece code
+PHASE = PHASE_WEIGHTS * 2
+
+
+def taperedScore(mg_score: int, eg_score: int, phase: int) -> int:
+    'Blends middlegame and endgame scores by game phase, PHASE_TOTAL being a full middlegame.'
+    if phase > PHASE_TOTAL:
+        phase = PHASE_TOTAL
+    return (mg_score * phase + eg_score * (PHASE_TOTAL - phase)) // PHASE_TOTAL
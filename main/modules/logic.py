@@ -1,73 +1,133 @@
 # main/logic.py
 # Processes all chess logic in raw form
-from random import shuffle
+from random import Random
+from modules.bitboard import (WHITE, BLACK, PAWN, KING, COLOR_NAMES, COLOR_INDEX, PIECE_NAMES, PIECE_INDEX,
+                              PIECE_SYMBOLS, FILES, RANKS, SQUARE_NAMES, SQUARE_INDEX, SQUARE_BITS, pieceCode,
+                              squareIndex, squaresOf)
+from modules.movegen import (generateMoves, pieceMoves, moveTo, moveToString, attackersTo, attacksFrom, isSquareAttacked,
+                             pinnedPieces, FLAG_CAPTURE, FLAG_DOUBLE_PUSH, FLAG_ENPASSANT, FLAG_CASTLE, PAWN_ATTACKS)
+from modules.repetition import RepetitionTracker
+from modules.evaluation import MG_SCORES, EG_SCORES, PHASE
+from modules.zobrist import PIECE_KEYS, SIDE_KEY, ENPASSANT_KEYS, castlingKey, enpassantKey, positionKey
+
+# Fixed seed so shuffled move lists are reproducible
+_random = Random(0)
+
+# King destination -> (rook from, rook to) when castling
+CASTLING_ROOKS = {6: (7, 5), 2: (0, 3), 62: (63, 61), 58: (56, 59)}
+# Square -> castling rights lost when a piece moves from or to it
+CASTLING_LOSS = {4: 'KQ', 7: 'K', 0: 'Q', 60: 'kq', 63: 'k', 56: 'q'}
 
 
 class Board:
+    # Fixed attributes, so every position copied in search carries no per-instance dict
+    __slots__ = ('bitboards', 'occupancy', 'occupied', 'mailbox', 'moved', 'move_stack', 'zobrist_key', 'enpassant_key',
+                 'mg_score', 'eg_score', 'phase', 'fen', 'repetitions', 'checkmate', 'stalemate', 'draw',
+                 'active_color', 'castling_availability', 'enpassant_target', 'halfmove_clock', 'fullmove_clock')
+
     def __init__(self, setter):
-        self.board = self.emptyBoard()
-        self.all_pieces: list = []
+        # One bitboard per piece code (color * 6 + type), plus occupancy per color
+        self.bitboards = [0] * 12
+        self.occupancy = [0, 0]
+        self.occupied = 0
+        # Square -> piece code lookup kept in step with the bitboards
+        self.mailbox = [None] * 64
+        # Squares holding a piece that has moved from its original position
+        self.moved = 0
+        # Undo records pushed by makeMove and popped by unmakeMove
+        self.move_stack = []
+        # Zobrist key of the position, and the part of it contributed by the enpassant target
+        self.zobrist_key = 0
+        self.enpassant_key = 0
+        # Material plus piece-square sums for the tapered evaluation, and the game phase
+        self.mg_score = 0
+        self.eg_score = 0
+        self.phase = 0
         self.fen = None
-        self.position_history = []
+        # Position keys since the start of the game, for repetition checks
+        self.repetitions = RepetitionTracker()
         self.setBoard(setter)
-        self.savePosition()
         self.checkmate = None
         self.stalemate = False
         self.draw = False
-        self.last_move = None
-        self.previous_enpassant_target = '-'
 
     # Public Get methods ///
     def getBoard(self) -> list:
-        'Returns board array. (Getter)'
-        return self.board.copy()
+        'Returns board array indexed [file][rank]. (Getter)'
+        board = self.emptyBoard()
+        for square in squaresOf(self.occupied):
+            board[square % 8][square // 8] = self.pieceAt(SQUARE_NAMES[square])
+        return board
     def allPieces(self) -> list:
         'Returns all current pieces in an array. (Getter)'
-        return self.all_pieces.copy()
+        return [self.pieceAt(SQUARE_NAMES[square]) for square in squaresOf(self.occupied)]
     def getFen(self) -> str:
         'Returns current fen. (Getter)'
+        self.fen.boardToFen(self)
         return self.fen
     def pieceAt(self, pos):
         'Returns piece instance at position of either string or tuple. (Getter)'
-        try:
-            board = self.board.copy()
-            if isinstance(pos, tuple):
-                if str(pos[0]) not in '12345678':
-                    return None
-                if str(pos[1]) not in '12345678':
-                    return None
-                return board[pos[0]-1][pos[1]-1]
-            elif isinstance(pos, str):
-                pos_tuple = self.convertPosType(pos)
-                if str(pos_tuple[0]) not in '12345678':
-                    return None
-                if str(pos_tuple[1]) not in '12345678':
-                    return None
-                return board[pos_tuple[0]-1][pos_tuple[1]-1]
+        square = squareIndex(pos)
+        if square is None:
+            return None
+        code = self.mailbox[square]
         # Piece does not exist
-        except:  # noqa: E722
+        if code is None:
             return None
+        has_moved = bool(self.moved & SQUARE_BITS[square])
+        return Piece(PIECE_NAMES[code % 6], COLOR_NAMES[code // 6], SQUARE_NAMES[square], has_moved, self)
     def currentPosition(self) -> list:
+        'Returns board array of piece data, indexed [file][rank]. (Getter)'
         position = self.emptyBoard()
-        for file in range(8):
-            for rank in range(8):
-                if self.pieceAt((file, rank)) is not None:
-                    position[file][rank] = self.pieceAt((file, rank)).data()
-                else:
-                    position[file][rank] = None
-        return position.copy()
+        for square in squaresOf(self.occupied):
+            position[square % 8][square // 8] = self.pieceAt(SQUARE_NAMES[square]).data()
+        return position
     def positionHistory(self) -> list:
-        'Returns position history of the board. (Getter)'
-        return self.position_history.copy()
+        'Returns position history of the board as Zobrist keys. (Getter)'
+        return self.repetitions.history()
+    def repetitionCount(self) -> int:
+        'Returns how often the current position occurred since the last irreversible move. (Getter)'
+        return self.repetitions.count(self.zobrist_key)
+    def drawReason(self):
+        'Returns \'threefold\' or \'fiftymove\' if the position is drawn by either rule, else None. (Getter)'
+        if self.repetitions.count(self.zobrist_key) >= 3:
+            return 'threefold'
+        # A hundred half-moves without a capture or pawn move
+        if self.halfmove_clock >= 100:
+            return 'fiftymove'
+        return None
+    def zobristKey(self) -> int:
+        'Returns the 64-bit Zobrist key of the current position. (Getter)'
+        return self.zobrist_key
     def checkState(self, color: str) -> bool:
         'Returns boolean whether the color is currently in check. (Getter)'
-        for piece in self.all_pieces:
-            valid_moves = piece.calculatePsuedoLegal()
-            for move in valid_moves:
-                if self.pieceAt(move) is not None:
-                    if (self.pieceAt(move).getName() == 'king') and (self.pieceAt(move).getColor() == color):
-                        return True
-        return False
+        king_square = self.kingSquare(color)
+        if king_square is None:
+            return False
+        return isSquareAttacked(self, king_square, COLOR_INDEX[color] ^ 1)
+    def kingSquare(self, color: str):
+        'Returns square index of color\'s king, or None if it is not on the board. (Getter)'
+        king = self.bitboards[pieceCode(COLOR_INDEX[color], KING)]
+        if not king:
+            return None
+        return (king & -king).bit_length() - 1
+    def isSquareAttacked(self, square, by_color: str) -> bool:
+        'Returns whether by_color attacks square, given as an index, string or tuple. (Getter)'
+        if not isinstance(square, int):
+            square = squareIndex(square)
+        return isSquareAttacked(self, square, COLOR_INDEX[by_color])
+    def checkers(self, color: str) -> int:
+        'Returns bitboard of the pieces giving check to color. (Getter)'
+        king_square = self.kingSquare(color)
+        if king_square is None:
+            return 0
+        return attackersTo(self, king_square, COLOR_INDEX[color] ^ 1, self.occupied)
+    def pinnedPieces(self, color: str) -> int:
+        'Returns bitboard of color\'s pieces pinned against its own king. (Getter)'
+        king_square = self.kingSquare(color)
+        if king_square is None:
+            return 0
+        return pinnedPieces(self, COLOR_INDEX[color], king_square)
     def checkmateState(self, color: str) -> bool:
         'Returns whether color has been checkmated. (Getter)'
         if self.checkmate is not None:
@@ -78,16 +138,135 @@ class Board:
         'Returns whether position is in stalemate. (Getter)'
         state = self.draw or self.stalemate
         return state
+    def pseudoLegalMoves(self, color: str) -> list:
+        'Returns array of encoded moves for color before check validation. (Getter)'
+        return generateMoves(self, COLOR_INDEX[color])
+    def legalMoves(self, color: str, captures_only: bool = False) -> list:
+        'Returns array of encoded legal moves for color, or only captures and promotions if captures_only. (Getter)'
+        king_square = self.kingSquare(color)
+        if (king_square is None) or self.checkers(color):
+            return [move for move in generateMoves(self, COLOR_INDEX[color], captures_only) if self.isLegal(move)]
+        # Out of check, only king moves, pinned pieces and en passant can expose the king
+        unsafe = self.pinnedPieces(color) | SQUARE_BITS[king_square]
+        legal_moves = []
+        for move in generateMoves(self, COLOR_INDEX[color], captures_only):
+            if (unsafe & SQUARE_BITS[move & 63]) or ((move >> 16) & FLAG_ENPASSANT):
+                if not self.isLegal(move):
+                    continue
+            legal_moves.append(move)
+        return legal_moves
+    def isLegal(self, move: int) -> bool:
+        'Returns whether an encoded pseudo-legal move leaves the mover\'s king safe. (Getter)'
+        color = COLOR_NAMES[self.mailbox[move & 63] // 6]
+        if (move >> 16) & FLAG_CASTLE:
+            # Cannot castle out of or through check
+            enemy = COLOR_INDEX[color] ^ 1
+            if isSquareAttacked(self, move & 63, enemy):
+                return False
+            if isSquareAttacked(self, ((move & 63) + ((move >> 6) & 63)) >> 1, enemy):
+                return False
+        self.makeMove(move)
+        legal = not self.checkState(color)
+        self.unmakeMove()
+        return legal
+    def hasLegalMove(self, color: str) -> bool:
+        'Returns whether color has at least one legal move. (Getter)'
+        for move in generateMoves(self, COLOR_INDEX[color]):
+            if self.isLegal(move):
+                return True
+        return False
+    def moveToSan(self, move: int) -> str:
+        'Returns a legal encoded move in standard algebraic notation, e.g. \'Nbd7\', \'exd5\' or \'e8=Q+\'. (Getter)'
+        color = COLOR_NAMES[self.mailbox[move & 63] // 6]
+        notation = self.sanNotation(move, self.legalMoves(color))
+        enemy = 'black' if color == 'white' else 'white'
+        self.makeMove(move)
+        if self.checkState(enemy):
+            notation += '+' if self.hasLegalMove(enemy) else '#'
+        self.unmakeMove()
+        return notation
+    def sanNotation(self, move: int, moves: list) -> str:
+        'Returns the algebraic notation of move without check marks, disambiguated against the legal moves. (Getter)'
+        from_square = move & 63
+        to_square = (move >> 6) & 63
+        flags = move >> 16
+        if flags & FLAG_CASTLE:
+            return 'O-O' if to_square > from_square else 'O-O-O'
+        code = self.mailbox[from_square]
+        capture = flags & (FLAG_CAPTURE | FLAG_ENPASSANT)
+        if code % 6 == PAWN:
+            notation = (FILES[from_square & 7] + 'x' if capture else '') + SQUARE_NAMES[to_square]
+            promotion = (move >> 12) & 15
+            if promotion:
+                notation += '=' + PIECE_SYMBOLS[promotion]
+            return notation
+        notation = PIECE_SYMBOLS[code % 6]
+        # Other pieces of the same kind that can reach the same square
+        rivals = [other & 63 for other in moves if (((other >> 6) & 63) == to_square) and ((other & 63) != from_square)
+                  and (self.mailbox[other & 63] == code)]
+        if rivals:
+            if all((square & 7) != (from_square & 7) for square in rivals):
+                notation += FILES[from_square & 7]
+            elif all((square >> 3) != (from_square >> 3) for square in rivals):
+                notation += RANKS[from_square >> 3]
+            else:
+                notation += SQUARE_NAMES[from_square]
+        return notation + ('x' if capture else '') + SQUARE_NAMES[to_square]
+    def sanToMove(self, san: str):
+        '''Returns the encoded legal move written in standard algebraic notation for the side to move, or None if
+        it is illegal or ambiguous. Check marks, annotations and needless disambiguation are accepted. (Getter)'''
+        san = san.rstrip('+#!?').replace('0', 'O')
+        moves = self.legalMoves('white' if self.active_color == 'w' else 'black')
+        if san.startswith('O-O'):
+            queenside = san.startswith('O-O-O')
+            for move in moves:
+                if ((move >> 16) & FLAG_CASTLE) and ((((move >> 6) & 63) < (move & 63)) == queenside):
+                    return move
+            return None
+
+        piece_type = PAWN
+        if san[:1] in 'NBRQK':
+            piece_type = PIECE_SYMBOLS.index(san[0])
+            san = san[1:]
+        promotion = 0
+        if '=' in san:
+            san, symbol = san.split('=', 1)
+            promotion = PIECE_SYMBOLS.find(symbol[:1].upper())
+        elif (piece_type == PAWN) and san[-1:] in ('N', 'B', 'R', 'Q'):
+            promotion = PIECE_SYMBOLS.index(san[-1])
+            san = san[:-1]
+        to_square = SQUARE_INDEX.get(san[-2:])
+        if (to_square is None) or (promotion < 0):
+            return None
+        # What is left is the from file, rank or square
+        hint = san[:-2].replace('x', '').replace(':', '')
+        found = None
+        for move in moves:
+            if (((move >> 6) & 63) != to_square) or ((move >> 12) & 15) != promotion or ((move >> 16) & FLAG_CASTLE):
+                continue
+            from_square = move & 63
+            if self.mailbox[from_square] % 6 != piece_type:
+                continue
+            if any(char not in SQUARE_NAMES[from_square] for char in hint):
+                continue
+            if found is not None:
+                return None
+            found = move
+        return found
     def allPossibleMoves(self, color: str) -> list:
         'Returns array of tuples in the form (piece, move) for every possible move'
         possible_moves = []
-        for piece in self.allPieces():
-            if piece.getColor() == color:
-                for move in piece.legalMoves():
-                    copiedpiece = Piece(piece.getName(), piece.getColor(), piece.getPos(), piece.hasMoved(), self)
-                    possible_moves.append((copiedpiece, move))
-        shuffle(possible_moves)
-        return possible_moves.copy()
+        pieces = {}
+        for move in self.legalMoves(color):
+            from_square = move & 63
+            if from_square not in pieces:
+                pieces[from_square] = self.pieceAt(SQUARE_NAMES[from_square])
+            possible_move = (pieces[from_square], SQUARE_NAMES[moveTo(move)])
+            # Promotions share a destination, only list them once
+            if possible_move not in possible_moves:
+                possible_moves.append(possible_move)
+        _random.shuffle(possible_moves)
+        return possible_moves
 
     # Public Set methods ///
     def setBoard(self, setter):
@@ -95,29 +274,34 @@ class Board:
         if isinstance(setter, str):
             self.fen = FEN(setter)
             self.FenToBoard(self.fen)
+            self.repetitions.clear()
+            self.savePosition()
         elif isinstance(setter, Board):
             self.copyBoard(setter)
             self.fen = FEN(setter)
     def setPiece(self, piece, target):
         'Sets piece at specified position on the board, replacing any existing piece. (Setter)'
-        try:
-            if isinstance(target, str):
-                pos = self.convertPosType(target)
-                self.board[pos[0]-1][pos[1]-1] = piece
-            elif isinstance(target, tuple):
-                self.board[target[0]-1][target[1]-1] = piece
-            if piece is not None:
-                piece.setPos(target)
-            self.updateAllPieces()
+        square = squareIndex(target)
         # Does not exist
-        except:  # noqa: E722
+        if square is None:
             return
+        self.removePiece(square)
+        if piece is not None:
+            self.addPiece(pieceCode(COLOR_INDEX[piece.getColor()], PIECE_INDEX[piece.getName()]), square)
+            if piece.hasMoved():
+                self.moved |= SQUARE_BITS[square]
+            piece.setPos(SQUARE_NAMES[square])
+    def setRepetitions(self, repetitions: RepetitionTracker) -> None:
+        'Continues from the positions of another tracker, e.g. the one kept by the game window. (Setter)'
+        self.repetitions = repetitions.copy()
+        if (not self.repetitions.keys) or (self.repetitions.keys[-1] != self.zobrist_key):
+            self.savePosition()
     def promote(self, piece):
         'Promotes pawn to the best possible piece. (Setter)'
         check = ['knight', 'bishop', 'rook']
         for name in check:
             piece.setName(name)
-            self.updateAllPieces()
+            self.setPiece(piece, piece.getPos())
             if piece.color == 'white':
                 if self.identifyCheckmate('black'):
                     return
@@ -125,7 +309,151 @@ class Board:
                 if self.identifyCheckmate('white'):
                     return
         piece.setName('queen')
-        self.updateAllPieces()
+        self.setPiece(piece, piece.getPos())
+
+    # Bitboard methods ///
+    def addPiece(self, code: int, square: int) -> None:
+        'Adds piece code to an empty square, updating every bitboard.'
+        bit = SQUARE_BITS[square]
+        self.bitboards[code] |= bit
+        self.occupancy[code // 6] |= bit
+        self.occupied |= bit
+        self.mailbox[square] = code
+        self.zobrist_key ^= PIECE_KEYS[code][square]
+        index = (code << 6) | square
+        self.mg_score += MG_SCORES[index]
+        self.eg_score += EG_SCORES[index]
+        self.phase += PHASE[code]
+    def removePiece(self, square: int):
+        'Removes any piece on square, returning its piece code or None if empty.'
+        code = self.mailbox[square]
+        if code is not None:
+            mask = ~SQUARE_BITS[square]
+            self.bitboards[code] &= mask
+            self.occupancy[code // 6] &= mask
+            self.occupied &= mask
+            self.moved &= mask
+            self.mailbox[square] = None
+            self.zobrist_key ^= PIECE_KEYS[code][square]
+            index = (code << 6) | square
+            self.mg_score -= MG_SCORES[index]
+            self.eg_score -= EG_SCORES[index]
+            self.phase -= PHASE[code]
+        return code
+
+    # Make / unmake methods ///
+    def makeMove(self, move: int) -> None:
+        '''Makes an encoded pseudo-legal move in place, pushing everything needed to unmake it.
+        Does not update the FEN, position history or game state flags, see movePieceRequest.'''
+        from_square = move & 63
+        to_square = (move >> 6) & 63
+        promotion = (move >> 12) & 15
+        flags = move >> 16
+        code = self.mailbox[from_square]
+        color = code // 6
+        if flags & FLAG_ENPASSANT:
+            capture_square = to_square - 8 if color == WHITE else to_square + 8
+        else:
+            capture_square = to_square
+        moved = self.moved
+        zobrist_key = self.zobrist_key
+
+        # Move piece /
+        captured = self.removePiece(capture_square)
+        self.move_stack.append((move, code, capture_square, captured, moved, self.castling_availability,
+                                self.enpassant_target, self.halfmove_clock, self.fullmove_clock, zobrist_key,
+                                self.enpassant_key))
+        self.removePiece(from_square)
+        if promotion:
+            self.addPiece(code - code % 6 + promotion, to_square)
+        else:
+            self.addPiece(code, to_square)
+        self.moved |= SQUARE_BITS[to_square]
+        if flags & FLAG_CASTLE:
+            rook_from, rook_to = CASTLING_ROOKS[to_square]
+            self.addPiece(self.removePiece(rook_from), rook_to)
+            self.moved |= SQUARE_BITS[rook_to]
+
+        # Clocks /
+        if (captured is not None) or (code % 6 == PAWN):
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        if color == BLACK:
+            self.fullmove_clock += 1
+
+        # Enpassant target, only hashed when an enemy pawn can capture onto it /
+        self.zobrist_key ^= self.enpassant_key
+        if flags & FLAG_DOUBLE_PUSH:
+            target = (from_square + to_square) >> 1
+            self.enpassant_target = SQUARE_NAMES[target]
+            if self.bitboards[(color ^ 1) * 6 + PAWN] & PAWN_ATTACKS[color][target]:
+                self.enpassant_key = ENPASSANT_KEYS[target & 7]
+            else:
+                self.enpassant_key = 0
+        else:
+            self.enpassant_target = '-'
+            self.enpassant_key = 0
+        self.zobrist_key ^= self.enpassant_key
+
+        # Castling availability /
+        if (self.castling_availability != '-') and ((from_square in CASTLING_LOSS) or (to_square in CASTLING_LOSS)):
+            castling = self.castling_availability
+            for right in CASTLING_LOSS.get(from_square, '') + CASTLING_LOSS.get(to_square, ''):
+                castling = castling.replace(right, '')
+            castling = castling or '-'
+            self.zobrist_key ^= castlingKey(self.castling_availability) ^ castlingKey(castling)
+            self.castling_availability = castling
+
+        # Active color /
+        self.active_color = 'b' if color == WHITE else 'w'
+        self.zobrist_key ^= SIDE_KEY
+        self.repetitions.push(self.zobrist_key, self.halfmove_clock == 0)
+    def unmakeMove(self) -> None:
+        'Unmakes the last move made by makeMove, restoring every state field.'
+        (move, code, capture_square, captured, moved, castling_availability, enpassant_target,
+         halfmove_clock, fullmove_clock, zobrist_key, enpassant_key) = self.move_stack.pop()
+        self.repetitions.pop()
+        from_square = move & 63
+        to_square = (move >> 6) & 63
+        self.removePiece(to_square)
+        self.addPiece(code, from_square)
+        if captured is not None:
+            self.addPiece(captured, capture_square)
+        if (move >> 16) & FLAG_CASTLE:
+            rook_from, rook_to = CASTLING_ROOKS[to_square]
+            self.addPiece(self.removePiece(rook_to), rook_from)
+        self.moved = moved
+        self.castling_availability = castling_availability
+        self.enpassant_target = enpassant_target
+        self.halfmove_clock = halfmove_clock
+        self.fullmove_clock = fullmove_clock
+        self.active_color = 'w' if code < 6 else 'b'
+        self.zobrist_key = zobrist_key
+        self.enpassant_key = enpassant_key
+
+    # Perft methods ///
+    def perft(self, depth: int) -> int:
+        'Returns the number of leaf nodes of the legal move tree depth plies deep.'
+        if depth <= 0:
+            return 1
+        moves = self.legalMoves('white' if self.active_color == 'w' else 'black')
+        if depth == 1:
+            return len(moves)
+        nodes = 0
+        for move in moves:
+            self.makeMove(move)
+            nodes += self.perft(depth - 1)
+            self.unmakeMove()
+        return nodes
+    def divide(self, depth: int) -> dict:
+        'Returns perft node counts of depth split by root move, keyed as \'square1square2\'.'
+        counts = {}
+        for move in self.legalMoves('white' if self.active_color == 'w' else 'black'):
+            self.makeMove(move)
+            counts[moveToString(move)] = self.perft(depth - 1)
+            self.unmakeMove()
+        return counts
 
     # Other methods ///
     def FenToBoard(self, fen) -> None:
@@ -137,8 +465,6 @@ class Board:
         self.fullmove_clock = fen.fullmoveClock()
 
         # Pieces onto the board
-        piece_ref = {'p': 'pawn', 'r': 'rook', 'b': 'bishop',
-                     'n': 'knight','k': 'king', 'q': 'queen'}
         file = 1
         rank = 8
         placements = fen.piecePlacement()
@@ -148,15 +474,11 @@ class Board:
                 file = 1
             elif placement.isnumeric():
                 file += int(placement)
-            elif placement.lower() in piece_ref:
-                if placement.isupper():
-                    piece = Piece(piece_ref[placement.lower()], 'white', self.convertPosType((file, rank)), False, self)
-                    self.board[file-1][rank-1] = piece
-                else:
-                    piece = Piece(piece_ref[placement], 'black', self.convertPosType((file, rank)), False, self)
-                    self.board[file-1][rank-1] = piece
+            elif placement in PIECE_SYMBOLS:
+                self.addPiece(PIECE_SYMBOLS.index(placement), squareIndex((file, rank)))
                 file += 1
-        self.updateAllPieces()
+        self.enpassant_key = enpassantKey(self)
+        self.zobrist_key = positionKey(self)
     def emptyBoard(self) -> list:
         'Returns an initial empty board.'
         board = [[], [], [], [], [], [], [], []]
@@ -183,268 +505,134 @@ class Board:
         except ValueError:
             return None
     def savePosition(self) -> None:
-        'Saves position and appends to position history.'
-        self.position_history.append(self.currentPosition())
-    def updateAllPieces(self) -> None:
-        'Updates the contents of all pieces attribute.'
-        all_pieces = []
-        for f in range(8):
-            for r in range(8):
-                if self.pieceAt(self.convertPosType((f+1, r+1))) is not None:
-                    piece = self.pieceAt(self.convertPosType((f+1, r+1)))
-                    all_pieces.append(Piece(piece.getName(), piece.getColor(), piece.getPos(), piece.hasMoved(), self))
-        self.all_pieces = all_pieces.copy()
+        'Saves position to the repetition tracker.'
+        self.repetitions.push(self.zobrist_key, self.halfmove_clock == 0)
     def identifyCheckmate(self, color: str) -> bool:
         'Private method to check whether color has been checkmated.'
-        for piece in self.allPieces():
-            if piece.getColor() == color:
-                if piece.legalMoves():
-                    return False
+        if self.hasLegalMove(color):
+            return False
         if self.checkState(color):
             return True
         return False
     def identifyStalemate(self, colortomove: str) -> bool:
         'Private method to check for a stalemate.'
-        for piece in self.allPieces():
-            if piece.getColor() == colortomove:
-                if piece.legalMoves():
-                    return False
-        return True
-    def castlingChecks(self) -> None:
-        'Function that updates castling availability.'
-        castling = list(self.castling_availability)
-        # White castling
-        if self.pieceAt('e1') is None:
-            if 'K' in castling:
-                    castling.pop(castling.index('K'))
-            if 'Q' in castling:
-                castling.pop(castling.index('Q'))
-        elif self.pieceAt('e1').name != 'king':
-            if 'K' in castling:
-                castling.pop(castling.index('K'))
-            if 'Q' in castling:
-                castling.pop(castling.index('Q'))
-        if self.pieceAt('h1') is None:
-            if 'K' in castling:
-                castling.pop(castling.index('K'))
-        elif self.pieceAt('h1').name != 'rook':
-            if 'K' in castling:
-                castling.pop(castling.index('K'))
-        if self.pieceAt('a1') is None:
-            if 'Q' in castling:
-                castling.pop(castling.index('Q'))
-        elif self.pieceAt('a1').name != 'rook':
-            if 'Q' in castling:
-                castling.pop(castling.index('Q'))
-    
-    # Black castling
-        if self.pieceAt('e8') is None:
-            if 'k' in castling:
-                castling.pop(castling.index('k'))
-            if 'q' in castling:
-                castling.pop(castling.index('q'))
-        elif self.pieceAt('e8').name != 'king':
-            if 'k' in castling:
-                castling.pop(castling.index('k'))
-            if 'q' in castling:
-                castling.pop(castling.index('q'))
-        if self.pieceAt('h8') is None:
-            if 'k' in castling:
-                castling.pop(castling.index('k'))
-        elif self.pieceAt('h8').name != 'rook':
-            if 'k' in castling:
-                castling.pop(castling.index('k'))
-        if self.pieceAt('a8') is None:
-            if 'q' in castling:
-                castling.pop(castling.index('q'))
-        elif self.pieceAt('a8').name != 'rook':
-            if 'q' in castling:
-                castling.pop(castling.index('q'))
-        
-        # Update
-        if castling:
-            self.castling_availability = ''.join(castling.copy())
-        else:
-            self.castling_availability = '-'
+        return not self.hasLegalMove(colortomove)
     def copyBoard(self, board) -> None:
         'Function to copy position from another board.'
-        copiedboard = board.board.copy()
-        for file in range(8):
-            for rank in range(8):
-                piece = copiedboard[file][rank]
-                if piece is not None:
-                    self.setPiece(Piece(piece.getName(), piece.getColor(), piece.getPos(), piece.hasMoved(), self), self.convertPosType((file+1, rank+1)))
-                else:
-                    self.setPiece(None, self.convertPosType((file+1, rank+1)))
-        self.active_color = board.fen.activeColor()
-        self.castling_availability = board.fen.castlingAvailability()
-        self.enpassant_target = board.fen.enpassantTargetSquare()
-        self.halfmove_clock = board.fen.halfmoveClock()
-        self.fullmove_clock = board.fen.fullmoveClock()
-        self.updateAllPieces()
+        self.bitboards = board.bitboards.copy()
+        self.occupancy = board.occupancy.copy()
+        self.occupied = board.occupied
+        self.mailbox = board.mailbox.copy()
+        self.moved = board.moved
+        self.active_color = board.active_color
+        self.castling_availability = board.castling_availability
+        self.enpassant_target = board.enpassant_target
+        self.halfmove_clock = board.halfmove_clock
+        self.fullmove_clock = board.fullmove_clock
+        self.zobrist_key = board.zobrist_key
+        self.enpassant_key = board.enpassant_key
+        self.mg_score = board.mg_score
+        self.eg_score = board.eg_score
+        self.phase = board.phase
+        self.repetitions = board.repetitions.copy()
     def identifyDraw(self) -> bool:
         'Returns boolean whether there is a draw from move repetition or fifty-move rule.'
-        # Fifty-move rule
-        if self.halfmove_clock == 50:
-            return True
-        else:
-            # Threefold repetition
-            for position in self.position_history:
-                if self.position_history.count(position) == 3:
-                    return True
-        return False
-    def identifyEnPassant(self, piece, target) -> None:
-        'Identifies an enpassant target square.'
-        if piece.getName() == 'pawn':
-            if piece.getColor() == 'white':
-                if (int(target[1]) - int(piece.pos[1])) == 2:
-                    enpassant_target = self.convertPosType(target)
-                    enpassant_target = (enpassant_target[0], enpassant_target[1]-1)
-                    self.enpassant_target = self.convertPosType(enpassant_target)
-                    return
-            if piece.getColor() == 'black':
-                if (int(piece.pos[1]) - int(target[1])) == 2:
-                    enpassant_target = self.convertPosType(target)
-                    enpassant_target = (enpassant_target[0], enpassant_target[1]+1)
-                    self.enpassant_target = self.convertPosType(enpassant_target)
-                    return
-        # If no enpassant valid
-        self.enpassant_target = '-'
-     
+        return self.drawReason() is not None
+
     # Control methods ///
     def movePieceRequest(self, piece, target) -> bool:
         'Executes move piece request if valid.'
         if piece is None:
             return False
         if (self.checkmate is None) or (self.stalemate):
-            # Setup /
-            flip = {'w': 'b', 'b': 'w'}
-            castling_ref = {'g1': ('h1', 'f1'), 'c1': ('a1', 'd1'), 'g8': ('h8', 'f8'), 'c8': ('a8', 'd8')}
             if isinstance(target, tuple):
                 target = self.convertPosType(target)
-            if target in piece.legalMoves():
-                
-                # Halfmove clock /
-                if (self.pieceAt(target) is not None) or (piece.getName() == 'pawn'):
-                    self.halfmove_clock = 0
-                else:
-                    self.halfmove_clock += 1
-
-                # Castle /
-                if piece.getName() == 'king':
-                    if target in castling_ref:
-                        # Castle
-                        rook = self.pieceAt(castling_ref[target][0])
-                        if rook is not None:
-                            self.setPiece(None, rook.pos)
-                            self.setPiece(rook, castling_ref[target][1])
-                            rook.setHasMoved(True)
-
-                # Enpassant validation
-                if target == self.enpassant_target:
-                    if piece.getColor() == 'white':
-                        capture = self.convertPosType(target)
-                        capture = (capture[0], capture[1]-1)
-                        self.setPiece(None, self.convertPosType(capture))
-                    elif piece.getColor() == 'black':
-                        capture = self.convertPosType(target)
-                        capture = (capture[0], capture[1]+1)
-                        self.setPiece(None, self.convertPosType(capture))
-                self.identifyEnPassant(piece, target)
-
-                # Move Piece /
-                self.last_move = (piece.getPos(), target, piece.hasMoved(), self.pieceAt(target))
-                self.setPiece(None, piece.getPos())
-                self.setPiece(piece, target)
-                piece.setHasMoved(True)
-
-                # Fullmove clock /
-                if piece.getColor() == 'black':
-                    self.fullmove_clock += 1
-                # Active color /
-                self.active_color = flip[self.active_color]
-
-                # Pawn promote?
-                if piece.getName() == 'pawn':
-                    if piece.getColor() == 'white':
-                        if int(target[1]) == 8:
-                            self.promote(piece)
-                    if piece.getColor() == 'black':
-                        if int(target[1]) == 1:
-                            self.promote(piece)
-                
-                # Update
-                self.previous_enpassant_target = self.enpassant_target
-                self.updateAllPieces()
-                self.savePosition()
-                self.castlingChecks()
-
-                # Update fen /
-                self.fen.boardToFen(self)
-
-                # Checkmate? /
+            from_square = squareIndex(piece.getPos())
+            to_square = squareIndex(target)
+            if (from_square is None) or (to_square is None) or (self.mailbox[from_square] is None):
+                return False
+            code = self.mailbox[from_square]
+            for move in pieceMoves(self, from_square, code % 6, code // 6):
+                # Promotions are generated queen first, promote() then picks the final piece
+                if (moveTo(move) == to_square) and self.isLegal(move):
+                    break
+            else:
+                return False
+
+            # Move Piece /
+            self.makeMove(move)
+            piece.setPos(target)
+            piece.setHasMoved(True)
+
+            # Pawn promote?
+            if (move >> 12) & 15:
+                self.promote(piece)
+                self.repetitions.replace(self.zobrist_key)
+
+            # Update
+            self.fen.boardToFen(self)
+
+            # Checkmate? /
+            if piece.getColor() == 'white':
+                if self.identifyCheckmate('black'):
+                    self.checkmate = 'black'
+            else:
+                if self.identifyCheckmate('white'):
+                    self.checkmate = 'white'
+
+            # Stalemate? /
+            if self.checkmate is None:
                 if piece.getColor() == 'white':
-                    if self.identifyCheckmate('black'):
-                        self.checkmate = 'black'
+                    if self.identifyStalemate('black'):
+                        self.stalemate = True
                 else:
-                    if self.identifyCheckmate('white'):
-                        self.checkmate = 'white'
-
-                # Stalemate? /
-                if self.checkmate is None:
-                    if piece.getColor() == 'white':
-                        if self.identifyStalemate('black'):
-                            self.stalemate = True
-                    else:
-                        if self.identifyStalemate('white'):
-                            self.stalemate = True
-            
-                # Draw? /
-                if self.identifyDraw():
-                    self.draw = True
-                
-                return True
+                    if self.identifyStalemate('white'):
+                        self.stalemate = True
+
+            # Draw? /
+            if self.identifyDraw():
+                self.draw = True
+
+            return True
         return False
     def undoLastMove(self) -> bool:
         'Undos the last move made.'
-        if self.last_move is not None:
-            flip = {'w': 'b', 'b': 'w'}
-            # Fullmove clock /
-            if self.pieceAt(self.last_move[1]).getColor() == 'black':
-                self.fullmove_clock -= 1
-            # Active color /
-            self.active_color = flip[self.active_color]
-            
-            self.pieceAt(self.last_move[1]).setHasMoved(self.last_move[2])
-            self.setPiece(self.pieceAt(self.last_move[1]), self.last_move[0])
-            self.setPiece(self.last_move[3], self.last_move[1])
-            self.enpassant_target = self.previous_enpassant_target
-
-            # Halfmove clock /
-            if (self.pieceAt(self.last_move[1]) is not None) or (self.pieceAt(self.last_move[0]).getName() == 'pawn'):
-                self.halfmove_clock = 0
-            else:
-                self.halfmove_clock -= 1
-
-            self.updateAllPieces()
-            self.savePosition()
-            self.castlingChecks()
+        if self.move_stack:
+            self.unmakeMove()
+            self.checkmate = None
+            self.stalemate = False
+            self.draw = self.identifyDraw()
             self.fen.boardToFen(self)
             return True
         else:
             return False
 
 class Piece:
+    # Integer piece code (color * 6 + type) and square index, names and strings are only made when asked for
+    __slots__ = ('code', 'square', 'has_moved', 'board')
+
     def __init__(self, name: str, color: str, pos: str, has_moved: bool, board: Board):
         self.setAs(name, color, pos, has_moved, board)
     
     # Public Get methods ///
+    @property
+    def name(self) -> str:
+        'Name/type of the piece, made from its code.'
+        return PIECE_NAMES[self.code % 6]
+    @property
+    def color(self) -> str:
+        'Color of the piece, made from its code.'
+        return COLOR_NAMES[self.code // 6]
+    @property
+    def pos(self) -> str:
+        'Position of the piece as a string, made from its square index.'
+        return SQUARE_NAMES[self.square] if self.square is not None else None
     def getName(self) -> str:
         'Returns name/type of piece. (Getter)'
-        return self.name
+        return PIECE_NAMES[self.code % 6]
     def getColor(self) -> str:
         'Returns color of piece. (Getter)'
-        return self.color
+        return COLOR_NAMES[self.code // 6]
     def getPos(self, str=True):
         'Returns position of piece as string, optionally formatted as a tuple. (Getter)'
         if str:
@@ -461,27 +649,24 @@ class Piece:
     # Public Set methods ///
     def setAs(self, name: str, color: str, pos: str, has_moved: bool, board: Board) -> None:
         'Set or initialise piece attributes. (Setter)'
-        self.name: str = name.lower()
-        self.color: str = color.lower()
-        self.pos: str = pos
+        self.code: int = pieceCode(COLOR_INDEX[color.lower()], PIECE_INDEX[name.lower()])
+        self.square: int = squareIndex(pos)
         self.board = board
         self.has_moved: bool = has_moved
     def setName(self, name: str) -> None:
         'Sets new name/type of piece as string. (Setter)'
         valid = ['knight', 'bishop', 'rook', 'queen']
         if name in valid:
-            self.name = name
+            self.code = self.code - self.code % 6 + PIECE_INDEX[name]
     def setColor(self, color: str) -> None:
         'Sets new color of piece as string. (Setter)'
         valid = ['white', 'black']
         if color in valid:
-            self.color = color
+            self.code = pieceCode(COLOR_INDEX[color], self.code % 6)
     def setPos(self, pos) -> None:
         'Sets new position of piece, accepts string or tuple format. (Setter)'
-        if isinstance(pos, str):
-            self.pos = pos
-        elif isinstance(pos, tuple):
-            self.pos = self.convertPosType(pos)
+        if isinstance(pos, (str, tuple)):
+            self.square = squareIndex(pos)
     def setHasMoved(self, has_moved: bool) -> None:
         'Sets boolean value as to whether the piece has moved from its original position. (Setter)'
         self.has_moved = has_moved
@@ -511,333 +696,29 @@ class Piece:
             return None
     def calculatePsuedoLegal(self) -> set:
         'Returns set of moves the piece can make before check validation.'
-        temporary_moves = []
-        pos = self.convertPosType(self.pos)
-        if self.color == 'white':
-            # Positive offset coefficient
-            oc = 1
-        else:
-            # Negative offset coefficient
-            oc = -1
-
-        # Pawn calculation ---
-        if self.name == 'pawn':
-            offsets = (
-                (pos[0], pos[1] + (1*oc)), # forwards
-                (pos[0], pos[1] + (2*oc)), # forwards two squares
-                (pos[0] - 1, pos[1] + (1*oc)), # capture left
-                (pos[0] + 1, pos[1] + (1*oc)) # capture right
-            )
-            if self.board.pieceAt(offsets[0]) is None:
-                temporary_moves.append(offsets[0])
-                if self.board.pieceAt(offsets[1]) is None:
-                    if (self.color == 'white') and (self.pos[1] == '2'):
-                        temporary_moves.append(offsets[1])
-                    elif (self.color == 'black') and (self.pos[1] == '7'):
-                        temporary_moves.append(offsets[1])
-            if self.board.pieceAt(offsets[2]) is not None:
-                if self.board.pieceAt(offsets[2]).color != self.color:
-                    temporary_moves.append(offsets[2])
-            if self.board.pieceAt(offsets[3]) is not None:
-                if self.board.pieceAt(offsets[3]).color != self.color:
-                    temporary_moves.append(offsets[3])
-            # Enpassant
-            if self.convertPosType(offsets[2]) == self.board.enpassant_target:
-                temporary_moves.append(offsets[2])
-            elif self.convertPosType(offsets[3]) == self.board.enpassant_target:
-                temporary_moves.append(offsets[3])
-        
-        # Knight calculation ---
-        if self.name == 'knight':
-            offsets = (
-                (pos[0]+1, pos[1]+2),
-                (pos[0]-1, pos[1]+2),
-                (pos[0]+1, pos[1]-2),
-                (pos[0]-1, pos[1]-2),
-                (pos[0]+2, pos[1]+1),
-                (pos[0]-2, pos[1]+1),
-                (pos[0]+2, pos[1]-1),
-                (pos[0]-2, pos[1]-1)
-            )
-            for offset in offsets:
-                if self.board.pieceAt(offset) is not None:
-                    if self.board.pieceAt(offset).getColor() != self.color:
-                        temporary_moves.append(offset)
-                else:
-                    temporary_moves.append(offset)
-
-        # Bishop (and psuedo-queen) calculation ---
-        if (self.name == 'bishop') or (self.name == 'queen'):
-            # Top left diagonal offsets
-            for i in range(1, 8):
-                offset = (pos[0] - (1*i), pos[1] + (1*i))
-                if self.board.pieceAt(offset) is not None:
-                    if self.board.pieceAt(offset).getColor() != self.color:
-                        temporary_moves.append(offset)
-                    break
-                else:
-                    temporary_moves.append(offset)
-            
-            # Top right diagonal offsets
-            for i in range(1, 8):
-                offset = (pos[0] + (1*i), pos[1] + (1*i))
-                if self.board.pieceAt(offset) is not None:
-                    if self.board.pieceAt(offset).getColor() != self.color:
-                        temporary_moves.append(offset)
-                    break
-                else:
-                    temporary_moves.append(offset)
-
-            # Bottom left diagonal offsets
-            for i in range(1, 8):
-                offset = (pos[0] - (1*i), pos[1] - (1*i))
-                if self.board.pieceAt(offset) is not None:
-                    if self.board.pieceAt(offset).getColor() != self.color:
-                        temporary_moves.append(offset)
-                    break
-                else:
-                    temporary_moves.append(offset)
-            
-            # Bottom right diagonal offsets
-            for i in range(1, 8):
-                offset = (pos[0] + (1*i), pos[1] - (1*i))
-                if self.board.pieceAt(offset) is not None:
-                    if self.board.pieceAt(offset).getColor() != self.color:
-                        temporary_moves.append(offset)
-                    break
-                else:
-                    temporary_moves.append(offset)
-
-        # Rook (and psuedo-queen) calculation ---
-        if (self.name == 'rook') or (self.name == 'queen'):
-            # Forward offsets
-                for i in range(1, 8):
-                    offset = (pos[0], pos[1] + (1*i))
-                    if self.board.pieceAt(offset) is not None:
-                        if self.board.pieceAt(offset).getColor() != self.color:
-                            temporary_moves.append(offset)
-                        break
-                    else:
-                        temporary_moves.append(offset)
-                
-                # Backwards offsets
-                for i in range(1, 8):
-                    offset = (pos[0], pos[1] - (1*i))
-                    if self.board.pieceAt(offset) is not None:
-                        if self.board.pieceAt(offset).getColor() != self.color:
-                            temporary_moves.append(offset)
-                        break
-                    else:
-                        temporary_moves.append(offset)
-
-                # Left offsets
-                for i in range(1, 8):
-                    offset = (pos[0] - (1*i), pos[1])
-                    if self.board.pieceAt(offset) is not None:
-                        if self.board.pieceAt(offset).getColor() != self.color:
-                            temporary_moves.append(offset)
-                        break
-                    else:
-                        temporary_moves.append(offset)
-                
-                # Right offsets
-                for i in range(1, 8):
-                    offset = (pos[0] + (1*i), pos[1])
-                    if self.board.pieceAt(offset) is not None:
-                        if self.board.pieceAt(offset).getColor() != self.color:
-                            temporary_moves.append(offset)
-                        break
-                    else:
-                        temporary_moves.append(offset)
-
-        # King calculation ---
-        if self.name == 'king':
-            offsets = (
-                (pos[0]+1, pos[1]),
-                (pos[0]-1, pos[1]),
-                (pos[0]+1, pos[1]+1),
-                (pos[0]+1, pos[1]-1),
-                (pos[0]-1, pos[1]+1),
-                (pos[0]-1, pos[1]-1),
-                (pos[0], pos[1]+1),
-                (pos[0], pos[1]-1)
-            )
-            # Castling
-            if self.color == 'white':
-                if ('K' in self.board.castling_availability) and (self.board.pieceAt('f1') is None) and (self.board.pieceAt('g1') is None):
-                    temporary_moves.append((pos[0]+2, pos[1]))
-                if ('Q' in self.board.castling_availability) and (self.board.pieceAt('d1') is None) and (self.board.pieceAt('c1') is None) and (self.board.pieceAt('b1') is None):
-                    temporary_moves.append((pos[0]-2, pos[1]))
-            elif self.color == 'black':
-                if ('k' in self.board.castling_availability) and (self.board.pieceAt('f8') is None) and (self.board.pieceAt('g8') is None):
-                    temporary_moves.append((pos[0]+2, pos[1]))
-                if ('q' in self.board.castling_availability) and (self.board.pieceAt('d8') is None) and (self.board.pieceAt('c8') is None) and (self.board.pieceAt('b8') is None):
-                    temporary_moves.append((pos[0]-2, pos[1]))
-
-            for offset in offsets:
-                if self.board.pieceAt(offset) is not None:
-                    if self.board.pieceAt(offset).getColor() != self.color:
-                        temporary_moves.append(offset)
-                else:
-                    temporary_moves.append(offset)
-
-        # Final validation and format
-        final_moves = []
-        for move in temporary_moves:
-            if self.convertPosType(move) is not None:
-                final_moves.append(self.convertPosType(move))
-        return set(final_moves.copy())
+        moves = pieceMoves(self.board, self.square, self.code % 6, self.code // 6)
+        return {SQUARE_NAMES[moveTo(move)] for move in moves}
     def checkValidation(self, psuedo_legal_moves: set) -> list:
         'Returns new array of legal moves after check validation.'
-        castling_ref = {'g1': ('h1', 'f1'), 'c1': ('a1', 'd1'), 'g8': ('h8', 'f8'), 'c8': ('a8', 'd8')}
         legal_moves = []
-        for move in psuedo_legal_moves:
-            temporary_board = Board(self.board)
-            clone = Piece(self.name, self.color, self.pos, self.has_moved, temporary_board)
-            if clone.getName() == 'king':
-                    if move in castling_ref:
-                        # Castle
-                        rook = temporary_board.pieceAt(castling_ref[move][0])
-                        if rook is not None:
-                            temporary_board.setPiece(None, rook.getPos())
-                            temporary_board.setPiece(rook, castling_ref[move][1])
-                            rook.setHasMoved(True)
-            temporary_board.setPiece(None, clone.pos)
-            temporary_board.setPiece(clone, move)
-            # If this move does not result in a check, it is legal
-            if not temporary_board.checkState(self.color):
-                legal_moves.append(move)
-        return legal_moves.copy()
+        for move in pieceMoves(self.board, self.square, self.code % 6, self.code // 6):
+            target = SQUARE_NAMES[moveTo(move)]
+            if (target in psuedo_legal_moves) and (target not in legal_moves):
+                # Make and unmake on the board itself instead of testing on a copy
+                if self.board.isLegal(move):
+                    legal_moves.append(target)
+        return legal_moves
     def legalMoves(self) -> list:
         'Returns array of legal moves, as strings, able to be made by this piece. (Getter)'
         psuedo_legal_moves = self.calculatePsuedoLegal()
         return self.checkValidation(psuedo_legal_moves).copy()
     def returnProtectedPieces(self) -> list:
         'Returns a list of pieces being protected by this current piece.'
-        protected_pieces = []
-        pos = self.convertPosType(self.pos)
-        if self.color == 'white':
-            # Positive offset coefficient
-            oc = 1
-        else:
-            # Negative offset coefficient
-            oc = -1
-
-        # Pawn calculation ---
-        if self.name == 'pawn':
-            offsets = (
-                (pos[0] - 1, pos[1] + (1*oc)), # capture left
-                (pos[0] + 1, pos[1] + (1*oc)) # capture right
-            )
-            for offset in offsets:
-                if self.board.pieceAt(offset) is not None:
-                    if self.board.pieceAt(offset).getColor() == self.color:
-                        protected_pieces.append(self.board.pieceAt(offset))
-        
-        # Knight calculation ---
-        if self.name == 'knight':
-            offsets = (
-                (pos[0]+1, pos[1]+2),
-                (pos[0]-1, pos[1]+2),
-                (pos[0]+1, pos[1]-2),
-                (pos[0]-1, pos[1]-2),
-                (pos[0]+2, pos[1]+1),
-                (pos[0]-2, pos[1]+1),
-                (pos[0]+2, pos[1]-1),
-                (pos[0]-2, pos[1]-1)
-            )
-            for offset in offsets:
-                if self.board.pieceAt(offset) is not None:
-                    if self.board.pieceAt(offset).getColor() == self.color:
-                        protected_pieces.append(self.board.pieceAt(offset))
-
-        # Bishop (and psuedo-queen) calculation ---
-        if (self.name == 'bishop') or (self.name == 'queen'):
-            # Top left diagonal offsets
-            for i in range(1, 8):
-                offset = (pos[0] - (1*i), pos[1] + (1*i))
-                if self.board.pieceAt(offset) is not None:
-                    if self.board.pieceAt(offset).getColor() == self.color:
-                        protected_pieces.append(self.board.pieceAt(offset))
-                    break
-            
-            # Top right diagonal offsets
-            for i in range(1, 8):
-                offset = (pos[0] + (1*i), pos[1] + (1*i))
-                if self.board.pieceAt(offset) is not None:
-                    if self.board.pieceAt(offset).getColor() == self.color:
-                        protected_pieces.append(self.board.pieceAt(offset))
-                    break
-
-            # Bottom left diagonal offsets
-            for i in range(1, 8):
-                offset = (pos[0] - (1*i), pos[1] - (1*i))
-                if self.board.pieceAt(offset) is not None:
-                    if self.board.pieceAt(offset).getColor() == self.color:
-                        protected_pieces.append(self.board.pieceAt(offset))
-                    break
-            
-            # Bottom right diagonal offsets
-            for i in range(1, 8):
-                offset = (pos[0] + (1*i), pos[1] - (1*i))
-                if self.board.pieceAt(offset) is not None:
-                    if self.board.pieceAt(offset).getColor() == self.color:
-                        protected_pieces.append(self.board.pieceAt(offset))
-                    break
-
-        # Rook (and psuedo-queen) calculation ---
-        if (self.name == 'rook') or (self.name == 'queen'):
-            # Forward offsets
-                for i in range(1, 8):
-                    offset = (pos[0], pos[1] + (1*i))
-                    if self.board.pieceAt(offset) is not None:
-                        if self.board.pieceAt(offset).getColor() == self.color:
-                            protected_pieces.append(self.board.pieceAt(offset))
-                        break
-                
-                # Backwards offsets
-                for i in range(1, 8):
-                    offset = (pos[0], pos[1] - (1*i))
-                    if self.board.pieceAt(offset) is not None:
-                        if self.board.pieceAt(offset).getColor() == self.color:
-                            protected_pieces.append(self.board.pieceAt(offset))
-                        break
-
-                # Left offsets
-                for i in range(1, 8):
-                    offset = (pos[0] - (1*i), pos[1])
-                    if self.board.pieceAt(offset) is not None:
-                        if self.board.pieceAt(offset).getColor() == self.color:
-                            protected_pieces.append(self.board.pieceAt(offset))
-                        break
-                
-                # Right offsets
-                for i in range(1, 8):
-                    offset = (pos[0] + (1*i), pos[1])
-                    if self.board.pieceAt(offset) is not None:
-                        if self.board.pieceAt(offset).getColor() == self.color:
-                            protected_pieces.append(self.board.pieceAt(offset))
-                        break
-
-        # King calculation ---
-        if self.name == 'king':
-            offsets = (
-                (pos[0]+1, pos[1]),
-                (pos[0]-1, pos[1]),
-                (pos[0]+1, pos[1]+1),
-                (pos[0]+1, pos[1]-1),
-                (pos[0]-1, pos[1]+1),
-                (pos[0]-1, pos[1]-1),
-                (pos[0], pos[1]+1),
-                (pos[0], pos[1]-1)
-            )
-
-            for offset in offsets:
-                if self.board.pieceAt(offset) is not None:
-                    if self.board.pieceAt(offset).getColor() == self.color:
-                        protected_pieces.append(self.board.pieceAt(offset))
-
-        return protected_pieces
+        board = self.board
+        color = self.code // 6
+        # Pieces of its own color on squares it attacks, sliders stopping at the first piece in each direction
+        protected = attacksFrom(self.code % 6, color, self.square, board.occupied) & board.occupancy[color]
+        return [board.pieceAt(SQUARE_NAMES[square]) for square in squaresOf(protected)]
 
 class FEN:
     def __init__(self, setter):
@@ -901,26 +782,22 @@ class FEN:
         sections = []
 
         # Section 1 - Piece placement
-        piece_ref = {'pawn': 'p', 'rook': 'r', 'bishop': 'b',
-                     'knight': 'n','king': 'k', 'queen': 'q'}
         section = []
         empty = 0
-        for r in '87654321':
-            for f in 'abcdefgh':
-                if board.pieceAt(f+r) is not None:
+        for rank in range(7, -1, -1):
+            for square in range(rank * 8, rank * 8 + 8):
+                code = board.mailbox[square]
+                if code is not None:
                     if empty:
                         section.append(str(empty))
                         empty = 0
-                    if board.pieceAt(f+r).color == 'white':
-                        section.append(piece_ref[board.pieceAt(f+r).name].upper())
-                    else:
-                        section.append(piece_ref[board.pieceAt(f+r).name])
+                    section.append(PIECE_SYMBOLS[code])
                 else:
                     empty += 1
             if empty:
                 section.append(str(empty))
                 empty = 0
-            if r != '1':
+            if rank != 0:
                 section.append('/')
         sections.append(''.join(section))
 
@@ -0,0 +1,332 @@
+# main/movegen.py
+# Bitboard move generation with precomputed attack tables
+# Moves are packed into a single int: from | to << 6 | promotion << 12 | flags << 16
+from modules.bitboard import (WHITE, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING,
+                              SQUARE_NAMES, SQUARE_INDEX, SQUARE_BITS, squaresOf)
+
+# Move flags
+FLAG_CAPTURE = 1
+FLAG_DOUBLE_PUSH = 2
+FLAG_ENPASSANT = 4
+FLAG_CASTLE = 8
+
+PROMOTION_PIECES = (QUEEN, ROOK, BISHOP, KNIGHT)
+# Indexed by piece type, used by the static exchange evaluation
+SEE_VALUES = (100, 300, 300, 500, 900, 20000)
+PROMOTION_SYMBOLS = {KNIGHT: 'n', BISHOP: 'b', ROOK: 'r', QUEEN: 'q'}
+
+# Castling right -> (king from, king to, squares that must be empty)
+CASTLING_MOVES = {
+    'K': (4, 6, SQUARE_BITS[5] | SQUARE_BITS[6]),
+    'Q': (4, 2, SQUARE_BITS[1] | SQUARE_BITS[2] | SQUARE_BITS[3]),
+    'k': (60, 62, SQUARE_BITS[61] | SQUARE_BITS[62]),
+    'q': (60, 58, SQUARE_BITS[57] | SQUARE_BITS[58] | SQUARE_BITS[59]),
+}
+
+
+# Table generation ///
+def _leaperAttacks(offsets) -> tuple:
+    'Returns attack bitboards for every square of a piece moving by fixed (file, rank) offsets.'
+    table = []
+    for square in range(64):
+        file, rank = square % 8, square // 8
+        attacks = 0
+        for df, dr in offsets:
+            if (0 <= file + df < 8) and (0 <= rank + dr < 8):
+                attacks |= SQUARE_BITS[(rank + dr) * 8 + file + df]
+        table.append(attacks)
+    return tuple(table)
+
+def _rayAttacks(square: int, occupied: int, directions) -> int:
+    'Slow ray walk used to fill the sliding lookup tables.'
+    attacks = 0
+    file, rank = square % 8, square // 8
+    for df, dr in directions:
+        f, r = file + df, rank + dr
+        while (0 <= f < 8) and (0 <= r < 8):
+            bit = SQUARE_BITS[r * 8 + f]
+            attacks |= bit
+            if occupied & bit:
+                break
+            f, r = f + df, r + dr
+    return attacks
+
+def _betweenTable() -> tuple:
+    'Returns table of squares strictly between two squares on a shared line, indexed [square1][square2].'
+    table = []
+    directions = ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (-1, -1), (-1, 1), (1, -1))
+    for square in range(64):
+        row = [0] * 64
+        file, rank = square % 8, square // 8
+        for df, dr in directions:
+            between = 0
+            f, r = file + df, rank + dr
+            while (0 <= f < 8) and (0 <= r < 8):
+                row[r * 8 + f] = between
+                between |= SQUARE_BITS[r * 8 + f]
+                f, r = f + df, r + dr
+        table.append(tuple(row))
+    return tuple(table)
+
+def _lineTables(directions) -> tuple:
+    '''Returns (masks, tables) for one line through each square, where tables[square] maps
+    occupied & masks[square] to the attack set along that line.'''
+    masks = []
+    tables = []
+    for square in range(64):
+        mask = _rayAttacks(square, 0, directions)
+        masks.append(mask)
+        table = {}
+        # Enumerate every subset of the mask (Carry-Rippler)
+        subset = 0
+        while True:
+            table[subset] = _rayAttacks(square, subset, directions)
+            subset = (subset - mask) & mask
+            if subset == 0:
+                break
+        tables.append(table)
+    return tuple(masks), tuple(tables)
+
+
+KNIGHT_ATTACKS = _leaperAttacks(((1, 2), (-1, 2), (1, -2), (-1, -2), (2, 1), (-2, 1), (2, -1), (-2, -1)))
+KING_ATTACKS = _leaperAttacks(((1, 0), (-1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1), (0, 1), (0, -1)))
+# Indexed [color][square], squares a pawn of that color attacks
+PAWN_ATTACKS = (_leaperAttacks(((-1, 1), (1, 1))), _leaperAttacks(((-1, -1), (1, -1))))
+
+RANK_MASKS, RANK_TABLES = _lineTables(((1, 0), (-1, 0)))
+FILE_MASKS, FILE_TABLES = _lineTables(((0, 1), (0, -1)))
+DIAGONAL_MASKS, DIAGONAL_TABLES = _lineTables(((1, 1), (-1, -1)))
+ANTIDIAGONAL_MASKS, ANTIDIAGONAL_TABLES = _lineTables(((-1, 1), (1, -1)))
+BETWEEN = _betweenTable()
+
+
+# Attack lookups ///
+def bishopAttacks(square: int, occupied: int) -> int:
+    'Returns squares attacked by a bishop on square given the occupancy.'
+    return (DIAGONAL_TABLES[square][occupied & DIAGONAL_MASKS[square]]
+            | ANTIDIAGONAL_TABLES[square][occupied & ANTIDIAGONAL_MASKS[square]])
+
+def rookAttacks(square: int, occupied: int) -> int:
+    'Returns squares attacked by a rook on square given the occupancy.'
+    return (RANK_TABLES[square][occupied & RANK_MASKS[square]]
+            | FILE_TABLES[square][occupied & FILE_MASKS[square]])
+
+def queenAttacks(square: int, occupied: int) -> int:
+    'Returns squares attacked by a queen on square given the occupancy.'
+    return bishopAttacks(square, occupied) | rookAttacks(square, occupied)
+
+def attacksFrom(piece_type: int, color: int, square: int, occupied: int) -> int:
+    'Returns squares attacked by a piece of type and color standing on square.'
+    if piece_type == PAWN:
+        return PAWN_ATTACKS[color][square]
+    elif piece_type == KNIGHT:
+        return KNIGHT_ATTACKS[square]
+    elif piece_type == BISHOP:
+        return bishopAttacks(square, occupied)
+    elif piece_type == ROOK:
+        return rookAttacks(square, occupied)
+    elif piece_type == QUEEN:
+        return queenAttacks(square, occupied)
+    return KING_ATTACKS[square]
+
+def attackersTo(board, square: int, color: int, occupied: int) -> int:
+    'Returns bitboard of color\'s pieces attacking square, with sliders blocked by occupied.'
+    bitboards = board.bitboards
+    base = color * 6
+    return ((PAWN_ATTACKS[color ^ 1][square] & bitboards[base + PAWN])
+            | (KNIGHT_ATTACKS[square] & bitboards[base + KNIGHT])
+            | (KING_ATTACKS[square] & bitboards[base + KING])
+            | (bishopAttacks(square, occupied) & (bitboards[base + BISHOP] | bitboards[base + QUEEN]))
+            | (rookAttacks(square, occupied) & (bitboards[base + ROOK] | bitboards[base + QUEEN])))
+
+def isSquareAttacked(board, square: int, color: int) -> bool:
+    'Returns whether color attacks square, looking outwards from the square once per piece kind.'
+    bitboards = board.bitboards
+    base = color * 6
+    if PAWN_ATTACKS[color ^ 1][square] & bitboards[base + PAWN]:
+        return True
+    if KNIGHT_ATTACKS[square] & bitboards[base + KNIGHT]:
+        return True
+    if KING_ATTACKS[square] & bitboards[base + KING]:
+        return True
+    queens = bitboards[base + QUEEN]
+    if bishopAttacks(square, board.occupied) & (bitboards[base + BISHOP] | queens):
+        return True
+    if rookAttacks(square, board.occupied) & (bitboards[base + ROOK] | queens):
+        return True
+    return False
+
+def pinnedPieces(board, color: int, king_square: int) -> int:
+    'Returns bitboard of color\'s pieces pinned against the king on king_square.'
+    bitboards = board.bitboards
+    enemy = (color ^ 1) * 6
+    queens = bitboards[enemy + QUEEN]
+    # Enemy sliders that would attack the king on an otherwise empty board
+    snipers = ((bishopAttacks(king_square, 0) & (bitboards[enemy + BISHOP] | queens))
+               | (rookAttacks(king_square, 0) & (bitboards[enemy + ROOK] | queens)))
+    pinned = 0
+    own = board.occupancy[color]
+    for sniper in squaresOf(snipers):
+        between = BETWEEN[king_square][sniper] & board.occupied
+        # Exactly one piece in the way, and it is ours
+        if between and not between & (between - 1) and between & own:
+            pinned |= between
+    return pinned
+
+
+# Move encoding ///
+def encodeMove(from_square: int, to_square: int, promotion: int = 0, flags: int = 0) -> int:
+    'Packs a move into a single int.'
+    return from_square | (to_square << 6) | (promotion << 12) | (flags << 16)
+
+def moveFrom(move: int) -> int:
+    'Returns the from square of an encoded move.'
+    return move & 63
+
+def moveTo(move: int) -> int:
+    'Returns the to square of an encoded move.'
+    return (move >> 6) & 63
+
+def movePromotion(move: int) -> int:
+    'Returns the promotion piece type of an encoded move, or 0 if none.'
+    return (move >> 12) & 15
+
+def moveFlags(move: int) -> int:
+    'Returns the flags of an encoded move.'
+    return move >> 16
+
+def moveToString(move: int) -> str:
+    'Returns an encoded move in the form \'square1square2\', with a promotion suffix if needed.'
+    notation = SQUARE_NAMES[move & 63] + SQUARE_NAMES[(move >> 6) & 63]
+    promotion = (move >> 12) & 15
+    if promotion:
+        notation += PROMOTION_SYMBOLS[promotion]
+    return notation
+
+
+# Generation ///
+def _addMoves(moves: list, from_square: int, targets: int, enemy: int) -> None:
+    'Appends a move from from_square to every square in targets.'
+    for to_square in squaresOf(targets):
+        if enemy & SQUARE_BITS[to_square]:
+            moves.append(from_square | (to_square << 6) | (FLAG_CAPTURE << 16))
+        else:
+            moves.append(from_square | (to_square << 6))
+
+def _addPawnMoves(moves: list, from_square: int, to_square: int, flags: int) -> None:
+    'Appends a pawn move, expanding it into every promotion on the last rank.'
+    if (to_square >= 56) or (to_square < 8):
+        for promotion in PROMOTION_PIECES:
+            moves.append(from_square | (to_square << 6) | (promotion << 12) | (flags << 16))
+    else:
+        moves.append(from_square | (to_square << 6) | (flags << 16))
+
+def pieceMoves(board, square: int, piece_type: int, color: int, captures_only: bool = False) -> list:
+    '''Returns encoded pseudo-legal moves for a piece of type and color standing on square,
+    or only its captures and promotions if captures_only.'''
+    moves = []
+    own = board.occupancy[color]
+    enemy = board.occupancy[color ^ 1]
+    occupied = board.occupied
+
+    if piece_type == PAWN:
+        step = 8 if color == WHITE else -8
+        start_rank = 1 if color == WHITE else 6
+        one = square + step
+        if 0 <= one < 64 and not occupied & SQUARE_BITS[one]:
+            if not captures_only:
+                _addPawnMoves(moves, square, one, 0)
+                two = one + step
+                if (square // 8 == start_rank) and not occupied & SQUARE_BITS[two]:
+                    moves.append(square | (two << 6) | (FLAG_DOUBLE_PUSH << 16))
+            elif (one >= 56) or (one < 8):
+                _addPawnMoves(moves, square, one, 0)
+        attacks = PAWN_ATTACKS[color][square]
+        for to_square in squaresOf(attacks & enemy):
+            _addPawnMoves(moves, square, to_square, FLAG_CAPTURE)
+        enpassant = SQUARE_INDEX.get(board.enpassant_target)
+        if enpassant is not None and attacks & SQUARE_BITS[enpassant]:
+            # Only a target square behind an enemy pawn can be captured onto
+            if enpassant // 8 == (5 if color == WHITE else 2):
+                moves.append(square | (enpassant << 6) | ((FLAG_CAPTURE | FLAG_ENPASSANT) << 16))
+        return moves
+
+    if captures_only:
+        _addMoves(moves, square, attacksFrom(piece_type, color, square, occupied) & enemy, enemy)
+        return moves
+
+    if piece_type == KING:
+        _addMoves(moves, square, KING_ATTACKS[square] & ~own, enemy)
+        for right in board.castling_availability:
+            castle = CASTLING_MOVES.get(right)
+            if castle is None or castle[0] != square:
+                continue
+            if (right.isupper() == (color == WHITE)) and not occupied & castle[2]:
+                moves.append(square | (castle[1] << 6) | (FLAG_CASTLE << 16))
+        return moves
+
+    _addMoves(moves, square, attacksFrom(piece_type, color, square, occupied) & ~own, enemy)
+    return moves
+
+def generateMoves(board, color: int, captures_only: bool = False) -> list:
+    'Returns every encoded pseudo-legal move for color, or only captures and promotions if captures_only.'
+    moves = []
+    bitboards = board.bitboards
+    base = color * 6
+    for piece_type in (PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING):
+        for square in squaresOf(bitboards[base + piece_type]):
+            moves.extend(pieceMoves(board, square, piece_type, color, captures_only))
+    return moves
+
+
+# Static exchange evaluation ///
+def staticExchange(board, move: int) -> int:
+    '''Returns the material balance, in SEE_VALUES, of the capture sequence started by move when both
+    sides keep recapturing on the destination with their least valuable attacker. Pins are ignored.'''
+    from_square = move & 63
+    to_square = (move >> 6) & 63
+    promotion = (move >> 12) & 15
+    bitboards = board.bitboards
+    mailbox = board.mailbox
+    color = mailbox[from_square] // 6
+    occupied = board.occupied ^ SQUARE_BITS[from_square]
+
+    # First capture /
+    if (move >> 16) & FLAG_ENPASSANT:
+        gain = SEE_VALUES[PAWN]
+        occupied ^= SQUARE_BITS[to_square - 8 if color == WHITE else to_square + 8]
+    elif mailbox[to_square] is not None:
+        gain = SEE_VALUES[mailbox[to_square] % 6]
+    else:
+        gain = 0
+    if promotion:
+        gain += SEE_VALUES[promotion] - SEE_VALUES[PAWN]
+        on_square = SEE_VALUES[promotion]
+    else:
+        on_square = SEE_VALUES[mailbox[from_square] % 6]
+    gains = [gain]
+
+    # Recaptures, least valuable attacker first /
+    side = color ^ 1
+    while True:
+        attackers = attackersTo(board, to_square, side, occupied) & occupied
+        if not attackers:
+            break
+        for piece_type in (PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING):
+            candidates = attackers & bitboards[side * 6 + piece_type]
+            if candidates:
+                break
+        # The king cannot recapture onto a defended square
+        if (piece_type == KING) and (attackersTo(board, to_square, side ^ 1, occupied) & occupied):
+            break
+        gains.append(on_square - gains[-1])
+        on_square = SEE_VALUES[piece_type]
+        # Removing the attacker uncovers any slider behind it
+        occupied ^= candidates & -candidates
+        side ^= 1
+
+    # Either side may stop recapturing when it would lose material /
+    while len(gains) > 1:
+        last = gains.pop()
+        gains[-1] = -max(-gains[-1], last)
+    return gains[0]
@@ -0,0 +1,97 @@
+# main/ordering.py
+# Move ordering for the engine search: hash move, captures, killer moves, then quiet moves by history
+from modules.bitboard import PAWN
+from modules.movegen import FLAG_CAPTURE, FLAG_ENPASSANT
+
+# Plies that keep killer moves
+MAX_PLY = 128
+# Indexed by piece type, victims sort by value first and attackers break ties
+ORDER_VALUES = (1, 3, 3, 5, 9, 20)
+# History scores are halved once any of them passes this
+HISTORY_LIMIT = 1 << 20
+
+
+class MoveOrderer:
+    def __init__(self):
+        self.clear()
+
+    # Public Get methods ///
+    def orderedMoves(self, board, moves: list, hash_move=None, ply: int = 0):
+        '''Yields moves in search order. Each stage is only sorted once the earlier ones are used up,
+        so a cutoff on the hash move or a capture skips the rest of the work. (Getter)'''
+        # Hash move /
+        if (hash_move is not None) and (hash_move in moves):
+            yield hash_move
+        else:
+            hash_move = None
+
+        # Captures and promotions, most valuable victim by least valuable attacker /
+        mailbox = board.mailbox
+        tactical = []
+        quiet = []
+        for move in moves:
+            if move == hash_move:
+                continue
+            if ((move >> 16) & FLAG_CAPTURE) or ((move >> 12) & 15):
+                tactical.append(move)
+            else:
+                quiet.append(move)
+        if tactical:
+            tactical.sort(key=lambda move: self.captureScore(mailbox, move), reverse=True)
+            yield from tactical
+
+        # Killer moves /
+        if ply < MAX_PLY:
+            for killer in self.killers[ply]:
+                if (killer is not None) and (killer in quiet):
+                    quiet.remove(killer)
+                    yield killer
+
+        # Quiet moves by history /
+        history = self.history
+        quiet.sort(key=lambda move: history[mailbox[move & 63]][(move >> 6) & 63], reverse=True)
+        yield from quiet
+    def captureScore(self, mailbox: list, move: int) -> int:
+        'Returns the MVV-LVA score of a capture or promotion. (Getter)'
+        if (move >> 16) & FLAG_ENPASSANT:
+            victim = PAWN
+        else:
+            victim = mailbox[(move >> 6) & 63]
+            victim = -1 if victim is None else victim % 6
+        score = (ORDER_VALUES[victim] << 4) if victim >= 0 else 0
+        promotion = (move >> 12) & 15
+        if promotion:
+            score += ORDER_VALUES[promotion] << 4
+        return score - ORDER_VALUES[mailbox[move & 63] % 6]
+
+    # Public Set methods ///
+    def recordCutoff(self, board, move: int, depth: int, ply: int) -> None:
+        'Remembers a quiet move that caused a beta cutoff as a killer and in the history table. (Setter)'
+        if ((move >> 16) & FLAG_CAPTURE) or ((move >> 12) & 15):
+            return
+        if ply < MAX_PLY:
+            killers = self.killers[ply]
+            if killers[0] != move:
+                killers[1] = killers[0]
+                killers[0] = move
+        row = self.history[board.mailbox[move & 63]]
+        to_square = (move >> 6) & 63
+        row[to_square] += depth * depth
+        if row[to_square] > HISTORY_LIMIT:
+            self.ageHistory()
+
+    # Other methods ///
+    def ageHistory(self) -> None:
+        'Halves every history score so recent cutoffs count for more.'
+        for row in self.history:
+            for square in range(64):
+                row[square] >>= 1
+    def newSearch(self) -> None:
+        'Prepares for a new search, forgetting killers and aging the history table.'
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.ageHistory()
+    def clear(self) -> None:
+        'Forgets all killer moves and history scores.'
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        # Indexed [piece code][to square]
+        self.history = [[0] * 64 for _ in range(12)]
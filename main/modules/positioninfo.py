@@ -0,0 +1,34 @@
+# main/positioninfo.py
+# Works out what the game window shows about a position, on a background thread so clicks stay responsive
+from modules.logic import Board
+
+
+class PositionInfo:
+    'Legal moves, notation and check state of a position, not changed once it has been published.'
+    __slots__ = ('key', 'color', 'moves', 'san', 'check', 'checkmate', 'stalemate')
+
+    def __init__(self, fen: str):
+        board = Board(fen)
+        self.key = board.zobristKey()
+        self.color = 'white' if board.active_color == 'w' else 'black'
+        legal = board.legalMoves(self.color)
+        # From square to to square to encoded moves, promotions share a destination
+        self.moves = {}
+        for move in legal:
+            self.moves.setdefault(move & 63, {}).setdefault((move >> 6) & 63, []).append(move)
+        # Standard algebraic notation with check marks by encoded move
+        self.san = {move: board.sanNotation(move, legal) + checkMark(board, move) for move in legal}
+        self.check = board.checkState(self.color)
+        self.checkmate = self.check and not legal
+        self.stalemate = (not self.check) and not legal
+
+
+def checkMark(board: Board, move: int) -> str:
+    'Returns \'+\' if the legal move gives check, \'#\' if it mates and an empty string otherwise.'
+    enemy = 'black' if board.active_color == 'w' else 'white'
+    board.makeMove(move)
+    mark = ''
+    if board.checkState(enemy):
+        mark = '+' if board.hasLegalMove(enemy) else '#'
+    board.unmakeMove()
+    return mark
@@ -0,0 +1,76 @@
+# main/repetition.py
+# Tracks position keys for constant time repetition checks
+
+
+class RepetitionTracker:
+    def __init__(self):
+        # Key -> occurrences within the current run of reversible moves
+        self.counts = {}
+        # Keys of the current run, oldest first
+        self.keys = []
+        # (counts, keys) of earlier runs, closed by irreversible moves
+        self.runs = []
+
+    # Public Get methods ///
+    def count(self, key=None) -> int:
+        'Returns how often key, or the latest key, occurred since the last irreversible move. (Getter)'
+        if key is None:
+            if not self.keys:
+                return 0
+            key = self.keys[-1]
+        return self.counts.get(key, 0)
+    def isRepetition(self) -> bool:
+        'Returns boolean whether the latest position occurred at least twice. (Getter)'
+        return self.count() >= 2
+    def isThreefold(self) -> bool:
+        'Returns boolean whether the latest position occurred at least three times. (Getter)'
+        return self.count() >= 3
+    def history(self) -> list:
+        'Returns every recorded key, oldest first. (Getter)'
+        keys = []
+        for run in self.runs:
+            keys.extend(run[1])
+        keys.extend(self.keys)
+        return keys
+    def copy(self):
+        'Returns a tracker holding the current run only, enough to detect repetitions going forward. (Getter)'
+        tracker = RepetitionTracker()
+        tracker.counts = self.counts.copy()
+        tracker.keys = self.keys.copy()
+        return tracker
+
+    # Other methods ///
+    def push(self, key: int, irreversible: bool = False) -> None:
+        'Records a position key, starting a new run when reached by an irreversible move.'
+        if irreversible and self.keys:
+            self.runs.append((self.counts, self.keys))
+            self.counts = {}
+            self.keys = []
+        self.keys.append(key)
+        self.counts[key] = self.counts.get(key, 0) + 1
+    def pop(self) -> int:
+        'Removes and returns the latest key, reopening the previous run if it empties the current one.'
+        key = self.keys.pop()
+        count = self.counts[key] - 1
+        if count:
+            self.counts[key] = count
+        else:
+            del self.counts[key]
+        if (not self.keys) and self.runs:
+            self.counts, self.keys = self.runs.pop()
+        return key
+    def replace(self, key: int) -> None:
+        'Replaces the latest key, for when the board was edited after the position was recorded.'
+        old = self.keys[-1]
+        count = self.counts[old] - 1
+        if count:
+            self.counts[old] = count
+        else:
+            del self.counts[old]
+        self.keys[-1] = key
+        self.counts[key] = self.counts.get(key, 0) + 1
+    def clear(self) -> None:
+        'Forgets every recorded key.'
+        self.counts = {}
+        self.keys = []
+        self.runs = []
@@ -0,0 +1,270 @@
+# main/tablebase.py
+# Distance to mate tables for king and queen, rook or pawn against a lone king, built by retrograde analysis
+# Each table holds one signed byte per position, memory-mapped when probed
+import mmap
+import os
+from modules.bitboard import WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, PIECE_SYMBOLS, squaresOf, lsbIndex
+from modules.movegen import KING_ATTACKS, PAWN_ATTACKS, rookAttacks, queenAttacks
+
+# Generation order, KPK promotes into the tables before it
+TABLES = ('KQK', 'KRK', 'KPK')
+TABLE_PIECES = {'KQK': QUEEN, 'KRK': ROOK, 'KPK': PAWN}
+# Side to move, strong king, weak king and strong piece squares, the strong side is always white
+TABLE_SIZE = 2 * 64 * 64 * 64
+# Tables generated by maketables.py, TABLEBASE_PATH overrides the directory
+DEFAULT_DIRECTORY = (os.environ.get('TABLEBASE_PATH')
+                     or os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tablebases'))
+# Longest distance a signed byte can hold
+MAX_PLIES = 126
+
+# Outcomes for the side to move
+WIN = 1
+DRAW = 0
+LOSS = -1
+# Bucket entry of a move leaving the table into a won position for the opponent
+_DECREMENT = 2
+
+
+def tableIndex(side: int, strong_king: int, weak_king: int, square: int) -> int:
+    'Returns the index of a position, the strong side\'s pieces being white.'
+    return (((((side << 6) | strong_king) << 6) | weak_king) << 6) | square
+
+def encodeValue(outcome: int, plies: int) -> int:
+    'Returns the stored byte of an outcome for the side to move: wins as plies to mate, losses as -(plies + 1).'
+    if outcome == WIN:
+        return plies
+    elif outcome == LOSS:
+        return (-(plies + 1)) & 0xFF
+    return 0
+
+def decodeValue(value: int) -> tuple:
+    'Returns (outcome, plies to mate) of a stored byte, outcome being WIN, DRAW or LOSS for the side to move.'
+    if value == 0:
+        return DRAW, 0
+    elif value < 128:
+        return WIN, value
+    return LOSS, 255 - value
+
+
+# Generation ///
+def _pieceAttacks(piece_type: int, square: int, occupied: int) -> int:
+    'Returns squares attacked by the strong side\'s piece.'
+    if piece_type == PAWN:
+        return PAWN_ATTACKS[WHITE][square]
+    elif piece_type == ROOK:
+        return rookAttacks(square, occupied)
+    return queenAttacks(square, occupied)
+
+def _isValid(side: int, strong_king: int, weak_king: int, square: int, piece_type: int) -> bool:
+    'Returns whether a position can occur, with distinct squares, apart kings and the side not to move out of check.'
+    if (strong_king == weak_king) or (strong_king == square) or (weak_king == square):
+        return False
+    if (KING_ATTACKS[strong_king] >> weak_king) & 1:
+        return False
+    if (piece_type == PAWN) and ((square < 8) or (square >= 56)):
+        return False
+    if side == WHITE:
+        occupied = (1 << strong_king) | (1 << weak_king) | (1 << square)
+        if (_pieceAttacks(piece_type, square, occupied) >> weak_king) & 1:
+            return False
+    return True
+
+def _moves(side: int, strong_king: int, weak_king: int, square: int, piece_type: int, promotions: dict):
+    '''Returns the indexes of positions reached by legal moves staying in the table, and the (outcome, plies)
+    for the opponent of every position reached by a move leaving it.'''
+    occupied = (1 << strong_king) | (1 << weak_king) | (1 << square)
+    children = []
+    exits = []
+    if side == WHITE:
+        for target in squaresOf(KING_ATTACKS[strong_king] & ~occupied & ~KING_ATTACKS[weak_king]):
+            children.append(tableIndex(BLACK, target, weak_king, square))
+        if piece_type == PAWN:
+            target = square + 8
+            if not (occupied >> target) & 1:
+                if target >= 56:
+                    for table in promotions.values():
+                        exits.append(decodeValue(table[tableIndex(BLACK, strong_king, weak_king, target)]))
+                    # Knight and bishop promotions can't mate
+                    exits.append((DRAW, 0))
+                else:
+                    children.append(tableIndex(BLACK, strong_king, weak_king, target))
+                    if (square < 16) and not (occupied >> (square + 16)) & 1:
+                        children.append(tableIndex(BLACK, strong_king, weak_king, square + 16))
+        else:
+            for target in squaresOf(_pieceAttacks(piece_type, square, occupied) & ~occupied):
+                children.append(tableIndex(BLACK, strong_king, weak_king, target))
+    else:
+        # Sliders see through the weak king along the line it flees on
+        guarded = KING_ATTACKS[strong_king] | _pieceAttacks(piece_type, square, occupied & ~(1 << weak_king))
+        for target in squaresOf(KING_ATTACKS[weak_king] & ~guarded & ~(1 << strong_king)):
+            if target == square:
+                # Bare kings
+                exits.append((DRAW, 0))
+            else:
+                children.append(tableIndex(WHITE, strong_king, target, square))
+    return children, exits
+
+def _unmoves(side: int, strong_king: int, weak_king: int, square: int, piece_type: int) -> list:
+    'Returns the indexes of positions one non-capturing move before, which may still be invalid.'
+    occupied = (1 << strong_king) | (1 << weak_king) | (1 << square)
+    parents = []
+    if side == BLACK:
+        for origin in squaresOf(KING_ATTACKS[strong_king] & ~occupied & ~KING_ATTACKS[weak_king]):
+            parents.append(tableIndex(WHITE, origin, weak_king, square))
+        if piece_type == PAWN:
+            origin = square - 8
+            if (origin >= 8) and not (occupied >> origin) & 1:
+                parents.append(tableIndex(WHITE, strong_king, weak_king, origin))
+                if (24 <= square < 32) and not (occupied >> (square - 16)) & 1:
+                    parents.append(tableIndex(WHITE, strong_king, weak_king, square - 16))
+        else:
+            for origin in squaresOf(_pieceAttacks(piece_type, square, occupied) & ~occupied):
+                parents.append(tableIndex(WHITE, strong_king, weak_king, origin))
+    else:
+        for origin in squaresOf(KING_ATTACKS[weak_king] & ~occupied & ~KING_ATTACKS[strong_king]):
+            parents.append(tableIndex(BLACK, strong_king, origin, square))
+    return parents
+
+def generateTable(name: str, promotions: dict = None) -> bytearray:
+    '''Returns the table of name by retrograde analysis, working back from the mates one ply at a time.
+    promotions maps table names to finished tables that promoting pawns move into.'''
+    piece_type = TABLE_PIECES[name]
+    promotions = promotions or {}
+    values = bytearray(TABLE_SIZE)
+    valid = bytearray(TABLE_SIZE)
+    resolved = bytearray(TABLE_SIZE)
+    # Moves of each position whose result is still open, and whether a move leaving the table draws or wins
+    counts = [0] * TABLE_SIZE
+    escapes = bytearray(TABLE_SIZE)
+    # Positions whose outcome becomes known at each distance, as (index, outcome)
+    buckets = [[] for _ in range(MAX_PLIES + 2)]
+
+    for side in (WHITE, BLACK):
+        for strong_king in range(64):
+            for weak_king in range(64):
+                for square in range(64):
+                    if not _isValid(side, strong_king, weak_king, square, piece_type):
+                        continue
+                    index = tableIndex(side, strong_king, weak_king, square)
+                    valid[index] = 1
+                    children, exits = _moves(side, strong_king, weak_king, square, piece_type, promotions)
+                    counts[index] = len(children)
+                    for outcome, plies in exits:
+                        if outcome == LOSS:
+                            escapes[index] = 1
+                            buckets[plies + 1].append((index, WIN))
+                        elif outcome == DRAW:
+                            escapes[index] = 1
+                        else:
+                            counts[index] += 1
+                            buckets[plies].append((index, _DECREMENT))
+                    if (not children) and (not exits):
+                        occupied = (1 << strong_king) | (1 << weak_king) | (1 << square)
+                        if (side == BLACK) and (_pieceAttacks(piece_type, square, occupied) >> weak_king) & 1:
+                            buckets[0].append((index, LOSS))
+                        else:
+                            # Stalemate
+                            resolved[index] = 1
+
+    for plies, bucket in enumerate(buckets):
+        for index, outcome in bucket:
+            if resolved[index]:
+                continue
+            if outcome == _DECREMENT:
+                counts[index] -= 1
+                if (counts[index] == 0) and not escapes[index]:
+                    buckets[plies + 1].append((index, LOSS))
+                continue
+            resolved[index] = 1
+            values[index] = encodeValue(outcome, plies)
+            square = index & 63
+            weak_king = (index >> 6) & 63
+            strong_king = (index >> 12) & 63
+            for parent in _unmoves(index >> 18, strong_king, weak_king, square, piece_type):
+                if (not valid[parent]) or resolved[parent]:
+                    continue
+                if outcome == LOSS:
+                    buckets[plies + 1].append((parent, WIN))
+                else:
+                    counts[parent] -= 1
+                    if (counts[parent] == 0) and not escapes[parent]:
+                        buckets[plies + 1].append((parent, LOSS))
+    # Whatever is left can be held by the weaker side
+    return values
+
+def generateTables(directory: str = DEFAULT_DIRECTORY, names=TABLES, report=None) -> None:
+    'Generates the tables in names into directory, calling report(name) before each if given.'
+    os.makedirs(directory, exist_ok=True)
+    finished = {}
+    for name in names:
+        if report is not None:
+            report(name)
+        promotions = {promoted: finished[promoted] for promoted in ('KQK', 'KRK') if promoted in finished}
+        if (TABLE_PIECES[name] == PAWN) and (len(promotions) < 2):
+            # Pawns need the tables they promote into
+            for promoted in ('KQK', 'KRK'):
+                if promoted not in promotions:
+                    promotions[promoted] = generateTable(promoted)
+        finished[name] = generateTable(name, promotions)
+        with open(os.path.join(directory, name + '.tb'), 'wb') as file:
+            file.write(finished[name])
+
+def openTablebases(directory: str = DEFAULT_DIRECTORY):
+    'Returns the Tablebases in directory, or None if it holds no tables.'
+    tablebases = Tablebases(directory)
+    if not tablebases.tables:
+        return None
+    return tablebases
+
+
+class Tablebases:
+    def __init__(self, directory: str = DEFAULT_DIRECTORY):
+        self.directory = directory
+        self.files = {}
+        self.tables = {}
+        for name in TABLES:
+            path = os.path.join(directory, name + '.tb')
+            if os.path.isfile(path) and (os.path.getsize(path) == TABLE_SIZE):
+                self.files[name] = open(path, 'rb')
+                self.tables[name] = mmap.mmap(self.files[name].fileno(), 0, access=mmap.ACCESS_READ)
+
+    # Public Get methods ///
+    def probe(self, board):
+        '''Returns (outcome, plies to mate) for the side to move, outcome being WIN, DRAW or LOSS, or None if the
+        position is not covered. Any position with only kings and at most one knight or bishop is a draw. (Getter)'''
+        count = board.occupied.bit_count()
+        if count > 3:
+            return None
+        if count == 2:
+            return DRAW, 0
+        bitboards = board.bitboards
+        for code in range(12):
+            if (code % 6 != KING) and bitboards[code]:
+                break
+        piece_type = code % 6
+        if piece_type in (KNIGHT, BISHOP):
+            return DRAW, 0
+        table = self.tables.get('K' + PIECE_SYMBOLS[piece_type] + 'K')
+        if table is None:
+            return None
+        color = code // 6
+        strong_king = lsbIndex(bitboards[color * 6 + KING])
+        weak_king = lsbIndex(bitboards[(color ^ 1) * 6 + KING])
+        square = lsbIndex(bitboards[code])
+        side = WHITE if board.active_color == 'w' else BLACK
+        if color == BLACK:
+            # Mirror ranks and colors so the strong side is white
+            strong_king ^= 56
+            weak_king ^= 56
+            square ^= 56
+            side ^= 1
+        return decodeValue(table[tableIndex(side, strong_king, weak_king, square)])
+
+    # Other methods ///
+    def close(self) -> None:
+        'Unmaps and closes every table.'
+        for name in self.tables:
+            self.tables[name].close()
+            self.files[name].close()
+        self.tables = {}
+        self.files = {}
@@ -0,0 +1,85 @@
+# main/transposition.py
+# Fixed size transposition table keyed by Zobrist key
+
+# Bound types of a stored score
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+# Rough memory held by one slot, a list pointer plus an entry tuple of five ints
+SLOT_SIZE = 128
+
+
+class TranspositionTable:
+    def __init__(self, size_mb: int = 16):
+        self.resize(size_mb)
+
+    # Public Get methods ///
+    def probe(self, key: int):
+        'Returns the entry (key, depth, score, bound, move) stored for key, or None. (Getter)'
+        index = (key % self.buckets) << 1
+        entry = self.slots[index]
+        if (entry is None) or (entry[0] != key):
+            entry = self.slots[index + 1]
+            if (entry is None) or (entry[0] != key):
+                self.misses += 1
+                return None
+        self.hits += 1
+        return entry
+    def bestMove(self, key: int):
+        'Returns the best move stored for key without counting a probe, or None. (Getter)'
+        index = (key % self.buckets) << 1
+        for entry in (self.slots[index], self.slots[index + 1]):
+            if (entry is not None) and (entry[0] == key):
+                return entry[4]
+        return None
+    def stats(self) -> dict:
+        'Returns hit, miss and overwrite counts plus the permille of slots in use. (Getter)'
+        # Sample like UCI hashfull instead of walking the whole table
+        sample = self.slots[:1000]
+        used = sum(1 for entry in sample if entry is not None)
+        return {
+            'size_mb': self.size_mb,
+            'entries': len(self.slots),
+            'hits': self.hits,
+            'misses': self.misses,
+            'stores': self.stores,
+            'overwrites': self.overwrites,
+            'hashfull': used * 1000 // len(sample),
+        }
+
+    # Public Set methods ///
+    def store(self, key: int, depth: int, score, bound: int, move) -> None:
+        '''Stores a search result. The first slot of a bucket keeps the deepest entry, the second
+        takes whatever the first one rejects. (Setter)'''
+        index = (key % self.buckets) << 1
+        entry = (key, depth, score, bound, move)
+        self.stores += 1
+        deep = self.slots[index]
+        if (deep is None) or (deep[0] == key) or (depth >= deep[1]):
+            if (deep is not None) and (deep[0] != key):
+                # Demote the shallower entry rather than losing it outright
+                old = self.slots[index + 1]
+                if (old is not None) and (old[0] != deep[0]):
+                    self.overwrites += 1
+                self.slots[index + 1] = deep
+            self.slots[index] = entry
+        else:
+            old = self.slots[index + 1]
+            if (old is not None) and (old[0] != key):
+                self.overwrites += 1
+            self.slots[index + 1] = entry
+    def resize(self, size_mb: int) -> None:
+        'Reallocates the table to roughly size_mb megabytes, clearing it. (Setter)'
+        self.size_mb = max(1, int(size_mb))
+        self.buckets = max(1, (self.size_mb << 20) // (SLOT_SIZE * 2))
+        self.clear()
+
+    # Other methods ///
+    def clear(self) -> None:
+        'Empties the table and resets its statistics.'
+        self.slots = [None] * (self.buckets << 1)
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.overwrites = 0
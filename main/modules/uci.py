@@ -0,0 +1,264 @@
+# main/uci.py
+# Long-lived UCI engine processes, started once and handed out per game
+import os
+import queue
+import shutil
+import subprocess
+import threading
+from modules.evaluation import MATE_SCORE
+
+# Binary used when none is given, STOCKFISH_PATH overrides the search of PATH
+DEFAULT_COMMAND = (os.environ.get('STOCKFISH_PATH') or shutil.which('stockfish')
+                   or '/opt/homebrew/Cellar/stockfish/16/bin/stockfish')
+DEFAULT_THREADS = 1
+DEFAULT_HASH = 16
+# Seconds to wait for a reply, go adds its own search time on top
+REPLY_TIMEOUT = 10.0
+
+
+class UCIError(Exception):
+    'Raised when a UCI engine process fails to start, dies or stops answering.'
+
+
+def parseInfo(line: str):
+    '''Returns (depth, score, pv) of an info line carrying a principal variation, or None. score is in
+    centipawns from the side to move, mates on the engine\'s MATE_SCORE scale.'''
+    tokens = line.split()
+    if (not tokens) or (tokens[0] != 'info') or ('pv' not in tokens) or ('depth' not in tokens):
+        return None
+    depth = int(tokens[tokens.index('depth') + 1])
+    score = 0
+    if 'score' in tokens:
+        index = tokens.index('score')
+        value = int(tokens[index + 2])
+        if tokens[index + 1] == 'mate':
+            # Mate in n moves is 2n - 1 plies away, being mated in n is 2n
+            score = MATE_SCORE - (2 * value - 1) if value > 0 else -2 * value - MATE_SCORE
+        else:
+            score = value
+    return depth, score, tokens[tokens.index('pv') + 1:]
+
+
+class UCIEngine:
+    def __init__(self, command=DEFAULT_COMMAND, options=None):
+        # command is a path or an argument list, e.g. [sys.executable, 'main/uciengine.py']
+        self.command = [command] if isinstance(command, str) else list(command)
+        try:
+            self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                            stderr=subprocess.DEVNULL, text=True, bufsize=1)
+        except OSError as error:
+            raise UCIError(f'Could not start UCI engine {self.command}: {error}')
+        self.lines = queue.Queue()
+        self.reader = threading.Thread(target=self.readLines, daemon=True)
+        self.reader.start()
+        self.name = None
+        self.options = {}
+        self.ponder_move = None
+        # Set between go and its bestmove, so stop is only sent to a running search
+        self.searching = False
+        # Nodes of the last search, from its info lines
+        self.nodes = 0
+
+        # Handshake /
+        self.send('uci')
+        for line in self.readUntil('uciok'):
+            if line.startswith('id name '):
+                self.name = line[8:]
+            elif line.startswith('option name '):
+                name = line[12:].split(' type ')[0]
+                self.options[name] = line
+        for name, value in (options or {}).items():
+            self.setOption(name, value)
+        self.isReady()
+
+    # Public Get methods ///
+    def isAlive(self) -> bool:
+        'Returns whether the engine process is still running. (Getter)'
+        return self.process.poll() is None
+    def hasOption(self, name: str) -> bool:
+        'Returns whether the engine declared the option during the handshake. (Getter)'
+        return name in self.options
+
+    # Public Set methods ///
+    def setOption(self, name: str, value) -> None:
+        'Sets a UCI option, ignoring options the engine does not declare. (Setter)'
+        if self.options and not self.hasOption(name):
+            return
+        if isinstance(value, bool):
+            value = 'true' if value else 'false'
+        self.send(f'setoption name {name} value {value}')
+    def setPosition(self, fen: str, moves=None) -> None:
+        'Sets the position to search from a FEN string and optional moves in the form \'square1square2\'. (Setter)'
+        command = f'position fen {fen}'
+        if moves:
+            command += ' moves ' + ' '.join(moves)
+        self.send(command)
+
+    # Other methods ///
+    def send(self, command: str) -> None:
+        'Writes one command line to the engine.'
+        if not self.isAlive():
+            raise UCIError(f'UCI engine {self.command} has exited')
+        try:
+            self.process.stdin.write(command + '\n')
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError) as error:
+            raise UCIError(f'UCI engine {self.command} closed its input: {error}')
+    def readLines(self) -> None:
+        'Reader thread, queues every output line so reads can time out. None marks the end of output.'
+        for line in self.process.stdout:
+            self.lines.put(line.strip())
+        self.lines.put(None)
+    def readUntil(self, prefix: str, timeout: float = REPLY_TIMEOUT, on_line=None) -> list:
+        'Returns output lines up to and including the first one starting with prefix, passing each to on_line if given.'
+        lines = []
+        while True:
+            try:
+                line = self.lines.get(timeout=timeout)
+            except queue.Empty:
+                raise UCIError(f'UCI engine {self.command} did not answer with {prefix!r}')
+            if line is None:
+                raise UCIError(f'UCI engine {self.command} exited while waiting for {prefix!r}')
+            lines.append(line)
+            if on_line is not None:
+                on_line(line)
+            if line.startswith(prefix):
+                return lines
+    def isReady(self) -> None:
+        'Waits until the engine has processed every command sent so far.'
+        self.send('isready')
+        self.readUntil('readyok')
+    def newGame(self) -> None:
+        'Tells the engine the next position is from a different game.'
+        self.send('ucinewgame')
+        self.isReady()
+    def go(self, movetime: int = None, depth: int = None, on_info=None, clock: tuple = None) -> str:
+        '''Searches the current position for movetime milliseconds, to depth or on clock, returns the best move.
+        clock is (wtime, btime, winc, binc) in milliseconds.'''
+        self.startSearch(movetime, depth, clock=clock)
+        if clock is not None:
+            timeout = REPLY_TIMEOUT + max(clock[0], clock[1]) / 1000
+        else:
+            timeout = REPLY_TIMEOUT + (movetime or 0) / 1000 if depth is None else None
+        return self.readBestMove(timeout, on_info)
+    def startSearch(self, movetime: int = None, depth: int = None, ponder: bool = False, clock: tuple = None) -> None:
+        '''Sends go without waiting for the reply, readBestMove collects it. A ponder search runs until
+        ponderHit or stop, the position being the one after the expected reply.'''
+        command = 'go ponder' if ponder else 'go'
+        if clock is not None:
+            wtime, btime, winc, binc = (max(0, int(value)) for value in clock)
+            command += f' wtime {wtime} btime {btime} winc {winc} binc {binc}'
+        if movetime is not None:
+            command += f' movetime {max(1, int(movetime))}'
+        if depth is not None:
+            command += f' depth {depth}'
+        self.searching = True
+        self.nodes = 0
+        self.send(command)
+    def stop(self) -> None:
+        'Ends the running search early, the engine still answers with its best move so far.'
+        if self.searching:
+            self.send('stop')
+    def ponderHit(self) -> None:
+        'Tells a ponder search the expected move was played, it carries on under its normal limits.'
+        if self.searching:
+            self.send('ponderhit')
+    def readBestMove(self, timeout, on_info=None) -> str:
+        '''Reads up to the bestmove line, remembering the ponder move and node count if given.
+        on_info(depth, score, pv) is called for every info line with a principal variation.'''
+        def on_line(line):
+            tokens = line.split()
+            if ('nodes' in tokens) and (tokens[0] == 'info'):
+                index = tokens.index('nodes') + 1
+                if (index < len(tokens)) and tokens[index].isdigit():
+                    self.nodes = int(tokens[index])
+            if on_info is not None:
+                info = parseInfo(line)
+                if info is not None:
+                    on_info(*info)
+        try:
+            tokens = self.readUntil('bestmove', timeout, on_line)[-1].split()
+        finally:
+            self.searching = False
+        self.ponder_move = tokens[3] if (len(tokens) >= 4) and (tokens[2] == 'ponder') else None
+        if (len(tokens) < 2) or (tokens[1] == '(none)'):
+            return None
+        return tokens[1]
+    def quit(self, timeout: float = 1.0) -> None:
+        'Asks the engine to exit, killing it if it does not within timeout seconds.'
+        if self.isAlive():
+            try:
+                self.send('quit')
+                self.process.wait(timeout)
+            except (UCIError, subprocess.TimeoutExpired):
+                self.process.kill()
+                self.process.wait()
+        for stream in (self.process.stdin, self.process.stdout):
+            try:
+                stream.close()
+            except OSError:
+                pass
+
+
+class UCIPool:
+    def __init__(self, command=DEFAULT_COMMAND, threads: int = DEFAULT_THREADS, hash_mb: int = DEFAULT_HASH,
+                 size: int = 1):
+        self.command = command
+        self.threads = threads
+        self.hash_mb = hash_mb
+        # Idle processes kept alive between games
+        self.size = size
+        self.idle = []
+        self.busy = []
+        self.lock = threading.Lock()
+
+    # Public Get methods ///
+    def acquire(self) -> UCIEngine:
+        'Returns an engine for a new game, reusing an idle process when one is running. (Getter)'
+        engine = None
+        with self.lock:
+            while self.idle and engine is None:
+                engine = self.idle.pop()
+                if not engine.isAlive():
+                    engine = None
+        if engine is None:
+            engine = self.start()
+        engine.newGame()
+        with self.lock:
+            self.busy.append(engine)
+        return engine
+
+    # Other methods ///
+    def start(self) -> UCIEngine:
+        'Starts a new engine process with the pool\'s Threads and Hash.'
+        return UCIEngine(self.command, {'Threads': self.threads, 'Hash': self.hash_mb})
+    def warm(self) -> None:
+        'Starts idle processes up to the pool size, meant to run in a background thread at start-up.'
+        while True:
+            with self.lock:
+                if len(self.idle) >= self.size:
+                    return
+            try:
+                engine = self.start()
+            except UCIError:
+                # No engine installed, games that need one will report it
+                return
+            with self.lock:
+                self.idle.append(engine)
+    def release(self, engine: UCIEngine) -> None:
+        'Returns an engine after its game, keeping it running for the next one if the pool has room.'
+        with self.lock:
+            if engine in self.busy:
+                self.busy.remove(engine)
+            if engine.isAlive() and len(self.idle) < self.size:
+                self.idle.append(engine)
+                return
+        engine.quit()
+    def shutdown(self) -> None:
+        'Quits every process of the pool, idle or not.'
+        with self.lock:
+            engines = self.idle + self.busy
+            self.idle = []
+            self.busy = []
+        for engine in engines:
+            engine.quit()
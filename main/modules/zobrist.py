@@ -0,0 +1,52 @@
+# main/zobrist.py
+# Zobrist keys for hashing positions into a single 64-bit int
+from random import Random
+from modules.bitboard import PAWN, SQUARE_INDEX
+from modules.movegen import PAWN_ATTACKS
+
+# Fixed seed so keys are identical between runs and worker processes
+_random = Random(0x43414531)
+
+# Indexed [piece code][square]
+PIECE_KEYS = tuple(tuple(_random.getrandbits(64) for _ in range(64)) for _ in range(12))
+# Hashed in when black is to move
+SIDE_KEY = _random.getrandbits(64)
+CASTLING_KEYS = {right: _random.getrandbits(64) for right in 'KQkq'}
+# Indexed by file of the enpassant target square
+ENPASSANT_KEYS = tuple(_random.getrandbits(64) for _ in range(8))
+
+_castling_cache = {}
+
+
+def castlingKey(castling_availability: str) -> int:
+    'Returns the combined key of a castling availability string.'
+    key = _castling_cache.get(castling_availability)
+    if key is None:
+        key = 0
+        for right in castling_availability:
+            key ^= CASTLING_KEYS.get(right, 0)
+        _castling_cache[castling_availability] = key
+    return key
+
+def enpassantKey(board) -> int:
+    '''Returns the key of the board\'s enpassant target square, which only counts when a pawn
+    of the side to move could actually capture onto it.'''
+    square = SQUARE_INDEX.get(board.enpassant_target)
+    if square is None:
+        return 0
+    color = 0 if board.active_color == 'w' else 1
+    if board.bitboards[color * 6 + PAWN] & PAWN_ATTACKS[color ^ 1][square]:
+        return ENPASSANT_KEYS[square & 7]
+    return 0
+
+def positionKey(board) -> int:
+    'Computes the full key of a board from scratch.'
+    key = 0
+    for square, code in enumerate(board.mailbox):
+        if code is not None:
+            key ^= PIECE_KEYS[code][square]
+    if board.active_color == 'b':
+        key ^= SIDE_KEY
+    key ^= castlingKey(board.castling_availability)
+    key ^= enpassantKey(board)
+    return key
@@ -0,0 +1,122 @@
+# main/perft.py
+# Perft benchmark and move generation correctness suite
+#
+#   python main/perft.py --depth 4                 perft of the start position
+#   python main/perft.py --fen "<fen>" --divide    node counts per root move
+#   python main/perft.py --suite                   check every known position
+
+import sys
+import time
+import argparse
+from modules.logic import Board
+
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+# (name, fen, {depth: nodes}) with node counts from the published perft tables
+PERFT_SUITE = [
+    ('start position', START_FEN,
+     {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609}),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+     {1: 48, 2: 2039, 3: 97862, 4: 4085603}),
+    ('en passant and discovered checks', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+     {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624}),
+    ('promotions and castling', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+     {1: 6, 2: 264, 3: 9467, 4: 422333}),
+    ('promotions and castling, mirrored', 'r2q1rk1/pP1p2pp/Q4n2/bbp1p3/Np6/1B3NBn/pPPP1PPP/R3K2R b KQ - 0 1',
+     {1: 6, 2: 264, 3: 9467, 4: 422333}),
+    ('underpromotion with check', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+     {1: 44, 2: 1486, 3: 62379, 4: 2103487}),
+    ('middlegame', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+     {1: 46, 2: 2079, 3: 89890, 4: 3894594}),
+    ('illegal en passant, pinned by rook', '3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1',
+     {6: 1134888}),
+    ('illegal en passant, pinned by bishop', '8/8/4k3/8/2p5/8/B2P2K1/8 w - - 0 1',
+     {6: 1015133}),
+    ('en passant capture of checking pawn', '8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1',
+     {6: 1440467}),
+    ('short castling gives check', '5k2/8/8/8/8/8/8/4K2R w K - 0 1',
+     {6: 661072}),
+    ('long castling gives check', '3k4/8/8/8/8/8/8/R3K3 w Q - 0 1',
+     {6: 803711}),
+    ('castling rights lost by capture', 'r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1',
+     {4: 1274206}),
+    ('castling prevented', 'r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1',
+     {4: 1720476}),
+    ('promote out of check', '2K2r2/4P3/8/8/8/8/8/3k4 w - - 0 1',
+     {6: 3821001}),
+    ('discovered check', '8/8/1P2K3/8/2n5/1q6/8/5k2 b - - 0 1',
+     {5: 1004658}),
+    ('promote to give check', '4k3/1P6/8/8/8/8/K7/8 w - - 0 1',
+     {6: 217342}),
+    ('underpromote to avoid stalemate', '8/P1k5/K7/8/8/8/8/8 w - - 0 1',
+     {6: 92683}),
+    ('self stalemate', 'K1k5/8/P7/8/8/8/8/8 w - - 0 1',
+     {6: 2217}),
+    ('stalemate and checkmate', '8/k1P5/8/1K6/8/8/8/8 w - - 0 1',
+     {7: 567584}),
+    ('double check', '8/8/2k5/5q2/5n2/8/5K2/8 b - - 0 1',
+     {4: 23527}),
+]
+
+
+def runPerft(fen: str, depth: int, divide: bool) -> int:
+    'Runs perft on fen, printing the node count and nodes per second.'
+    board = Board(fen)
+    start = time.perf_counter()
+    if divide:
+        counts = board.divide(depth)
+        for move in sorted(counts):
+            print(f'{move}: {counts[move]}')
+        nodes = sum(counts.values())
+    else:
+        nodes = board.perft(depth)
+    elapsed = time.perf_counter() - start
+    print(f'Depth {depth}: {nodes} nodes in {elapsed:.2f}s ({nodesPerSecond(nodes, elapsed)} nps)')
+    return nodes
+
+def runSuite(max_nodes: int) -> bool:
+    'Checks every suite position up to max_nodes leaf nodes, returns whether all counts matched.'
+    passed = True
+    total_nodes = 0
+    total_time = 0.0
+    for name, fen, expected in PERFT_SUITE:
+        board = Board(fen)
+        for depth, nodes in sorted(expected.items()):
+            if nodes > max_nodes:
+                continue
+            start = time.perf_counter()
+            result = board.perft(depth)
+            elapsed = time.perf_counter() - start
+            total_nodes += result
+            total_time += elapsed
+            status = 'ok' if result == nodes else f'FAIL (expected {nodes})'
+            if result != nodes:
+                passed = False
+            print(f'{name}, depth {depth}: {result} {status} [{nodesPerSecond(result, elapsed)} nps]')
+    print(f'Total: {total_nodes} nodes in {total_time:.2f}s ({nodesPerSecond(total_nodes, total_time)} nps)')
+    return passed
+
+def nodesPerSecond(nodes: int, elapsed: float) -> int:
+    'Returns nodes per second, guarding against a zero timer.'
+    if elapsed <= 0:
+        return nodes
+    return int(nodes / elapsed)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Perft benchmark for modules.logic')
+    parser.add_argument('--fen', default=START_FEN, help='position to search (default: start position)')
+    parser.add_argument('--depth', type=int, default=4, help='search depth in plies')
+    parser.add_argument('--divide', action='store_true', help='print node counts per root move')
+    parser.add_argument('--suite', action='store_true', help='verify node counts of the known positions')
+    parser.add_argument('--max-nodes', type=int, default=1000000,
+                        help='skip suite entries with more leaf nodes than this')
+    args = parser.parse_args(argv)
+
+    if args.suite:
+        return 0 if runSuite(args.max_nodes) else 1
+    runPerft(args.fen, args.depth, args.divide)
+    return 0
+
+# Program entry point
+if __name__ == '__main__':
+    sys.exit(main())
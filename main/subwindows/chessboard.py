@@ -2,20 +2,25 @@
 
 from PySide6.QtWidgets import QWidget, QMainWindow, QApplication
 from PySide6.QtMultimedia import QSoundEffect
-from PySide6.QtCore import QTimer, Qt, QUrl, QEvent, QThread
+from PySide6.QtCore import QTimer, Qt, QUrl, QEvent, QObject, Signal
 from PySide6.QtGui import QCloseEvent, QKeyEvent
+from concurrent.futures import ThreadPoolExecutor
 from subwindows.ui import chessboardui
+from modules.logic import Board, CASTLING_ROOKS
+from modules.repetition import RepetitionTracker
+from modules.positioninfo import PositionInfo, checkMark
+from modules.movegen import moveToString, FLAG_CAPTURE, FLAG_ENPASSANT, FLAG_CASTLE
+from modules.bitboard import (KNIGHT, BISHOP, KING, COLOR_NAMES, PIECE_NAMES, PIECE_INDEX, PIECE_SYMBOLS,
+                              SQUARE_NAMES, SQUARE_INDEX, squaresOf)
 from math import floor
 
 
-class EngineThread(QThread):
-    def __init__(self, parent):
-        super().__init__()
-        self.parent = parent
-
-    def run(self):
-        'Run expensive operation'
-        self.parent.engineMove()
+class EngineSignals(QObject):
+    'Carries engine search results to the UI thread, emitted from the search thread and delivered queued.'
+    # Request number and the finished future
+    moveFound = Signal(int, object)
+    # Request number and the finished future of a PositionInfo
+    positionFound = Signal(int, object)
 
 class SubWindow(QWidget):
     def __init__(self, parent: QMainWindow):
@@ -27,6 +32,20 @@ class SubWindow(QWidget):
         self.preferenceswindow = PreferencesWindow(self)
 
         # Board variables
+        self.board: Board = None
+        # Legal moves by Zobrist key, see legalMoveMap
+        self.legal_moves: dict = {}
+        # Positions reached are analysed one at a time off the UI thread, see analysePosition
+        self.position_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='positions')
+        self.position_info: PositionInfo = None
+        self.position_request_id = 0
+        # Replies to any other request number are from cancelled searches. Never reset, so a late reply from
+        # the last game can't match a request of the next one
+        self.engine_request_id = 0
+        self.engine_signals = EngineSignals()
+        # Queued even when emitted on the UI thread, a finished ponder search replies before the caller is done
+        self.engine_signals.moveFound.connect(self.engineMoveFound, Qt.QueuedConnection)
+        self.engine_signals.positionFound.connect(self.positionAnalysed, Qt.QueuedConnection)
         self.gametype = None
         self.mutesound = False
         self.blindfold = False
@@ -48,7 +67,6 @@ class SubWindow(QWidget):
         self.kingpos: dict = {'white': None, 'black': None}
         self.check = False
         self.check_tile = (None, None)
-        self.enpassant_color = None
         self.pawn_promote = None
         self.hintname = 'defaulthint'
         self.hintcapturename = 'defaulthintcapture'
@@ -57,10 +75,10 @@ class SubWindow(QWidget):
         self.move_log_pointer = 0
         self.current_notation = None
         self.current_log = []
-        self.board_position_history = []
+        self.repetitions = RepetitionTracker()
         self.to_resign = None
         self.will_promote = False
-        self.enginereq = (None, None)
+        self.enginereq = (None, None, 'queen')
         self.enginedidpromote = False
 
         # Sound variables
@@ -117,7 +135,7 @@ class SubWindow(QWidget):
         self.parent.setFixedSize(1000, 700)
         self.parent.setWindowTitle('Chessboard')
         self.resetVariables()
-        self.board_position_history = []
+        self.repetitions = RepetitionTracker()
         self.current_log = []
         self.move_log = {}
         self.move_log_pointer = 0
@@ -129,6 +147,8 @@ class SubWindow(QWidget):
         self.enginetomove = False
         self.engineactive = False
         self.enginerequest = None
+        # Key of the position the engine is pondering on, the one after the reply it expects
+        self.ponder_key = None
 
         self.ui.clearBoard()
         self.ui.clearLog()
@@ -168,7 +188,7 @@ class SubWindow(QWidget):
                 self.ui.player1_label.setText(self.player1_name)
                 self.ui.player2_label.setText(self.player2_name)
 
-            if self.active_color == 'b':
+            if self.board.active_color == 'b':
                 self.current_log.append('-')
                 self.move_log_pointer += 1
                 self.move_log[self.move_log_pointer] = self.current_log[0]
@@ -185,25 +205,17 @@ class SubWindow(QWidget):
 
             if configurations[0] == 0:
                 self.gametype = 'engine'
-                if self.active_color == 'b' and self.player1_color == 'white':
-                    self.engineactive = True
-                    self.engine_thread = EngineThread(self)
-                    self.engine_thread.finished.connect(self.engineMoveRequest)
-                    self.engine_thread.start()
-                elif self.active_color == 'b' and self.player1_color == 'black':
+                if self.board.active_color == 'b' and self.player1_color == 'white':
+                    self.startEngineSearch()
+                elif self.board.active_color == 'b' and self.player1_color == 'black':
                     self.engineactive = False
-                elif self.active_color == 'w' and self.player1_color == 'black':
-                    self.engineactive = True
-                    self.engine_thread = EngineThread(self)
-                    self.engine_thread.finished.connect(self.engineMoveRequest)
-                    self.engine_thread.start()
-                elif self.active_color == 'w' and self.player1_color == 'white':
+                elif self.board.active_color == 'w' and self.player1_color == 'black':
+                    self.startEngineSearch()
+                elif self.board.active_color == 'w' and self.player1_color == 'white':
                     self.engineactive = False
             else:
                 self.gametype = 'player'
 
-            self.board_position_history.append(self.saveBoardPosition())
-
     def resetVariables(self) -> None:
         'Resets variables to their init state.'
         self.gametype = None
@@ -227,7 +239,6 @@ class SubWindow(QWidget):
         self.kingpos: dict = {'white': None, 'black': None}
         self.check = False
         self.check_tile = (None, None)
-        self.enpassant_color = None
         self.pawn_promote = None
         self.hintname = 'defaulthint'
         self.hintcapturename = 'defaulthintcapture'
@@ -236,10 +247,10 @@ class SubWindow(QWidget):
         self.move_log_pointer = 0
         self.current_notation = None
         self.current_log = []
-        self.board_position_history = []
+        self.repetitions = RepetitionTracker()
         self.to_resign = None
         self.will_promote = False
-        self.enginereq = (None, None)
+        self.enginereq = (None, None, 'queen')
         self.enginedidpromote = False
 
     # If cursor hovers over widget
@@ -325,42 +336,20 @@ class SubWindow(QWidget):
 
     def pawnPromoteRequest(self, piecename) -> None:
         pawninfo = self.pawn_promote.pieceInformation()
-        self.pawn_promote.setPieceInformation(piecename, pawninfo[1], pawninfo[2])
-        if self.blindfold is False:
-            self.pawn_promote.pieceShow()
+        # The board made the move with a queen while the piece was being picked
+        move = self.board.move_stack[-1][0]
+        self.board.unmakeMove()
+        move = (move & ~(15 << 12)) | (PIECE_INDEX[piecename] << 12)
+        san = self.algebraicNotation(move)
+        self.board.makeMove(move)
+        self.syncPieces()
         self.ui.pawnPromotion(pawninfo[2])
         if self.mutesound is False:
             self.s_promote.play()
-        # Game state checks
-        flip = {'white': 'black', 'black': 'white'}
-        possiblechecks = self.calculateValidSquares(self.pawn_promote)
-        oppositeking = flip[pawninfo[1]]
-        if self.check is True:
-            self.check_tile[0].setDefaultColor(self.check_tile[1])
-            self.check_tile[0].resetColor()
-            self.check = False
-        if self.kingpos[oppositeking] in possiblechecks:
-            self.check = True
-            self.checkFunc(flip[pawninfo[1]])
-        else:
-            # Discovered check
-            for i in range(64):
-                widget = self.ui.piece_layout.itemAt(i).widget()
-                widgetinfo = widget.pieceInformation()
-                if widgetinfo[0] is None:
-                    continue
-                if widgetinfo[1] == pawninfo[1]:
-                    checksquares = self.calculateValidSquares(widget)
-                    if self.kingpos[oppositeking] in checksquares:
-                        self.check = True
-                        self.checkFunc(flip[widgetinfo[1]])
-                        break
-                else:
-                    continue
         
-        # Add to move log
+        # Add to move log, the check mark goes before the piece
         ref = {'rook': 'R', 'bishop': 'B', 'queen': 'Q', 'knight': 'N'}
-        self.current_notation += '/' + ref[piecename]
+        self.current_notation += san[len(san.rstrip('+#')):] + '/' + ref[piecename]
         if pawninfo[1] == 'white':
             self.current_log.append(self.current_notation)
             self.move_log_pointer += 1
@@ -369,20 +358,20 @@ class SubWindow(QWidget):
         else:
             self.current_log.append(self.current_notation)
             self.move_log[self.move_log_pointer] = (self.current_log[0], self.current_log[1])
+            self.parent.current_data_file.writeLog(f'{self.current_log[0]}/{self.current_log[1]}')
             self.current_log = []
             self.updateMoveLog(True)
+        self.parent.current_data_file.updateFEN(self.exportFEN())
 
         self.occupied = False
         self.promotion = True
         self.pawn_promote = None
         self.will_promote = False
         self.insufficientMaterialCheck()
+        self.analysePosition()
 
-        if pawninfo[1] == self.player1_color:
-            self.engineactive = True
-            self.engine_thread = EngineThread(self)
-            self.engine_thread.finished.connect(self.engineMoveRequest)
-            self.engine_thread.start()
+        if (pawninfo[1] == self.player1_color) and (not self.occupied):
+            self.startEngineSearch()
         
         if not self.firstmove:
             self.timeController()
@@ -393,10 +382,112 @@ class SubWindow(QWidget):
         x = self.kingpos
         return x
 
-    def engineMove(self) -> None:
-        'Engine\'s turn to move.'
-        self.parent.updateEngineFen(self.exportFEN())
-        movetomake = self.parent.requestEngineMove()
+    def legalMoveMap(self) -> dict:
+        '''Returns the legal moves of the side to move as from square to to square to encoded moves. They are
+        generated once per position and kept under its Zobrist key until the next irreversible move.'''
+        key = self.board.zobristKey()
+        movemap = self.legal_moves.get(key)
+        if movemap is None:
+            if self.board.halfmove_clock == 0:
+                # Earlier positions can't occur again
+                self.legal_moves.clear()
+            color = 'white' if self.board.active_color == 'w' else 'black'
+            movemap = {}
+            for move in self.board.legalMoves(color):
+                movemap.setdefault(move & 63, {}).setdefault((move >> 6) & 63, []).append(move)
+            self.legal_moves[key] = movemap
+        return movemap
+
+    def findMove(self, from_pos: str, to_pos: str, promotion: str = 'queen'):
+        'Returns the legal encoded move of the side to move between two squares, or None. Pawns promote to promotion.'
+        moves = self.legalMoveMap().get(SQUARE_INDEX[from_pos], {}).get(SQUARE_INDEX[to_pos], ())
+        for move in moves:
+            if (not (move >> 12) & 15) or (PIECE_NAMES[(move >> 12) & 15] == promotion):
+                return move
+        return None
+
+    def syncPieces(self) -> None:
+        'Repaints the piece widgets whose square differs from the board model and records where the kings are.'
+        mailbox = self.board.mailbox
+        for square in range(64):
+            code = mailbox[square]
+            piece = (PIECE_NAMES[code % 6], COLOR_NAMES[code // 6]) if code is not None else (None, None)
+            widget = self.ui.piece_layout.itemAtPosition(7 - (square >> 3), square & 7).widget()
+            if widget.pieceInformation()[:2] != piece:
+                widget.setPieceInformation(piece[0], piece[1], SQUARE_NAMES[square])
+                if self.blindfold is False:
+                    widget.pieceShow()
+        for color in ('white', 'black'):
+            square = self.board.kingSquare(color)
+            self.kingpos[color] = SQUARE_NAMES[square] if square is not None else None
+
+    def startEngineSearch(self) -> None:
+        'Engine\'s turn to move, the search runs in the background and its move arrives in engineMoveFound.'
+        # The player's move ended the game
+        if self.occupied:
+            return
+        self.engineactive = True
+        # Clock 1 runs on white's turns and clock 2 on black's
+        time_left = None
+        if not self.no_time_limit:
+            time_left = self.clock1 if self.board.active_color == 'w' else self.clock2
+        self.engine_request_id += 1
+        request_id = self.engine_request_id
+        signals = self.engine_signals
+        # The ponder search already has the reply played, a miss restarts from the actual position
+        future = None
+        if (self.ponder_key is not None) and (self.saveBoardPosition() == self.ponder_key):
+            future = self.parent.enginePonderHit(time_left)
+        self.ponder_key = None
+        if future is None:
+            # No progress callback, nothing in the window shows search depth or score
+            future = self.parent.requestEngineMove(self.exportFEN(), self.repetitions, time_left)
+        # Runs on the search thread, so it only emits a signal
+        future.add_done_callback(lambda future: signals.moveFound.emit(request_id, future))
+
+    def startPonder(self) -> None:
+        'Lets the engine search the position after the reply it expects while the player thinks.'
+        self.ponder_key = None
+        if self.occupied or (self.gametype != 'engine'):
+            return
+        reply = self.parent.engineExpectedReply()
+        if reply is None:
+            return
+        position = Board(self.exportFEN())
+        position.setRepetitions(self.repetitions)
+        color = 'white' if position.active_color == 'w' else 'black'
+        for move in position.legalMoves(color):
+            if moveToString(move) == reply:
+                position.makeMove(move)
+                break
+        else:
+            return
+        # The engine's clock, clock 1 runs on white's turns and clock 2 on black's
+        time_left = None
+        if not self.no_time_limit:
+            time_left = self.clock1 if position.active_color == 'w' else self.clock2
+        self.ponder_key = position.zobristKey()
+        self.parent.ponderEngineMove(position.getFen().getString(), position.repetitions, time_left)
+
+    def cancelEngineSearch(self) -> None:
+        'Stops the engine thinking or pondering, e.g. when the game ends on its turn.'
+        self.engine_request_id += 1
+        if self.engineactive or (self.ponder_key is not None):
+            self.engineactive = False
+            self.ponder_key = None
+            self.parent.cancelEngineMove()
+
+    def engineMoveFound(self, request_id: int, future) -> None:
+        'Plays the move of a finished search on the UI thread, ignoring cancelled and outdated searches.'
+        if (request_id != self.engine_request_id) or future.cancelled():
+            return
+        if self.occupied:
+            self.engineactive = False
+            return
+        movetomake = future.result()
+        if movetomake is None:
+            self.engineactive = False
+            return
 
         # Find piece and target info
         pos = self.convertSquareNotation(movetomake[0] + movetomake[1])
@@ -406,9 +497,12 @@ class SubWindow(QWidget):
         pos = self.convertToPieceLayoutPos(pos)
         target = self.ui.piece_layout.itemAtPosition(pos[0], pos[1]).widget()
 
+        # Promotion piece as the engine's lowercase letter, e.g. 'e7e8n'
+        promotion = {'q': 'queen', 'r': 'rook', 'b': 'bishop', 'n': 'knight'}.get(movetomake[4:], 'queen')
+
         # Make move
-        self.enginereq = (piece, target)
-        #self.movePiece(piece, target, True)
+        self.enginereq = (piece, target, promotion)
+        self.engineMoveRequest()
     
     def loadLogs(self, logs: list[str]) -> None:
         'Load logs from an array of notations.'
@@ -432,165 +526,55 @@ class SubWindow(QWidget):
 
     # Imports FEN string
     def importFEN(self, fen: str) -> None:
-        # Splits fen string into sections and sets variables
-        self.fen = fen
-        sections = fen.split(' ')
-        self.piece_placement: str = sections[0]
-        self.active_color: str = sections[1]
-        self.castling_availability: str = sections[2]
-        self.enpassant_square: str = sections[3]
-        self.halfmove_clock: int = int(sections[4])
-        self.fullmove_clock: int = int(sections[5])
-
-        # Clear board
-        for i in range(64):
-            widget = self.ui.piece_layout.itemAt(i).widget()
-            widgetinfo = widget.pieceInformation()
-            widget.setPieceInformation(None, None, widgetinfo[2])
-
-        # Process piece placement data
-        piece_ref = {'p': 'pawn', 'r': 'rook', 'b': 'bishop',
-                     'n': 'knight','k': 'king', 'q': 'queen'}
-        flip_digits = {1: 8, 2: 7, 3: 6, 4: 5,
-                       5: 4, 6: 3, 7: 2, 8: 1}
-        
-        pieces = list(self.piece_placement)
-        rank = 1
-        file = 1
-        for piece in pieces:
-            if piece == '/':
-                rank += 1
-                file = 1
-            elif piece.isnumeric():
-                file += int(piece)
-            elif piece.lower() in piece_ref:
-                pos = self.convertToPieceLayoutPos((file, flip_digits[rank]))
-                tilepos = self.convertSquareNotation((file, flip_digits[rank]))
-                if piece.isupper():
-                    self.placePiece(piece_ref[piece.lower()], 'white', pos, tilepos)
-                else:
-                    self.placePiece(piece_ref[piece], 'black', pos, tilepos)
-                file += 1
+        # The board is the model the widgets are painted from
+        self.board = Board(fen)
+        self.legal_moves = {}
+        self.position_info = None
+        # Kept by the board as moves are made, engine requests copy it from here
+        self.repetitions = self.board.repetitions
+        self.syncPieces()
 
     # Algebraic notation
-    def algebraicNotation(self, piece, targetpos: str, capture: bool, check: bool, castle: str) -> str:
-        '''Returns algebraic notation of piece if it were to move to targetpos, or returns notation of
-        appropriate game conditions'''
-        ref = {'knight': 'N', 'rook': 'R', 'king': 'K', 'queen': 'Q', 'bishop': 'B'}
-        pieceinfo = piece.pieceInformation()
-
-        # Identifying disambiguation
-        identifier = ''
-        need_to_disambiguate = []
-        for i in range(64):
-            widget = self.ui.piece_layout.itemAt(i).widget()
-            if widget == piece:
-                continue
-            widgetinfo = widget.pieceInformation()
-            if (widgetinfo[0] == pieceinfo[0]) and (widgetinfo[1] == pieceinfo[1]):
-                valid = self.calculateValidMoves(widget)
-                if targetpos in valid:
-                    need_to_disambiguate.append(widget)
-        if need_to_disambiguate:
-            for piece_2 in need_to_disambiguate:
-                pieceinfo_2 = piece_2.pieceInformation()
-                if identifier == '':
-                    if pieceinfo_2[2][0] == pieceinfo[2][0]:
-                        if pieceinfo_2[2][1] == pieceinfo[2][1]:
-                            identifier = pieceinfo[2]
-                            break
-                        else:
-                            identifier = pieceinfo[2][1]
-                    else:
-                        identifier = pieceinfo[2][0]
-                elif identifier.isalnum():
-                    if pieceinfo_2[2][1] == identifier:
-                        identifier = pieceinfo[2]
-                        break
-                else:
-                    if pieceinfo_2[2][0] == identifier:
-                        if pieceinfo_2[2][1] == pieceinfo[2][1]:
-                            identifier = pieceinfo[2]
-                            break
-                        else:
-                            identifier = pieceinfo[2][1]
-            
-
-        notation: str = targetpos
-        if capture:
-            notation = 'x' + notation
-        if pieceinfo[0] != 'pawn':
-            notation = ref[pieceinfo[0]] + identifier + notation
-        else:
-            notation = identifier + notation
-        return notation
-
-    def saveBoardPosition(self) -> list:
-        'Provides a way to save and compare board positions for repetition rules'
-        board_position = []
-        for i in range(64):
-            widget = self.ui.piece_layout.itemAt(i).widget()
-            widgetinfo = widget.pieceInformation()
-            board_position.append(widgetinfo)
-        return board_position
+    def algebraicNotation(self, move: int) -> str:
+        '''Returns standard algebraic notation of a move before it is made, with its check mark. It comes from the
+        background analysis of the position if that has arrived and is worked out from the legal moves otherwise.'''
+        info = self.position_info
+        if (info is not None) and (info.key == self.board.zobristKey()):
+            return info.san[move]
+        # Only moves to the same square can need telling apart
+        to_square = (move >> 6) & 63
+        rivals = [other for targets in self.legalMoveMap().values() for other in targets.get(to_square, ())]
+        return self.board.sanNotation(move, rivals) + checkMark(self.board, move)
+
+    def saveBoardPosition(self) -> int:
+        'Returns the Zobrist key of the displayed position for repetition rules'
+        return self.board.zobristKey()
 
     def threefoldRepetition(self) -> None:
-        'Checks for threefold repetition by managing the stack of the last three moves'
-        self.board_position_history.append(self.saveBoardPosition())
-
-        # Threefold repetition check
-        for position in self.board_position_history:
-            if self.board_position_history.count(position) == 3:
-                self.occupied = True
-                self.parent.completeANIIL()
-                self.s_end.play()
-                self.timer1.stop()
-                self.timer2.stop()
-                self.ui.player1_time.setStyleSheet('color: #FFFFFF')
-                self.ui.player1_label.setStyleSheet('color: #FFFFFF')
-                self.ui.player2_time.setStyleSheet('color: #FFFFFF')
-                self.ui.player2_label.setStyleSheet('color: #FFFFFF')
-                self.ui.repetition()
+        'Function to execute when there is a draw via threefold repetition'
+        self.cancelEngineSearch()
+        self.occupied = True
+        self.parent.completeANIIL()
+        self.s_end.play()
+        self.timer1.stop()
+        self.timer2.stop()
+        self.ui.player1_time.setStyleSheet('color: #FFFFFF')
+        self.ui.player1_label.setStyleSheet('color: #FFFFFF')
+        self.ui.player2_time.setStyleSheet('color: #FFFFFF')
+        self.ui.player2_label.setStyleSheet('color: #FFFFFF')
+        self.ui.repetition()
 
-    def enginePawnPromotion(self, pawn) -> None:
-        'Promotes engine pawn to queen.'
+    def enginePawnPromotion(self, pawn, san: str) -> None:
+        'Completes the engine\'s pawn promotion, the board has already made it. san is the notation of the move.'
         self.occupied = True
         self.pawn_promote = pawn
         pawninfo = self.pawn_promote.pieceInformation()
-        self.pawn_promote.setPieceInformation('queen', pawninfo[1], pawninfo[2])
-        if self.blindfold is False:
-            self.pawn_promote.pieceShow()
         if self.mutesound is False:
             self.s_promote.play()
-        # Game state checks
-        flip = {'white': 'black', 'black': 'white'}
-        possiblechecks = self.calculateValidSquares(self.pawn_promote)
-        oppositeking = flip[pawninfo[1]]
-        if self.check is True:
-            self.check_tile[0].setDefaultColor(self.check_tile[1])
-            self.check_tile[0].resetColor()
-            self.check = False
-        if self.kingpos[oppositeking] in possiblechecks:
-            self.check = True
-            self.checkFunc(flip[pawninfo[1]])
-        else:
-            # Discovered check
-            for i in range(64):
-                widget = self.ui.piece_layout.itemAt(i).widget()
-                widgetinfo = widget.pieceInformation()
-                if widgetinfo[0] is None:
-                    continue
-                if widgetinfo[1] == pawninfo[1]:
-                    checksquares = self.calculateValidSquares(widget)
-                    if self.kingpos[oppositeking] in checksquares:
-                        self.check = True
-                        self.checkFunc(flip[widgetinfo[1]])
-                        break
-                else:
-                    continue
         
-        # Add to move log
-        self.current_notation += '/' + 'Q'
+        # Add to move log, the check mark goes before the piece
+        move = self.board.move_stack[-1][0]
+        self.current_notation += san[len(san.rstrip('+#')):] + '/' + PIECE_SYMBOLS[(move >> 12) & 15]
         if pawninfo[1] == 'white':
             self.current_log.append(self.current_notation)
             self.move_log_pointer += 1
@@ -599,6 +583,7 @@ class SubWindow(QWidget):
         else:
             self.current_log.append(self.current_notation)
             self.move_log[self.move_log_pointer] = (self.current_log[0], self.current_log[1])
+            self.parent.current_data_file.writeLog(f'{self.current_log[0]}/{self.current_log[1]}')
             self.current_log = []
             self.updateMoveLog(True)
 
@@ -607,84 +592,11 @@ class SubWindow(QWidget):
         self.pawn_promote = None
         self.will_promote = False
         self.insufficientMaterialCheck()
+        self.analysePosition()
 
     # Returns new FEN string
     def exportFEN(self) -> str:
-        sections = []
-
-        # Section 1
-        piece_ref = {'pawn': 'p', 'rook': 'r', 'bishop': 'b',
-                     'knight': 'n','king': 'k', 'queen': 'q'}
-        section = []
-        empty = 0
-        for r in '87654321':
-            for f in 'abcdefgh':
-                position = self.convertSquareNotation(f+r)
-                position = self.convertToPieceLayoutPos(position)
-                piece = self.ui.piece_layout.itemAtPosition(position[0], position[1]).widget()
-                pieceinfo = piece.pieceInformation()
-                if pieceinfo[0] is not None:
-                    if empty:
-                        section.append(str(empty))
-                        empty = 0
-                    if pieceinfo[1] == 'white':
-                        section.append(piece_ref[pieceinfo[0]].upper())
-                    else:
-                        section.append(piece_ref[pieceinfo[0]])
-                else:
-                    empty += 1
-            if empty:
-                section.append(str(empty))
-                empty = 0
-            if r != '1':
-                section.append('/')
-        sections.append(''.join(section))
-
-        # Section 2
-        sections.append(self.active_color)
-
-        # Section 3
-        castling_availability = ''
-        whiteking = self.ui.piece_layout.itemAtPosition(7, 4).widget()
-        blackking = self.ui.piece_layout.itemAtPosition(0, 4).widget()
-        whitekinginfo = whiteking.pieceInformation()
-        blackkinginfo = blackking.pieceInformation()
-        kwhiterook = self.ui.piece_layout.itemAtPosition(7, 7).widget()
-        qwhiterook = self.ui.piece_layout.itemAtPosition(7, 0).widget()
-        kblackrook = self.ui.piece_layout.itemAtPosition(0, 7).widget()
-        qblackrook = self.ui.piece_layout.itemAtPosition(0, 0).widget()
-        kwhiterookinfo = kwhiterook.pieceInformation()
-        qwhiterookinfo = kwhiterook.pieceInformation()
-        kblackrookinfo = kblackrook.pieceInformation()
-        qblackrookinfo = qblackrook.pieceInformation()
-
-        if (whitekinginfo[0] == 'king') and (whitekinginfo[1] == 'white') and (whiteking.moved is False):
-            if (kwhiterookinfo[0] == 'rook') and (kwhiterookinfo[1] == 'white') and (kwhiterook.moved is False):
-                castling_availability += 'K'
-            if (qwhiterookinfo[0] == 'rook') and (qwhiterookinfo[1] == 'white') and (qwhiterook.moved is False):
-                castling_availability += 'Q'
-        if (blackkinginfo[0] == 'king') and (blackkinginfo[1] == 'black') and (blackking.moved is False):
-            if (kblackrookinfo[0] == 'rook') and (kblackrookinfo[1] == 'black') and (kblackrook.moved is False):
-                castling_availability += 'k'
-            if (qblackrookinfo[0] == 'rook') and (qblackrookinfo[1] == 'black') and (qblackrook.moved is False):
-                castling_availability += 'q'
-        
-        if castling_availability == '':
-            sections.append('-')
-        else:
-            sections.append(castling_availability)
-
-        # Section 4
-        sections.append(self.enpassant_square)
-
-        # Section 5
-        sections.append(self.halfmove_clock)
-
-        # Section 6
-        sections.append(self.fullmove_clock)
-
-        newfen = f'{sections[0]} {sections[1]} {sections[2]} {sections[3]} {sections[4]} {sections[5]}'
-        return newfen
+        return self.board.getFen().getString()
 
     # Copies FEN string to system clipboard
     def copyFEN(self) -> None:
@@ -694,124 +606,6 @@ class SubWindow(QWidget):
         event = QEvent(QEvent.Clipboard)
         self.parent.application.sendEvent(clipboard, event)
 
-    def canCastle(self, castletype: str) -> bool:
-        '''Checks to see if the king can castle depending on the parameter passed. 
-        K: white kingside, Q: white queenside, k: black kingside, q: black queenside.'''
-        # White kingside
-        if castletype == 'K':
-            checkifempty = ['f1', 'g1']
-            rookpos = self.convertToPieceLayoutPos((8, 1))
-            rookwidget = self.ui.piece_layout.itemAtPosition(rookpos[0], rookpos[1]).widget()
-            rookinfo = rookwidget.pieceInformation()
-            kingpos = self.convertToPieceLayoutPos((5, 1))
-            kingwidget = self.ui.piece_layout.itemAtPosition(kingpos[0], kingpos[1]).widget()
-            kinginfo = kingwidget.pieceInformation()
-            # Checks tiles inbetween are empty
-            for tile in checkifempty:
-                pos = self.convertSquareNotation(tile)
-                pos = self.convertToPieceLayoutPos(pos)
-                widget = self.ui.piece_layout.itemAtPosition(pos[0], pos[1]).widget()
-                widgetinfo = widget.pieceInformation()
-                if widgetinfo[0] is not None:
-                    return False
-            # Checks that rook and king are in the correct position and have not moved
-            if (kinginfo[0] != 'king') or (kingwidget.moved is True) or (kinginfo[1] != 'white'):
-                return False
-            if (rookinfo[0] != 'rook') or (rookwidget.moved is True) or (rookinfo[1] != 'white'):
-                return False
-            # Else allow the castle
-            return True
-        # White queenside
-        if castletype == 'Q':
-            checkifempty = ['b1', 'c1', 'd1']
-            rookpos = self.convertToPieceLayoutPos((1, 1))
-            rookwidget = self.ui.piece_layout.itemAtPosition(rookpos[0], rookpos[1]).widget()
-            rookinfo = rookwidget.pieceInformation()
-            kingpos = self.convertToPieceLayoutPos((5, 1))
-            kingwidget = self.ui.piece_layout.itemAtPosition(kingpos[0], kingpos[1]).widget()
-            kinginfo = kingwidget.pieceInformation()
-            # Checks tiles inbetween are empty
-            for tile in checkifempty:
-                pos = self.convertSquareNotation(tile)
-                pos = self.convertToPieceLayoutPos(pos)
-                widget = self.ui.piece_layout.itemAtPosition(pos[0], pos[1]).widget()
-                widgetinfo = widget.pieceInformation()
-                if widgetinfo[0] is not None:
-                    return False
-            # Checks that rook and king are in the correct position and have not moved
-            if (kinginfo[0] != 'king') or (kingwidget.moved is True) or (kinginfo[1] != 'white'):
-                return False
-            if (rookinfo[0] != 'rook') or (rookwidget.moved is True) or (rookinfo[1] != 'white'):
-                return False
-            # Else allow the castle
-            return True
-        # Black kingside
-        if castletype == 'k':
-            checkifempty = ['f8', 'g8']
-            rookpos = self.convertToPieceLayoutPos((8, 8))
-            rookwidget = self.ui.piece_layout.itemAtPosition(rookpos[0], rookpos[1]).widget()
-            rookinfo = rookwidget.pieceInformation()
-            kingpos = self.convertToPieceLayoutPos((5, 8))
-            kingwidget = self.ui.piece_layout.itemAtPosition(kingpos[0], kingpos[1]).widget()
-            kinginfo = kingwidget.pieceInformation()
-            # Checks tiles inbetween are empty
-            for tile in checkifempty:
-                pos = self.convertSquareNotation(tile)
-                pos = self.convertToPieceLayoutPos(pos)
-                widget = self.ui.piece_layout.itemAtPosition(pos[0], pos[1]).widget()
-                widgetinfo = widget.pieceInformation()
-                if widgetinfo[0] is not None:
-                    return False
-            # Checks that rook and king are in the correct position and have not moved
-            if (kinginfo[0] != 'king') or (kingwidget.moved is True) or (kinginfo[1] != 'black'):
-                return False
-            if (rookinfo[0] != 'rook') or (rookwidget.moved is True) or (rookinfo[1] != 'black'):
-                return False
-            # Else allow the castle
-            return True
-        # Black queenside
-        if castletype == 'q':
-            checkifempty = ['b8', 'c8', 'd8']
-            rookpos = self.convertToPieceLayoutPos((1, 8))
-            rookwidget = self.ui.piece_layout.itemAtPosition(rookpos[0], rookpos[1]).widget()
-            rookinfo = rookwidget.pieceInformation()
-            kingpos = self.convertToPieceLayoutPos((5, 8))
-            kingwidget = self.ui.piece_layout.itemAtPosition(kingpos[0], kingpos[1]).widget()
-            kinginfo = kingwidget.pieceInformation()
-            # Checks tiles inbetween are empty
-            for tile in checkifempty:
-                pos = self.convertSquareNotation(tile)
-                pos = self.convertToPieceLayoutPos(pos)
-                widget = self.ui.piece_layout.itemAtPosition(pos[0], pos[1]).widget()
-                widgetinfo = widget.pieceInformation()
-                if widgetinfo[0] is not None:
-                    return False
-            # Checks that rook and king are in the correct position and have not moved
-            if (kinginfo[0] != 'king') or (kingwidget.moved is True) or (kinginfo[1] != 'black'):
-                return False
-            if (rookinfo[0] != 'rook') or (rookwidget.moved is True) or (rookinfo[1] != 'black'):
-                return False
-            # Else allow the castle
-            return True
-        
-        # Edge case
-        return False
-
-    # Places pieces at specific position
-    def placePiece(self, piece: str, color: str, pos: tuple, tilepos: str) -> None:
-        'Places piece on existing empty widget.'
-        piecewidget = self.ui.piece_layout.itemAtPosition(pos[0], pos[1]).widget()
-        piecewidget.setPieceInformation(piece, color, tilepos)
-        if self.blindfold is False:
-            piecewidget.pieceShow()
-
-        # Update kingpos
-        pieceinfo = piecewidget.pieceInformation()
-        if (pieceinfo[0] == 'king') and (pieceinfo[1] == 'white'):
-            self.kingpos['white'] = pieceinfo[2]
-        elif (pieceinfo[0] == 'king') and (pieceinfo[1] == 'black'):
-            self.kingpos['black'] = pieceinfo[2]
-        
     # Converts seconds to MM:SS format
     def convertTime(self, seconds) -> str:
         decimal = seconds / 60
@@ -887,7 +681,7 @@ class SubWindow(QWidget):
         self.timer1.timeout.connect(self.update1)
         self.timer2.timeout.connect(self.update2)
         if not self.firstmove:
-            if self.active_color == 'b':
+            if self.board.active_color == 'b':
                 # Switch to black
                 if not self.no_time_limit:
                     self.timer2.start(1000)
@@ -998,9 +792,8 @@ class SubWindow(QWidget):
                 self.active_piece = None
             else:
                 # Select new piece
-                valid = self.calculateValidMoves(piece)
-                self.showHints(valid, piece)
                 if self.active_tile is None:
+                    self.showHints(self.calculateValidMoves(piece), piece)
                     self.active_tile = tile
                     self.active_piece = piece
                     if not self.hide_highlights:
@@ -1008,8 +801,7 @@ class SubWindow(QWidget):
                 else:
                     # Select another piece
                     self.hideHints()
-                    valid = self.calculateValidMoves(piece)
-                    self.showHints(valid, piece)
+                    self.showHints(self.calculateValidMoves(piece), piece)
                     self.active_tile.resetColor()
                     self.active_tile = tile
                     self.active_piece = piece
@@ -1029,10 +821,7 @@ class SubWindow(QWidget):
                         # Engine move
                         if self.gametype == 'engine':
                             if not self.will_promote:
-                                self.engineactive = True
-                                self.engine_thread = EngineThread(self)
-                                self.engine_thread.finished.connect(self.engineMoveRequest)
-                                self.engine_thread.start()
+                                self.startEngineSearch()
                 else:
                     self.hideHints()
                     self.active_tile.resetColor()
@@ -1056,8 +845,8 @@ class SubWindow(QWidget):
         self.active_tile = None
         self.active_piece = None
 
-        self.movePiece(self.enginereq[0],self.enginereq[1], False)
-        self.parent.updateEngineFen(self.exportFEN())
+        self.movePiece(self.enginereq[0], self.enginereq[1], False, self.enginereq[2])
+        self.parent.updateEngineFen(self.exportFEN(), self.repetitions)
         self.engineactive = False
 
         # Engine move highlights
@@ -1072,6 +861,7 @@ class SubWindow(QWidget):
         if not self.hide_highlights:
             self.second_active.setStyleSheet(f'background-color: {self.highlight}')
             self.active_tile.setStyleSheet(f'background-color: {self.highlight2}')
+        self.startPonder()
 
     def checkFunc(self, kingcolor) -> None:
         'Code to run during an active check'
@@ -1086,18 +876,39 @@ class SubWindow(QWidget):
         if self.mutesound is False:
             self.s_check.play()
 
-        # Checkmate code
-        for i in range(64):
-            piece = self.ui.piece_layout.itemAt(i).widget()
-            valid = self.calculateValidMoves(piece)
-            pieceinfo = piece.pieceInformation()
-            if pieceinfo[1] != kingcolor:
-                continue
-            if self.returnHints(valid, piece):
-                self.current_notation += '+'
-                return
-        self.checkmate(kingcolor)
-        self.current_notation += '#'
+    def analysePosition(self) -> None:
+        'Analyses the position just reached on the position thread, the result arrives in positionAnalysed.'
+        self.position_request_id += 1
+        request_id = self.position_request_id
+        signals = self.engine_signals
+        future = self.position_executor.submit(PositionInfo, self.exportFEN())
+        future.add_done_callback(lambda future: signals.positionFound.emit(request_id, future))
+
+    def positionAnalysed(self, request_id: int, future) -> None:
+        '''Publishes the analysis of the displayed position on the UI thread in one step, then moves the check
+        highlight and ends the game on checkmate or stalemate. Analyses of positions left since are ignored.'''
+        if (request_id != self.position_request_id) or future.cancelled():
+            return
+        info = future.result()
+        self.position_info = info
+        self.legal_moves[info.key] = info.moves
+
+        # Check highlight
+        if self.check is True:
+            self.check_tile[0].setDefaultColor(self.check_tile[1])
+            self.check_tile[0].resetColor()
+            self.check = False
+        if info.check:
+            self.check = True
+            self.checkFunc(info.color)
+        if self.occupied:
+            return
+        if info.checkmate:
+            self.cancelEngineSearch()
+            self.checkmate(info.color)
+        elif info.stalemate:
+            self.cancelEngineSearch()
+            self.stalemate()
 
     def checkmate(self, color):
         'Function called when color is checkmated'
@@ -1117,6 +928,7 @@ class SubWindow(QWidget):
     
     def timeloss(self, color):
         'Function called when color loses on time'
+        self.cancelEngineSearch()
         flip = {'white': 'black', 'black': 'white'}
         self.occupied = True
         self.s_end.play()
@@ -1148,7 +960,7 @@ class SubWindow(QWidget):
         self.ui.player2_time.setStyleSheet('color: #FFFFFF')
         self.ui.player2_label.setStyleSheet('color: #FFFFFF')
         self.ui.stalemate()
-        if self.active_color == 'w':
+        if self.board.active_color == 'w':
             self.current_log.append('==')
             self.move_log_pointer += 1
             self.move_log[self.move_log_pointer] = self.current_log[0]
@@ -1162,6 +974,7 @@ class SubWindow(QWidget):
 
     def fiftymove(self) -> None:
         'Function to execute when there is a draw via fifty-move rule'
+        self.cancelEngineSearch()
         self.occupied = True
         self.s_end.play()
         if not self.no_time_limit:
@@ -1172,7 +985,7 @@ class SubWindow(QWidget):
         self.ui.player2_time.setStyleSheet('color: #FFFFFF')
         self.ui.player2_label.setStyleSheet('color: #FFFFFF')
         self.ui.fiftymove()
-        if self.active_color == 'w':
+        if self.board.active_color == 'w':
             self.current_log.append('==')
             self.move_log_pointer += 1
             self.move_log[self.move_log_pointer] = self.current_log[0]
@@ -1186,44 +999,32 @@ class SubWindow(QWidget):
 
     def insufficientMaterialCheck(self) -> None:
         'Checks to see if a draw can be called due to insufficient material on the board'
-        all_pieces = []
-        all_pieces_withdata = []
-        for i in range(64):
-            piece = self.ui.piece_layout.itemAt(i).widget()
-            pieceinfo = piece.pieceInformation()
-            if pieceinfo[0] is not None:
-                all_pieces.append(pieceinfo[0])
-                all_pieces_withdata.append(pieceinfo)
+        # Pieces other than the kings, as (code, square)
+        pieces = []
+        for square in squaresOf(self.board.occupied):
+            code = self.board.mailbox[square]
+            if code % 6 != KING:
+                pieces.append((code, square))
         
         # King versus king
-        if len(all_pieces) == 2:
-            self.insufficientMaterial()
-        # King and knight versus king
-        elif (len(all_pieces) == 3) and ('knight' in all_pieces):
+        if not pieces:
             self.insufficientMaterial()
-        # King and bishop versus king
-        elif (len(all_pieces) == 3) and ('bishop' in all_pieces):
+        # King and knight or bishop versus king
+        elif (len(pieces) == 1) and (pieces[0][0] % 6 in (KNIGHT, BISHOP)):
             self.insufficientMaterial()
         # King a bishop versus a king and a bishop, with bishops of the same color
-        elif (len(all_pieces) == 4) and (all_pieces.count('bishop') == 2):
-            light_tiles = []
-            for row, rank in enumerate('12345678'):
-                for col, file in enumerate('abcdefgh'):
-                    if row % 2 == col % 2:
-                        light_tiles.append(file+rank)
-
-            bishops = []
-            for i, piece in enumerate(all_pieces):
-                if piece == 'bishop':
-                    bishops.append(all_pieces_withdata[i])
-            if (bishops[0][1] != bishops[1][1]):
-                if (bishops[0][2] in light_tiles) and (bishops[1][2] in light_tiles):
-                    self.insufficientMaterial()
-                elif (bishops[0][2] not in light_tiles) and (bishops[1][2] not in light_tiles):
+        elif (len(pieces) == 2) and all(code % 6 == BISHOP for code, _ in pieces):
+            if (pieces[0][0] // 6 != pieces[1][0] // 6):
+                shades = [((square >> 3) + (square & 7)) % 2 for _, square in pieces]
+                if shades[0] == shades[1]:
                     self.insufficientMaterial()
+        # Drawn with best play according to the tablebases, e.g. the defending king in front of the pawn
+        elif (len(pieces) == 1) and (not self.occupied) and self.parent.tablebaseDraw(self.exportFEN()):
+            self.insufficientMaterial()
         
     def insufficientMaterial(self) -> None:
         'Function to execute when there is a draw via insufficient material'
+        self.cancelEngineSearch()
         self.occupied = True
         self.s_end.play()
         if not self.no_time_limit:
@@ -1234,7 +1035,7 @@ class SubWindow(QWidget):
         self.ui.player2_time.setStyleSheet('color: #FFFFFF')
         self.ui.player2_label.setStyleSheet('color: #FFFFFF')
         self.ui.insufficientMaterial()
-        if self.active_color == 'w':
+        if self.board.active_color == 'w':
             self.current_log.append('==')
             self.move_log_pointer += 1
             self.move_log[self.move_log_pointer] = self.current_log[0]
@@ -1247,209 +1048,62 @@ class SubWindow(QWidget):
         self.parent.completeANIIL()
 
     # Moves piece
-    def movePiece(self, piece, target, enginereq: bool) -> None:
-        'Sets target piece data to the piece that just captured /  moved.'
-        flip = {'white': 'black', 'black': 'white'}
+    def movePiece(self, piece, target, enginereq: bool, promotion: str = 'queen') -> None:
+        'Makes the move of piece to target on the board model, pawns promote to promotion. Repaints what changed.'
         pieceinfo = piece.pieceInformation()
         targetinfo = target.pieceInformation()
-        valid = self.calculateValidMoves(piece)
-        if targetinfo[2] in valid:
-            # Half-move and full-move clocks
-            if (pieceinfo[0] == 'pawn') or (targetinfo[0] is not None):
-                self.halfmove_clock = 0
-            else:
-                self.halfmove_clock += 1
-            if pieceinfo[1] == 'black':
-                self.fullmove_clock += 1
+        move = self.findMove(pieceinfo[2], targetinfo[2], promotion)
+        if move is not None:
+            color = pieceinfo[1]
+            flags = move >> 16
+            to_square = (move >> 6) & 63
+            self.hideHints()
+            san = self.algebraicNotation(move)
+            # ANIIL logs add the promotion piece after the check mark, once the piece is picked
+            self.current_notation = san.split('=')[0] if (move >> 12) & 15 else san
+
+            # Captures, en passant takes the pawn behind the target square
+            captured = None
+            if flags & FLAG_ENPASSANT:
+                captured = self.board.mailbox[to_square - 8 if color == 'white' else to_square + 8]
+            elif flags & FLAG_CAPTURE:
+                captured = self.board.mailbox[to_square]
+            if captured is not None:
+                self.ui.capturePiece(COLOR_NAMES[captured // 6], PIECE_NAMES[captured % 6])
 
             # Sound
             if self.mutesound is False:
-                if targetinfo[0] is None:
+                if flags & FLAG_CASTLE:
+                    self.s_castle.play()
+                elif captured is not None:
+                    self.s_capture.play()
+                else:
                     self.s_move.play()
-                    capture = False
+
+            self.board.makeMove(move)
+            self.syncPieces()
+            # Castle highlight on the square the rook moved to
+            if (flags & FLAG_CASTLE) and (self.active_tile is not None):
+                rook_to = CASTLING_ROOKS[to_square][1]
+                self.active_tile.resetColor()
+                self.active_tile = self.ui.board_layout.itemAtPosition(7 - (rook_to >> 3), rook_to & 7).widget()
+
+            # Pawn promotion
+            if (move >> 12) & 15:
+                if (self.gametype == 'engine') and (self.player1_color != color):
+                    self.enginePawnPromotion(target, san)
+                    self.enginedidpromote = True
                 else:
-                    self.ui.capturePiece(targetinfo[1], targetinfo[0])
-                    self.s_capture.play()
-                    capture = True
-            self.hideHints()
-            self.current_notation = self.algebraicNotation(piece, targetinfo[2], capture, False, False)
-
-            # Castle check
-            if (pieceinfo[0] == 'king') and (targetinfo[2] in piece.castlemoves):
-                # white kingside
-                if pieceinfo[1] == 'white' and targetinfo[2] == 'g1':
-                    target2 = self.ui.piece_layout.itemAtPosition(7, 7).widget()
-                    target2.setPieceInformation(None, None, 'h1')
-                    if self.blindfold is False:
-                        target2.pieceShow()
-                    target2 = self.ui.piece_layout.itemAtPosition(7, 5).widget()
-                    target2.setPieceInformation('rook', 'white', 'f1')
+                    # Shown as a pawn until the piece is picked
+                    target.setPieceInformation('pawn', color, targetinfo[2])
                     if self.blindfold is False:
-                        target2.pieceShow()
-                    if self.active_tile is not None:
-                        self.active_tile.resetColor()
-                        self.active_tile = self.ui.board_layout.itemAtPosition(7, 5).widget()
-                    self.current_notation = 'O-O'
-                # white queenside
-                elif pieceinfo[1] == 'white' and targetinfo[2] == 'c1':
-                    target2 = self.ui.piece_layout.itemAtPosition(7, 0).widget()
-                    target2.setPieceInformation(None, None, 'a1')
-                    if self.blindfold is False:
-                        target2.pieceShow()
-                    target2 = self.ui.piece_layout.itemAtPosition(7, 3).widget()
-                    target2.setPieceInformation('rook', 'white', 'd1')
-                    if self.blindfold is False:
-                        target2.pieceShow()
-                    if self.active_tile is not None:
-                        self.active_tile.resetColor()
-                        self.active_tile = self.ui.board_layout.itemAtPosition(7, 3).widget()
-                    self.current_notation = 'O-O-O'
-                # black kingside
-                elif pieceinfo[1] == 'black' and targetinfo[2] == 'g8':
-                    target2 = self.ui.piece_layout.itemAtPosition(0, 7).widget()
-                    target2.setPieceInformation(None, None, 'h8')
-                    if self.blindfold is False:
-                        target2.pieceShow()
-                    target2 = self.ui.piece_layout.itemAtPosition(0, 5).widget()
-                    target2.setPieceInformation('rook', 'black', 'f8')
-                    if self.blindfold is False:
-                        target2.pieceShow()
-                    if self.active_tile is not None:
-                        self.active_tile.resetColor()
-                        self.active_tile = self.ui.board_layout.itemAtPosition(0, 5).widget()
-                    self.current_notation = 'O-O'
-                # black queenside
-                elif pieceinfo[1] == 'black' and targetinfo[2] == 'c8':
-                    target2 = self.ui.piece_layout.itemAtPosition(0, 0).widget()
-                    target2.setPieceInformation(None, None, 'a8')
-                    if self.blindfold is False:
-                        target2.pieceShow()
-                    target2 = self.ui.piece_layout.itemAtPosition(0, 3).widget()
-                    target2.setPieceInformation('rook', 'black', 'd8')
-                    if self.blindfold is False:
-                        target2.pieceShow()
-                    if self.active_tile is not None:
-                        self.active_tile.resetColor()
-                        self.active_tile = self.ui.board_layout.itemAtPosition(0, 3).widget()
-                    self.current_notation = 'O-O-O'
-                if self.mutesound is False:
-                    self.s_castle.play()
-            piece.setPieceInformation(None, None, pieceinfo[2])
-            target.setPieceInformation(pieceinfo[0], pieceinfo[1], targetinfo[2])
-            if self.blindfold is False:
-                piece.pieceShow()
-                target.pieceShow()
-            targetinfo = target.pieceInformation()
-
-            # En passant
-            if targetinfo[0] == 'pawn':
-                currentpos = self.convertSquareNotation(targetinfo[2])
-                lastpos = self.convertSquareNotation(pieceinfo[2])
-                change = (currentpos[0] - lastpos[0], currentpos[1] - lastpos[1])
-                # Check to see if pawn just made a two place advance, if so set the target square
-                if (change[0] == 0) and ((change[1] == 2) or (change[1] == -2)):
-                    target.two_moved = True
-                    enpassant = self.convertSquareNotation(targetinfo[2])
-                    if targetinfo[1] == 'white':
-                        enpassant = (enpassant[0], enpassant[1] - 1)
-                    else:
-                        enpassant = (enpassant[0], enpassant[1] + 1)
-                    enpassant = self.convertSquareNotation(enpassant)
-                    self.enpassant_square = enpassant # Set enpassant square
-                    self.enpassant_color = targetinfo[1]
-                # Check to see if pawn is trying to initiate an enpassant
-                elif targetinfo[2] == self.enpassant_square:
-                    enpassant = self.convertSquareNotation(targetinfo[2])
-                    if targetinfo[1] == 'white':
-                        enpassant = (enpassant[0], enpassant[1] - 1)
-                    else:
-                        enpassant = (enpassant[0], enpassant[1] + 1)
-                    targetenpassant = self.convertToPieceLayoutPos(enpassant)
-                    capturepiece = self.ui.piece_layout.itemAtPosition(targetenpassant[0], targetenpassant[1]).widget()
-                    enpassant = self.convertSquareNotation(enpassant)
-                    captureinfo = capturepiece.pieceInformation()
-                    self.ui.capturePiece(captureinfo[1], captureinfo[0])
-                    capturepiece.setPieceInformation(None, None, enpassant)
-                    if self.blindfold is False:
-                        capturepiece.pieceShow()
-                    self.enpassant_square = '-'
-                    self.enpassant_color = None
-                    if self.mutesound is False:
-                        self.s_capture.play()
-                # Reset enpassant target square
-                else:
-                    self.enpassant_square = '-'    
-                    self.enpassant_color = None
-
-                # Pawn promotion
-                pawnrank = self.convertSquareNotation(targetinfo[2])[1]
-                if (targetinfo[1] == 'white') and (pawnrank == 8):
-                    if self.gametype == 'engine':
-                        if self.player1_color == 'white':
-                            self.showPawnPromotion(target, 'white')
-                            self.will_promote = True
-                        else:
-                            self.enginePawnPromotion(target)
-                            self.enginedidpromote = True
-                    else:
-                        self.showPawnPromotion(target, 'white')
-                        self.will_promote = True
-                elif (targetinfo[1] == 'black') and (pawnrank == 1):
-                    if self.gametype == 'engine':
-                        if self.player1_color == 'black':
-                            self.showPawnPromotion(target, 'black')
-                            self.will_promote = True
-                        else:
-                            self.enginePawnPromotion(target)
-                            self.enginedidpromote = True
-                    else:
-                        self.showPawnPromotion(target, 'black')
-                        self.will_promote = True
-
-            # Check highlight
-            possiblechecks = self.calculateValidSquares(target)
-            oppositeking = flip[targetinfo[1]]
-            if self.check is True:
-                self.check_tile[0].setDefaultColor(self.check_tile[1])
-                self.check_tile[0].resetColor()
-                self.check = False
-            if self.kingpos[oppositeking] in possiblechecks:
-                self.check = True
-                self.checkFunc(flip[targetinfo[1]])
-            else:
-                # Discovered check
-                for i in range(64):
-                    widget = self.ui.piece_layout.itemAt(i).widget()
-                    widgetinfo = widget.pieceInformation()
-                    if widgetinfo[0] is None:
-                        continue
-                    if widgetinfo[1] == targetinfo[1]:
-                        checksquares = self.calculateValidSquares(widget)
-                        if self.kingpos[oppositeking] in checksquares:
-                            self.check = True
-                            self.checkFunc(flip[widgetinfo[1]])
-                            break
-                    else:
-                        continue
-            
-            if targetinfo[0] == 'king':
-                target.moved = True
-            if (targetinfo[0] == 'pawn') and (not target.moved):
-                target.moved = True
-            if targetinfo[0] == 'king':
-                self.kingpos[targetinfo[1]] = targetinfo[2]
-            # Switch active colour
-            if self.active_color == 'w':
-                #self.player1_color = 'black'
-                self.active_color = 'b'
-            else:
-                #self.player1_color = 'white'
-                self.active_color = 'w'
-            self.stalemateCheck()
+                        target.pieceShow()
+                    self.showPawnPromotion(target, color)
+                    self.will_promote = True
 
             log_to_write = None
             if self.will_promote is False and self.enginedidpromote is False:
-                if targetinfo[1] == 'white':
+                if color == 'white':
                     self.current_log.append(self.current_notation)
                     self.move_log_pointer += 1
                     self.move_log[self.move_log_pointer] = self.current_log[0]
@@ -1460,9 +1114,14 @@ class SubWindow(QWidget):
                     log_to_write = f'{self.current_log[0]}/{self.current_log[1]}'
                     self.current_log = []
                     self.updateMoveLog(True)
-
-            self.threefoldRepetition()
-            if self.halfmove_clock == 50:
+                # Check, checkmate and stalemate follow in positionAnalysed
+                self.analysePosition()
+
+            # Cheap enough to settle here, a game ended here stops startEngineSearch from asking for a reply
+            draw = self.board.drawReason() if not self.occupied else None
+            if draw == 'threefold':
+                self.threefoldRepetition()
+            elif draw == 'fiftymove':
                 self.fiftymove()
             self.insufficientMaterialCheck()
             self.enginedidpromote = False
@@ -1485,108 +1144,10 @@ class SubWindow(QWidget):
         else:
             return False
 
-    def stalemateCheck(self) -> None:
-        'Function to check whether there is a stalemate.'
-        if self.is_checkmate:
-            return
-        whitepieces = []
-        blackpieces = []
-        for i in range(64):
-            piece = self.ui.piece_layout.itemAt(i).widget()
-            pieceinfo = piece.pieceInformation()
-            if pieceinfo[1] == 'white':
-                whitepieces.append(piece)
-            elif pieceinfo[1] == 'black':
-                blackpieces.append(piece)
-
-        # Check for white stalemate
-        valid = []
-        for piece in whitepieces:
-            tempvalid = self.calculateValidMoves(piece)
-            pieceinfo = piece.pieceInformation()
-            for temp in tempvalid:
-                pos = self.convertSquareNotation(temp)
-                pos = self.convertToPieceLayoutPos(pos)
-                widget = self.ui.piece_layout.itemAtPosition(pos[0], pos[1]).widget()
-                widgetinfo = widget.pieceInformation()
-                if widgetinfo[1] != pieceinfo[1]:
-                    valid.append(temp)
-        if valid:
-            pass
-        else:
-            self.stalemate()
-
-
-        # Check for black stalemate
-        valid = []
-        for piece in blackpieces:
-            tempvalid = self.calculateValidMoves(piece)
-            pieceinfo = piece.pieceInformation()
-            for temp in tempvalid:
-                pos = self.convertSquareNotation(temp)
-                pos = self.convertToPieceLayoutPos(pos)
-                widget = self.ui.piece_layout.itemAtPosition(pos[0], pos[1]).widget()
-                widgetinfo = widget.pieceInformation()
-                if widgetinfo[1] != pieceinfo[1]:
-                    valid.append(temp)
-        if valid:
-            pass
-        else:
-            self.stalemate()
-        return
-
     def calculateValidMoves(self, piece) -> list:
-        'Returns a list of valid moves after check and move validation'
-        pieceinfo = piece.pieceInformation()
-        tempvalid = self.calculateValidSquares(piece)
-        originalkingpos = {'white': None, 'black': None}
-        originalkingpos['white'] = self.kingpos['white']
-        originalkingpos['black'] = self.kingpos['black']
-        invalid = []
-        valid = []
-        for move in tempvalid:
-            # Set target square / piece
-            pos = self.convertSquareNotation(move)
-            pos = self.convertToPieceLayoutPos(pos)
-            target = self.ui.piece_layout.itemAtPosition(pos[0], pos[1]).widget()
-            targetinfo = target.pieceInformation()
-
-            # Do the move
-            tempstore1 = piece.pieceInformation()
-            tempstore2 = targetinfo
-            if pieceinfo[0] == 'king':
-                self.kingpos[pieceinfo[1]] = move
-            piece.setPieceInformation(None, None, pieceinfo[2])
-            target.setPieceInformation(pieceinfo[0], pieceinfo[1], targetinfo[2])
-
-            # Identify check
-            flip = {'white': 'black', 'black': 'white'}
-            for i in range(64):
-                widget = self.ui.piece_layout.itemAt(i).widget()
-                widgetinfo = widget.pieceInformation()
-                if widgetinfo[1] == flip[pieceinfo[1]]:
-                    checksquares = self.calculateValidSquares(widget)
-                    if self.kingpos[pieceinfo[1]] in checksquares:
-                        invalid.append(move)
-                        break
-                else:
-                    continue
-                
-            # Reset move
-            piece.setPieceInformation(tempstore1[0], tempstore1[1], tempstore1[2])
-            target.setPieceInformation(tempstore2[0], tempstore2[1], tempstore2[2])
-            self.kingpos['white'] = originalkingpos['white']
-            self.kingpos['black'] = originalkingpos['black']
-
-        if invalid:
-            for move in tempvalid:
-                if move in invalid:
-                    continue
-                else:
-                    valid.append(move)
-            return valid
-        else:
-            return tempvalid
+        'Returns the squares the piece can legally move to, from the board model'
+        square = SQUARE_INDEX.get(piece.pieceInformation()[2])
+        return [SQUARE_NAMES[target] for target in self.legalMoveMap().get(square, {})]
     
     def flipControls(self) -> None:
         'Flips controls for player vs player mode.'
@@ -1613,26 +1174,6 @@ class SubWindow(QWidget):
                     widget2.showHint()
                     self.hints.append(widget2)
 
-    def returnHints(self, validmoves: list, piece) -> list:
-        hints = []
-        if self.hidehints is False:
-            for valid in validmoves:
-                pos = self.convertSquareNotation(valid)
-                pos = self.convertToPieceLayoutPos(pos)
-                widget = self.ui.piece_layout.itemAtPosition(pos[0], pos[1]).widget()
-                widget2 = self.ui.hint_layout.itemAtPosition(pos[0], pos[1]).widget()
-                pieceinfo = piece.pieceInformation()
-                widgetinfo = widget.pieceInformation()
-                if widget.name is None:
-                    a = True
-                else:
-                    a = False
-                if a:
-                    hints.append(widget)
-                elif pieceinfo[1] != widgetinfo[1]:
-                    hints.append(widget2)
-        return hints
-
     def hideHints(self) -> None:
         'Method to hide all hints on the board'
         for hint in self.hints:
@@ -1654,185 +1195,6 @@ class SubWindow(QWidget):
         self.ui.pawnPromotion(color)
         self.pawn_promote = pawn
 
-    def getPieceInformationFromPos(self, tuplepos) -> tuple:
-        'Returns data of a piece widget in the format (\'piece\', \'color\', \'a1\').'
-        if (tuplepos[0] > 8 or tuplepos[0] < 1) or (tuplepos[1] > 8 or tuplepos[1] < 1):
-            return (None, None, None)
-        else:
-            pos = self.convertToPieceLayoutPos((tuplepos[0], tuplepos[1]))
-            piece = self.ui.piece_layout.itemAtPosition(pos[0], pos[1]).widget()
-            return piece.pieceInformation()
-
-    # Calculates valid squares for piece to move to
-    def calculateValidSquares(self, piece) -> list:
-        'Calculates valid squares (as square notation) based on the relative position of a piece.'
-        tempvalid = []
-        pieceinfo = piece.pieceInformation()
-        pos: tuple = self.convertSquareNotation(pieceinfo[2])
-        
-        # Valid squares for pawn
-        if pieceinfo[0] == 'pawn':
-            if pieceinfo[1] == 'white':
-                x = 1
-            else:
-                x = -1
-            up = (pos[0], pos[1] + (1*x))
-            two_up = (pos[0], pos[1] + (2*x))
-            left_up = (pos[0] - 1, pos[1] + (1*x))
-            right_up = (pos[0] + 1, pos[1] + (1*x))
-
-            if (not self.checkObstruction(two_up)) and (not self.checkObstruction(up)):
-                if (pieceinfo[1] == 'white') and (int(pieceinfo[2][1]) == 2):
-                    tempvalid.append(two_up)
-                elif (pieceinfo[1] == 'black') and (int(pieceinfo[2][1]) == 7):
-                    tempvalid.append(two_up)
-            if not self.checkObstruction(up):
-                tempvalid.append(up)
-            if self.checkObstruction(left_up):
-                tempvalid.append(left_up)
-            if self.checkObstruction(right_up):
-                tempvalid.append(right_up)
-            # En passant check
-            try:
-                left_up = self.convertSquareNotation(left_up)
-                right_up = self.convertSquareNotation(right_up)
-                if self.enpassant_color != pieceinfo[1]:
-                    if left_up == self.enpassant_square:
-                        tempvalid.append((pos[0] - 1, pos[1] + (1*x)))
-                    elif right_up == self.enpassant_square:
-                        tempvalid.append((pos[0] + 1, pos[1] + (1*x)))
-            except Exception:
-                pass
-        
-        # Valid squares for knight
-        if pieceinfo[0] == 'knight':
-            tempvalid.append((pos[0]+1, pos[1]+2))
-            tempvalid.append((pos[0]-1, pos[1]+2))
-            tempvalid.append((pos[0]+1, pos[1]-2))
-            tempvalid.append((pos[0]-1, pos[1]-2))
-            tempvalid.append((pos[0]+2, pos[1]+1))
-            tempvalid.append((pos[0]-2, pos[1]+1))
-            tempvalid.append((pos[0]+2, pos[1]-1))
-            tempvalid.append((pos[0]-2, pos[1]-1))
-
-        # Valid squares for bishop or queen
-        if (pieceinfo[0] == 'bishop') or (pieceinfo[0] == 'queen'):
-            tl_continuous = True
-            tr_continuous = True
-            bl_continuous = True
-            br_continuous = True
-
-            for i in range(1, 8):
-                tl = (pos[0] - (1*i), pos[1] + (1*i))
-                tr = (pos[0] + (1*i), pos[1] + (1*i))
-                bl = (pos[0] - (1*i), pos[1] - (1*i))
-                br = (pos[0] + (1*i), pos[1] - (1*i))
-
-                if tl_continuous:
-                    tempvalid.append(tl)
-                if tr_continuous:
-                    tempvalid.append(tr)
-                if bl_continuous:
-                    tempvalid.append(bl)
-                if br_continuous:
-                    tempvalid.append(br)
-
-                if self.checkObstruction(tl):
-                    tl_continuous = False
-                if self.checkObstruction(tr):
-                    tr_continuous = False
-                if self.checkObstruction(bl):
-                    bl_continuous = False
-                if self.checkObstruction(br):
-                    br_continuous = False
-
-        # Valid squares for rook or queen
-        if (pieceinfo[0] == 'rook') or (pieceinfo[0] == 'queen'):
-            up_continuous = True
-            down_continuous = True
-            left_continuous = True
-            right_continuous = True
-
-            for i in range(1, 8):
-                up = (pos[0], pos[1] + (1*i))
-                down = (pos[0], pos[1] - (1*i))
-                left = (pos[0] - (1*i), pos[1])
-                right = (pos[0] + (1*i), pos[1])
-
-                if up_continuous:
-                    tempvalid.append(up)
-                if down_continuous:
-                    tempvalid.append(down)
-                if left_continuous:
-                    tempvalid.append(left)
-                if right_continuous:
-                    tempvalid.append(right)
-
-                if self.checkObstruction(up):
-                    up_continuous = False
-                if self.checkObstruction(down):
-                    down_continuous = False
-                if self.checkObstruction(left):
-                    left_continuous = False
-                if self.checkObstruction(right):
-                    right_continuous = False
-
-         # Valid squares for king
-        if pieceinfo[0] == 'king':
-            tempvalid.append((pos[0]+1, pos[1]))
-            tempvalid.append((pos[0]-1, pos[1]))
-            tempvalid.append((pos[0]+1, pos[1]+1))
-            tempvalid.append((pos[0]+1, pos[1]-1))
-            tempvalid.append((pos[0]-1, pos[1]+1))
-            tempvalid.append((pos[0]-1, pos[1]-1))
-            tempvalid.append((pos[0], pos[1]+1))
-            tempvalid.append((pos[0], pos[1]-1))
-
-            # Check for castles
-            piece.castlemoves = []
-            if pieceinfo[1] == 'white':
-                if self.canCastle('K'):
-                    position = (pos[0]+2, pos[1])
-                    tempvalid.append(position)
-                    position = self.convertSquareNotation(position)
-                    piece.castlemoves.append(position)
-                if self.canCastle('Q'):
-                    position = (pos[0]-2, pos[1])
-                    tempvalid.append(position)
-                    position = self.convertSquareNotation(position)
-                    piece.castlemoves.append(position)
-            elif pieceinfo[1] == 'black':
-                if self.canCastle('k'):
-                    position = (pos[0]+2, pos[1])
-                    tempvalid.append(position)
-                    position = self.convertSquareNotation(position)
-                    piece.castlemoves.append(position)
-                if self.canCastle('q'):
-                    position = (pos[0]-2, pos[1])
-                    tempvalid.append(position)
-                    position = self.convertSquareNotation(position)
-                    piece.castlemoves.append(position)
-
-        # Remove squares outside of board and append to valid list
-        valid = []
-        for i in range(len(tempvalid)):
-            try:
-                square = tempvalid[i]
-                if (square[0] > 8) or (square[1] > 8):
-                    continue
-                elif (square[0] < 1) or (square[1] < 1):
-                    continue
-                else:
-                    temppos = self.convertToPieceLayoutPos(square)
-                    widget = self.ui.piece_layout.itemAtPosition(temppos[0], temppos[1]).widget()
-                    widgetinfo = widget.pieceInformation()
-                    if widgetinfo[1] != pieceinfo[1]:
-                        valid.append(self.convertSquareNotation(square))
-            except IndexError:
-                continue
-        
-        return valid
-                
     def convertSquareNotation(self, x):
         'Converts string square notation (ie. a1) to tuple format (ie. 1, 1) and vice versa.'
         file_ref = {'a': 1, 'b': 2, 'c': 3, 'd': 4, 'e': 5, 'f': 6, 'g': 7, 'h': 8}
@@ -1844,19 +1206,6 @@ class SubWindow(QWidget):
         else:
             return
 
-    def checkObstruction(self, pos: tuple) -> bool:
-        'Checks for piece at position'
-        pos = self.convertToPieceLayoutPos(pos)
-        if pos is not None:
-            target = self.ui.piece_layout.itemAtPosition(pos[0], pos[1]).widget()
-            targetinfo = target.pieceInformation()
-            if targetinfo[0] is None:
-                return False
-            else:
-                return True
-        else:
-            return True
-
     # Algorithm to find the column and row of the target tile
     def findTile(self, clickpos: tuple) -> tuple:
         'Finds the layout position of a tile based on click position.'
@@ -1932,11 +1281,13 @@ class SubWindow(QWidget):
         return self.convertToPieceLayoutPos((flip_digits[f], flip_digits[r]))
     
     def closeWindows(self) -> None:
+        self.cancelEngineSearch()
         for window in self.windowstack:
             window.close()
 
     def resignRequest(self) -> None:
         'Function executed when user resigns'
+        self.cancelEngineSearch()
         self.occupied = True
         self.s_end.play()
         if not self.no_time_limit:
@@ -1946,7 +1297,7 @@ class SubWindow(QWidget):
         self.ui.player1_label.setStyleSheet('color: #FFFFFF')
         self.ui.player2_time.setStyleSheet('color: #FFFFFF')
         self.ui.player2_label.setStyleSheet('color: #FFFFFF')
-        if self.active_color == 'w':
+        if self.board.active_color == 'w':
             self.ui.resign('white')
             self.current_log.append('0-1')
             self.move_log_pointer += 1
@@ -1963,6 +1314,7 @@ class SubWindow(QWidget):
 
     def drawRequest(self) -> None:
         'Function executed when user requests to draw'
+        self.cancelEngineSearch()
         self.occupied = True
         self.s_end.play()
         if not self.no_time_limit:
@@ -1973,7 +1325,7 @@ class SubWindow(QWidget):
         self.ui.player2_time.setStyleSheet('color: #FFFFFF')
         self.ui.player2_label.setStyleSheet('color: #FFFFFF')
         self.ui.draw()
-        if self.active_color == 'w':
+        if self.board.active_color == 'w':
             self.current_log.append('==')
             self.move_log_pointer += 1
             self.move_log[self.move_log_pointer] = self.current_log[0]
@@ -120,7 +120,8 @@ class SubWindow(QWidget):
             
             self.parent.setData((self.configurations, False, None))
             if gametype == 0:
-                self.parent.initEngine(enginetype, flip[player1_color], fen, enginedepth, bullet)
+                self.parent.initEngine(enginetype, flip[player1_color], fen, enginedepth, bullet,
+                                       workers=self.parent.engine_workers)
             self.parent.setCurrentSubwindow(2)
 
     # Close all open windows before changing sub window
@@ -1,9 +1,11 @@
 # main/subwindows/ui/chessboardui.py
 
 from PySide6.QtWidgets import QWidget, QGridLayout, QGroupBox, QPushButton, QLabel, QScrollArea, QVBoxLayout, QStyleOption, QStyle, QComboBox, QCheckBox, QHBoxLayout
-from PySide6.QtGui import QFont, QPaintEvent, QPainter
-from PySide6.QtCore import QRect, QMetaObject, QCoreApplication, QSize
+from PySide6.QtGui import QFont, QPaintEvent, QPainter, QPixmap
+from PySide6.QtCore import QRect, QMetaObject, QCoreApplication, QSize, Qt
+from PySide6.QtSvg import QSvgRenderer
 from PySide6.QtSvgWidgets import QSvgWidget
+from collections import OrderedDict
 
 
 class UI(object):
@@ -712,7 +714,66 @@ class UI_PreferencesWindow(object):
         self.sound_checkbox.setText(QCoreApplication.translate("preferenceswindow", u"Mute sound", None))
 
 
-class Piece(QSvgWidget):
+class SvgImage(QWidget):
+    '''Shows an image of main/images as a pixmap from a cache shared by every board widget, so changing the image
+    never reads or parses a file once it has been shown at that size.'''
+    # Renderers by image name, parsed once
+    renderers = {}
+    # Pixmaps by (image name, width, height, device pixel ratio), least recently used first. Resizing the window
+    # renders every shown image at each size it passes through, so the oldest are dropped past PIXMAP_LIMIT
+    pixmaps = OrderedDict()
+    PIXMAP_LIMIT = 256
+
+    def __init__(self):
+        super().__init__()
+        self.image_name = 'none'
+
+    @classmethod
+    def renderer(cls, name: str) -> QSvgRenderer:
+        renderer = cls.renderers.get(name)
+        if renderer is None:
+            renderer = QSvgRenderer(f'main/images/{name}.svg')
+            cls.renderers[name] = renderer
+        return renderer
+
+    @classmethod
+    def pixmap(cls, name: str, size: QSize, ratio: float) -> QPixmap:
+        key = (name, size.width(), size.height(), ratio)
+        pixmap = cls.pixmaps.get(key)
+        if pixmap is not None:
+            cls.pixmaps.move_to_end(key)
+        else:
+            pixmap = QPixmap(round(size.width() * ratio), round(size.height() * ratio))
+            pixmap.fill(Qt.transparent)
+            painter = QPainter(pixmap)
+            cls.renderer(name).render(painter)
+            painter.end()
+            pixmap.setDevicePixelRatio(ratio)
+            cls.pixmaps[key] = pixmap
+            if len(cls.pixmaps) > cls.PIXMAP_LIMIT:
+                cls.pixmaps.popitem(last=False)
+        return pixmap
+
+    def setImage(self, name: str) -> None:
+        if name != self.image_name:
+            self.image_name = name
+            self.update()
+
+    # Sized like a QSvgWidget showing the image
+    def sizeHint(self) -> QSize:
+        renderer = self.renderer(self.image_name)
+        if renderer.isValid():
+            return renderer.defaultSize()
+        return QSize(128, 128)
+
+    def paintEvent(self, event: QPaintEvent) -> None:
+        if (self.width() <= 0) or (self.height() <= 0):
+            return
+        painter = QPainter(self)
+        painter.drawPixmap(self.rect(), self.pixmap(self.image_name, self.size(), self.devicePixelRatioF()))
+
+
+class Piece(SvgImage):
     def __init__(self, name: str, color: str, pos: str, parent):
         super().__init__()
         self.parent = parent
@@ -739,28 +800,28 @@ class Piece(QSvgWidget):
 
     def pieceShow(self) -> None:
         if self.name is not None:
-            self.load('main/images/{}{}.svg'.format(self.color.lower(), self.name.lower()))
+            self.setImage('{}{}'.format(self.color.lower(), self.name.lower()))
         else:
-            self.load('main/images/none.svg')
+            self.setImage('none')
     
     def pieceHide(self) -> None:
         if self.name is not None:
-            self.load('main/images/none.svg')
+            self.setImage('none')
     
     def setToHint(self, type) -> bool:
         if self.name is None:
-            self.load(f'main/images/{type}.svg')
+            self.setImage(type)
             return True
         else:
             return False
 
     def removeHint(self) -> None:
         if self.name is None:
-             self.load('main/images/none.svg')
+             self.setImage('none')
         return
 
 
-class Hint(QSvgWidget):
+class Hint(SvgImage):
     def __init__(self, pos: str, hidden: bool):
         super().__init__()
         self.pos = pos
@@ -774,7 +835,7 @@ class Hint(QSvgWidget):
         self.show()
 
     def loadHint(self) -> None:
-        self.load(f'main/images/{self.image}.svg')
+        self.setImage(self.image)
 
     def changeDefault(self, default: str) -> None:
         self.default = default
@@ -324,7 +324,8 @@ class GameWidget(QObject):
                     # Load game
                     self.savegamemanager.parent.setData((configs, True, self.gameid))
                     if configs[0] == 0:
-                        self.savegamemanager.parent.initEngine(configs[1], flip[configs[7]], configs[8], configs[2], False)
+                        self.savegamemanager.parent.initEngine(configs[1], flip[configs[7]], configs[8], configs[2], False,
+                                                               workers=self.savegamemanager.parent.engine_workers)
                     self.savegamemanager.parent.setCurrentSubwindow(2)
         except AttributeError as e:
             print(f'<Savegamemanager> Exception raised: {e}')
@@ -0,0 +1,206 @@
+# main/uciengine.py
+# UCI front-end for the classic engine, so it can stand in for Stockfish in modules.uci
+#
+#   python main/uciengine.py
+import sys
+import os
+import threading
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from modules.logic import Board
+from modules.engine import ChessEngine, MAX_DEPTH
+from modules.movegen import moveToString
+from modules.book import DEFAULT_BOOK, openBook
+from modules.tablebase import openTablebases
+
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+ENGINE_NAME = 'CAE classic'
+
+
+class UCIFrontend:
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self.hash_mb = 16
+        self.workers = 1
+        self.engine = None
+        self.position = Board(START_FEN)
+        # Off by default, an analysing GUI wants searched moves
+        self.own_book = False
+        self.book_file = DEFAULT_BOOK
+        # Used whenever maketables.py has been run
+        self.tablebases = openTablebases()
+        # The search runs on its own thread so stop and ponderhit are read while it thinks
+        self.searcher = None
+        # Set once bestmove may be sent, held back while pondering or in infinite mode
+        self.release = None
+        # Clock of the running go as (time_left, increment, max_time) in seconds, for ponderhit
+        self.clock = (None, 0, None)
+        self.output_lock = threading.Lock()
+
+    # Other methods ///
+    def send(self, line: str) -> None:
+        'Writes one line of output, from the command loop or the search thread.'
+        with self.output_lock:
+            self.output.write(line + '\n')
+            self.output.flush()
+    def newEngine(self) -> None:
+        'Creates the engine with the current Hash and Threads options.'
+        if self.engine is not None:
+            self.shutdownEngine()
+        book = openBook(self.book_file) if self.own_book else None
+        self.engine = ChessEngine('classic', 0, 'white', self.position, False, self.hash_mb, workers=self.workers,
+                                  book=book, tablebases=self.tablebases)
+    def setPosition(self, tokens: list) -> None:
+        'Handles \'position [startpos | fen <fen>] [moves <moves>]\'.'
+        if 'moves' in tokens:
+            index = tokens.index('moves')
+            moves = tokens[index + 1:]
+            tokens = tokens[:index]
+        else:
+            moves = []
+        if tokens and tokens[0] == 'fen':
+            fen = ' '.join(tokens[1:])
+        else:
+            fen = START_FEN
+        position = Board(fen)
+        for notation in moves:
+            color = 'white' if position.active_color == 'w' else 'black'
+            for move in position.legalMoves(color):
+                if moveToString(move) == notation:
+                    position.makeMove(move)
+                    break
+            else:
+                # Illegal move, keep the position reached so far
+                break
+        self.position = position
+    def setOption(self, tokens: list) -> None:
+        'Handles \'setoption name <name> value <value>\'.'
+        if 'value' not in tokens:
+            return
+        index = tokens.index('value')
+        name = ' '.join(tokens[1:index])
+        value = ' '.join(tokens[index + 1:])
+        if name == 'Hash':
+            self.hash_mb = int(value)
+        elif name == 'Threads':
+            self.workers = int(value)
+        elif name == 'OwnBook':
+            self.own_book = value == 'true'
+        elif name == 'BookFile':
+            self.book_file = value
+        else:
+            return
+        # Recreated with the new option on the next isready or go
+        if self.engine is not None:
+            self.stopSearch()
+            self.shutdownEngine()
+            self.engine = None
+    def go(self, tokens: list) -> None:
+        '''Handles \'go\' with movetime, depth, wtime/btime, ponder or infinite, starting the search on its own
+        thread. It answers with bestmove, during ponder only after ponderhit or stop and in infinite mode
+        only after stop.'''
+        self.stopSearch()
+        arguments = {}
+        for i in range(0, len(tokens) - 1):
+            if tokens[i] in ('movetime', 'depth', 'wtime', 'btime', 'winc', 'binc'):
+                arguments[tokens[i]] = int(tokens[i + 1])
+        ponder = 'ponder' in tokens
+        infinite = 'infinite' in tokens
+        engine = self.engine
+        engine.clearStop()
+        engine.current_position = self.position
+        engine.color = 'white' if self.position.active_color == 'w' else 'black'
+        side = 'w' if engine.color == 'white' else 'b'
+        time_left = arguments[side + 'time'] / 1000 if (side + 'time') in arguments else None
+        increment = arguments.get(side + 'inc', 0) / 1000
+        max_time = arguments['movetime'] / 1000 if 'movetime' in arguments else None
+        depth = MAX_DEPTH if infinite else arguments.get('depth', engine.depth)
+        self.clock = (time_left, increment, max_time)
+        self.release = threading.Event()
+        if not (ponder or infinite):
+            self.release.set()
+        self.searcher = threading.Thread(target=self.search, daemon=True,
+                                         args=(time_left, increment, max_time, depth, ponder, self.release))
+        self.searcher.start()
+    def search(self, time_left, increment, max_time, depth: int, ponder: bool, release) -> None:
+        'Runs one search on the search thread and sends its bestmove once release is set.'
+        engine = self.engine
+        default_depth = engine.depth
+        engine.depth = depth
+        try:
+            # Every limit goes through bestMove, so the book and tablebases are consulted first whatever the limit
+            best_move = engine.bestMove(time_left, increment, max_time=max_time, ponder=ponder)
+        finally:
+            engine.depth = default_depth
+        release.wait()
+        self.send(f'info nodes {engine.nodes}')
+        ponder_move = engine.ponderMove()
+        self.send(f'bestmove {best_move or "(none)"}' + (f' ponder {ponder_move}' if ponder_move else ''))
+    def ponderHit(self) -> None:
+        'Handles \'ponderhit\', the ponder search carries on as a normal search under the clock of its go.'
+        if (self.searcher is None) or self.release.is_set():
+            return
+        time_left, increment, max_time = self.clock
+        self.engine.ponderHit(time_left, increment, max_time=max_time)
+        self.release.set()
+    def stopSearch(self) -> None:
+        'Handles \'stop\', ending the running search and waiting until its bestmove has been sent.'
+        if self.searcher is None:
+            return
+        self.engine.stopSearch()
+        self.release.set()
+        self.searcher.join()
+        self.searcher = None
+    def loop(self, lines) -> None:
+        'Answers UCI commands until quit or the end of input.'
+        for line in lines:
+            tokens = line.split()
+            if not tokens:
+                continue
+            command = tokens[0]
+            if command == 'uci':
+                self.send(f'id name {ENGINE_NAME}')
+                self.send('id author CAE')
+                self.send('option name Hash type spin default 16 min 1 max 1024')
+                self.send('option name Threads type spin default 1 min 1 max 64')
+                self.send('option name OwnBook type check default false')
+                self.send(f'option name BookFile type string default {DEFAULT_BOOK}')
+                self.send('uciok')
+            elif command == 'isready':
+                if self.engine is None:
+                    self.newEngine()
+                self.send('readyok')
+            elif command == 'setoption':
+                self.setOption(tokens[1:])
+            elif command == 'ucinewgame':
+                self.stopSearch()
+                self.position = Board(START_FEN)
+                if self.engine is None:
+                    self.newEngine()
+                else:
+                    self.engine.transposition_table.clear()
+                    self.engine.orderer.clear()
+            elif command == 'position':
+                self.setPosition(tokens[1:])
+            elif command == 'go':
+                if self.engine is None:
+                    self.newEngine()
+                self.go(tokens[1:])
+            elif command == 'stop':
+                self.stopSearch()
+            elif command == 'ponderhit':
+                self.ponderHit()
+            elif command == 'quit':
+                break
+        if self.engine is not None:
+            self.stopSearch()
+            self.shutdownEngine()
+    def shutdownEngine(self) -> None:
+        'Stops the engine\'s worker processes and closes its book.'
+        self.engine.shutdown()
+        if self.engine.book is not None:
+            self.engine.book.close()
+
+# Program entry point
+if __name__ == '__main__':
+    UCIFrontend().loop(sys.stdin)
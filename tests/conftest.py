@@ -0,0 +1,5 @@
+# tests/conftest.py
+# The application imports its modules relative to main/, as the scripts there do
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'main'))
@@ -0,0 +1,31 @@
+# tests/test_movegen.py
+# Regression gate for move generation and make/unmake, a quick slice of main/perft.py's suite
+import pytest
+from modules.logic import Board
+from perft import PERFT_SUITE
+
+# Counts above this are left to python main/perft.py --suite
+MAX_NODES = 100000
+
+PERFT_CASES = [(name, fen, depth, nodes) for name, fen, expected in PERFT_SUITE
+               for depth, nodes in sorted(expected.items()) if nodes <= MAX_NODES]
+
+
+@pytest.mark.parametrize('name, fen, depth, nodes', PERFT_CASES, ids=[f'{case[0]}, depth {case[2]}' for case in PERFT_CASES])
+def test_perft(name, fen, depth, nodes):
+    assert Board(fen).perft(depth) == nodes
+
+
+@pytest.mark.parametrize('name, fen', [(name, fen) for name, fen, _ in PERFT_SUITE], ids=[case[0] for case in PERFT_SUITE])
+def test_make_unmake_restores_position(name, fen):
+    board = Board(fen)
+    key = board.zobristKey()
+    fen = board.getFen().getString()
+    color = 'white' if board.active_color == 'w' else 'black'
+    for move in board.legalMoves(color):
+        board.makeMove(move)
+        # The incrementally updated key matches one computed from scratch
+        assert board.zobristKey() == Board(board.getFen().getString()).zobristKey()
+        board.unmakeMove()
+        assert board.zobristKey() == key
+        assert board.getFen().getString() == fen